@@ -0,0 +1,154 @@
+"""
+Concurrent /audit benchmark.
+
+Fires N simultaneous /audit requests at the FastAPI app in-process with a fake
+Gemini model that sleeps for a fixed latency. With the non-blocking LLM client,
+the LLM waits of N requests overlap, so wall-clock should stay close to one
+request's latency (audit + assets) plus the CPU work, not N times it.
+Preprocessing is real CPU work and is included: normalisation, the perceptual
+hash and the local colour/layout analysis take ~0.15 s per 1080p upload, so on
+a host with few cores it adds up linearly with N. Per round the report splits
+the mean LLM wait per request (llm_call stage) from the preprocessing stages
+(image_decode, phash, color_analysis, layout_analysis, prompt_build, json_parse),
+both read from /metrics, and gives the process CPU time per request;
+"cpu bound" is the wall-clock that CPU time alone needs on this host's cores.
+
+Usage (from backend/):
+    python benchmarks/bench_concurrent_audit.py --requests 1 4 16 --latency 0.5
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.generativeai as genai
+import httpx
+from PIL import Image
+
+FAKE_AUDIT = {
+    "score": 62,
+    "summary": "Benchmark denetimi",
+    "violations": [
+        {
+            "rule_section": "4. Color Palette & Semantics",
+            "issue": "Çok fazla renk kullanılmış",
+            "recommendation": "Paleti 3 renge indirin",
+            "severity": "High"
+        }
+    ],
+    "positive_points": ["KPI'lar sol üstte"]
+}
+
+FAKE_ASSETS = {
+    "theme_json": {"name": "Benchmark"},
+    "action_list": [{"step": 1, "action": "Paleti sadeleştirin", "reason": "4. Color Palette & Semantics ihlali"}]
+}
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def __iter__(self):
+        # stream=True: hand the text out in small chunks
+        for i in range(0, len(self.text), 16):
+            yield _FakeResponse(self.text[i:i + 16])
+
+
+class FakeGenerativeModel:
+    """Blocking stand-in for genai.GenerativeModel with a fixed latency."""
+    latency = 0.5
+
+    def __init__(self, model_name, system_instruction=None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ""
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        time.sleep(self.latency)
+        parts = contents if isinstance(contents, list) else [contents]
+        prompt = self.system_instruction + "".join(p for p in parts if isinstance(p, str))
+        if "İnşaatçı" in prompt:
+            return _FakeResponse(json.dumps(FAKE_ASSETS))
+        return _FakeResponse(json.dumps(FAKE_AUDIT))
+
+
+def make_image_bytes(seed, width=1920, height=1080):
+    # A unique pixel per request keeps the audit cache from short-circuiting the benchmark.
+    image = Image.new("RGB", (width, height), (245, 245, 245))
+    image.putpixel((seed % width, (seed // width) % height), (0, 0, 0))
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+PREPROCESS_STAGES = ("image_decode", "phash", "color_analysis", "layout_analysis", "prompt_build", "json_parse")
+STAGE_SUM = re.compile(r'^\w+_stage_duration_seconds_sum\{stage="(\w+)"\} (\S+)$', re.MULTILINE)
+
+
+async def stage_seconds(client):
+    """Total seconds spent so far in each processing stage, from /metrics."""
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    return {stage: float(value) for stage, value in STAGE_SUM.findall(response.text)}
+
+
+async def run_round(app, n, offset):
+    """Returns (wall seconds, LLM wait per request, preprocessing per request, CPU seconds per request)."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        images = [make_image_bytes(offset + i) for i in range(n)]
+
+        async def one(image_bytes):
+            files = {"file": ("dashboard.png", image_bytes, "image/png")}
+            response = await client.post("/audit", files=files)
+            response.raise_for_status()
+
+        before = await stage_seconds(client)
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(image_bytes) for image_bytes in images))
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        after = await stage_seconds(client)
+
+    def spent(stages):
+        return sum(after.get(stage, 0.0) - before.get(stage, 0.0) for stage in stages) / n
+
+    return elapsed, spent(["llm_call"]), spent(PREPROCESS_STAGES), cpu / n
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency per call (s)")
+    args = parser.parse_args()
+
+    FakeGenerativeModel.latency = args.latency
+    genai.GenerativeModel = FakeGenerativeModel
+    os.environ.setdefault("AUDIT_CACHE_DIR", tempfile.mkdtemp(prefix="bench-audit-cache-"))
+    os.environ.setdefault("PROMPT_CACHE_BACKEND", "local")
+
+    from main import app
+
+    # Each /audit makes two sequential LLM calls: audit_dashboard + generate_assets.
+    single = 2 * args.latency
+    cores = os.cpu_count() or 1
+    print(f"fake LLM latency: {args.latency:.2f}s  (one /audit ~ {single:.2f}s), {cores} CPU core(s)")
+    print(f"{'N':>5} {'wall (s)':>10} {'wall / one':>11} {'llm wait/req':>13} {'prep/req':>9} {'cpu/req':>8} {'cpu bound':>10} {'serial would be':>16}")
+    offset = 0
+    for n in args.requests:
+        elapsed, llm_wait, preprocess, cpu = await run_round(app, n, offset)
+        offset += n
+        print(f"{n:>5} {elapsed:>10.2f} {elapsed / max(single, 1e-9):>11.2f} {llm_wait:>12.2f}s {preprocess:>8.2f}s "
+              f"{cpu:>7.2f}s {n * cpu / cores:>9.2f}s {n * single:>15.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,473 @@
+"""
+End-to-end endpoint benchmark against the fake LLM provider.
+
+Drives the real FastAPI app with no Gemini traffic (LLM_PROVIDER=fake) and measures,
+per scenario and concurrency level: throughput, p50/p95/p99 latency, errors and the
+server's peak RSS. Scenarios:
+
+    audit_720p, audit_1080p, audit_4k   POST /audit with synthetic dashboards
+    simulate, revise, chat              POST /simulate, /revise, /chat
+    rules_read, rules_update            GET /manifesto/rules, POST /manifesto/rules/update
+    rules_add_delete                    add a rule, then delete it again
+    ws_live                             one /ws/live voice turn (audio in, reply audio out)
+
+Modes:
+    inprocess  HTTP calls go straight to the ASGI app (httpx.ASGITransport); the
+               websocket scenario uses a uvicorn server started in the same event loop
+    http       the app runs in a separate `uvicorn main:app` process and is driven
+               over TCP, so serialization and the network stack are included
+
+Results are written as JSON. With --baseline, every scenario/concurrency pair is
+compared with the stored run and the script exits with status 1 if p95 latency or
+peak RSS grew, or throughput fell, by more than --tolerance. Audit caching is off
+and every request carries unique input, so nothing is served from a cache or
+coalesced with another request. manifesto.md is restored after the rules scenarios.
+
+Usage (from backend/):
+    python benchmarks/bench_endpoints.py
+    python benchmarks/bench_endpoints.py --mode http --concurrency 1 8 32
+    python benchmarks/bench_endpoints.py --scenarios audit_1080p chat --requests 64
+    python benchmarks/bench_endpoints.py --save-baseline
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+MANIFESTO_PATH = os.path.join(BACKEND_DIR, "manifesto.md")
+
+# Server settings for a benchmark run; anything already set in the environment wins
+BENCH_ENV = {
+    "LLM_PROVIDER": "fake",
+    "FAKE_LLM_LATENCY": "lognormal:0.2,0.3",
+    "FAKE_LLM_SEED": "1",
+    "FAKE_LIVE_REPLY_SECONDS": "1",
+    "PROMPT_CACHE_BACKEND": "local",
+    "GEMINI_RPM": "0",
+    "GEMINI_TPM": "0",
+    "LLM_INITIAL_CONCURRENCY": "64",
+    "LLM_MAX_CONCURRENCY": "64",
+    "AUDIT_CACHE_MEMORY_ENTRIES": "0",
+    "AUDIT_CACHE_DISK_MB": "0",
+}
+for _name, _value in BENCH_ENV.items():
+    os.environ.setdefault(_name, _value)
+os.environ.setdefault("AUDIT_CACHE_DIR", tempfile.mkdtemp(prefix="bench-endpoints-"))
+
+import httpx
+import websockets
+
+from bench_image_normalization import synthetic_dashboard
+
+AUDIT_SIZES = {"audit_720p": (1280, 720), "audit_1080p": (1920, 1080), "audit_4k": (3840, 2160)}
+SCENARIOS = list(AUDIT_SIZES) + ["simulate", "revise", "chat", "rules_read", "rules_update", "rules_add_delete", "ws_live"]
+
+AUDIT_RESULT = {
+    "score": 62,
+    "summary": "Benchmark denetimi",
+    "violations": [
+        {"rule_section": "1. Layout & Grid Architecture", "issue": "KPI kartları hizasız",
+         "recommendation": "8px ızgaraya hizalayın", "severity": "Medium"},
+        {"rule_section": "4. Color Palette & Semantics", "issue": "Çok fazla renk",
+         "recommendation": "Paleti sadeleştirin", "severity": "High"}
+    ],
+    "positive_points": []
+}
+ASSETS = {
+    "theme_json": {"name": "Benchmark", "dataColors": ["#1F4E79", "#F28E2B"]},
+    "action_list": [{"step": 1, "action": "Kartları hizalayın", "reason": "Izgara ihlali"}]
+}
+BENCH_RULE_PREFIX = "Benchmark kuralı"
+
+# Live audio: 4 x 100 ms of 16 kHz 16-bit mono in, a 24 kHz 16-bit mono reply out
+LIVE_CHUNK = base64.b64encode(bytes(3200)).decode("ascii")
+LIVE_CHUNKS_PER_TURN = 4
+
+
+class Target:
+    """Where requests go: an httpx client for HTTP plus a ws:// base URL for /ws/live."""
+
+    def __init__(self, client, ws_url, pid):
+        self.client = client
+        self.ws_url = ws_url
+        self.pid = pid
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def rss_mb(pid):
+    """Current resident set size of `pid` in MB, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def max_rss_fallback_mb(pid):
+    """Lifetime peak RSS from getrusage, used when /proc cannot be sampled."""
+    who = resource.RUSAGE_SELF if pid == os.getpid() else resource.RUSAGE_CHILDREN
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RssSampler:
+    """Samples a process's RSS in the background and keeps the maximum seen."""
+
+    def __init__(self, pid, interval=0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            current = rss_mb(self.pid)
+            if current is None:
+                return
+            self.peak = max(self.peak, current)
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+        if not self.peak:
+            self.peak = max_rss_fallback_mb(self.pid)
+
+
+def image_pool(size, count):
+    """Distinct synthetic dashboards of one size, so concurrent audits never coalesce."""
+    width, height = size
+    return [synthetic_dashboard(width, height, "RGB", seed) for seed in range(count)]
+
+
+def check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.url.path} returned {response.status_code}: {response.text[:200]}")
+    return response
+
+
+async def live_turn(target, i):
+    """One voice turn over /ws/live; returns once the whole spoken reply has arrived."""
+    expected = int(float(os.environ["FAKE_LIVE_REPLY_SECONDS"]) * 24000 * 2)
+    async with websockets.connect(target.ws_url + "/ws/live", max_size=None) as ws:
+        while True:
+            message = json.loads(await ws.recv())
+            if message["type"] == "error":
+                raise RuntimeError(message["message"])
+            if message["type"] == "status" and message["message"] == "Connected successfully":
+                break
+        await ws.send(json.dumps({"type": "context", "audit_result": {"score": 62, "violations_count": 2}}))
+        for n in range(LIVE_CHUNKS_PER_TURN):
+            await ws.send(json.dumps({"type": "audio", "data": LIVE_CHUNK, "turn_complete": n == LIVE_CHUNKS_PER_TURN - 1}))
+        received = 0
+        while received < expected:
+            message = json.loads(await ws.recv())
+            if message["type"] == "error":
+                raise RuntimeError(message["message"])
+            if message["type"] == "audio":
+                received += len(base64.b64decode(message["data"]))
+        await ws.send(json.dumps({"type": "stop"}))
+
+
+async def rules_add_delete(target, i):
+    name = f"{BENCH_RULE_PREFIX} {i}"
+    check(await target.client.post("/manifesto/rules/add", json={"section_id": 1, "name": name, "description": "Geçici kural"}))
+    rules = check(await target.client.get("/manifesto/rules")).json()["rules"]
+    section = next(s for s in rules if s["id"] == 1)
+    rule = next((r for r in section["rules"] if r["name"] == name), None)
+    if rule is not None:
+        check(await target.client.post("/manifesto/rules/delete", json={"section_id": 1, "rule_id": rule["id"]}))
+
+
+def make_operation(name, args):
+    """Returns an async `op(target, i)` issuing request number i of a scenario."""
+    if name in AUDIT_SIZES:
+        pool = image_pool(AUDIT_SIZES[name], max(args.concurrency) * 2)
+
+        async def audit(target, i):
+            files = {"file": (f"dashboard-{i}.png", pool[i % len(pool)], "image/png")}
+            check(await target.client.post("/audit", files=files))
+        return audit
+    if name == "simulate":
+        async def simulate(target, i):
+            check(await target.client.post("/simulate", json={"audit_result": AUDIT_RESULT, "user_feedback": f"Varyant {i}"}))
+        return simulate
+    if name == "revise":
+        async def revise(target, i):
+            check(await target.client.post("/revise", json={"current_assets": ASSETS, "user_feedback": f"Renkleri koyulaştır #{i}"}))
+        return revise
+    if name == "chat":
+        async def chat(target, i):
+            body = {"chat_history": [], "user_input": f"Skoru nasıl artırırım? #{i}", "audit_result": AUDIT_RESULT}
+            check(await target.client.post("/chat", json=body))
+        return chat
+    if name == "rules_read":
+        async def rules_read(target, i):
+            check(await target.client.get("/manifesto/rules"))
+        return rules_read
+    if name == "rules_update":
+        rules = parse_rules()
+        rule = rules[0]["rules"][0]
+
+        async def rules_update(target, i):
+            # Rewrites the first rule with its own values, so the file content stays the same
+            body = {"section_id": rules[0]["id"], "rule_id": rule["id"], "name": rule["name"], "description": rule["description"]}
+            check(await target.client.post("/manifesto/rules/update", json=body))
+        return rules_update
+    if name == "rules_add_delete":
+        return rules_add_delete
+    if name == "ws_live":
+        return live_turn
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def parse_rules():
+    from utils.common import load_manifesto, parse_manifesto_to_rules
+    return parse_manifesto_to_rules(load_manifesto())
+
+
+async def run_level(target, op, concurrency, requests):
+    """Runs `requests` calls of `op` with `concurrency` workers; returns the level's metrics."""
+    latencies = []
+    errors = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await op(target, i)
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    with RssSampler(target.pid) as sampler:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 1) if value is not None else None
+    return {
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "peak_rss_mb": round(sampler.peak, 1)
+    }
+
+
+async def run_scenarios(target, args, report):
+    results = {}
+    for name in args.scenarios:
+        op = make_operation(name, args)
+        await op(target, -1)  # warm-up: imports, first model, first manifesto parse
+        results[name] = {}
+        for concurrency in args.concurrency:
+            metrics = await run_level(target, op, concurrency, max(args.requests, concurrency))
+            results[name][str(concurrency)] = metrics
+            report(name, concurrency, metrics)
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_inprocess(args, report):
+    import uvicorn
+
+    with contextlib.redirect_stdout(io.StringIO()) as server_log:
+        import main
+        port = free_port()
+        # The uvicorn server runs the app's startup hooks and serves /ws/live; plain
+        # HTTP requests skip the socket and go through ASGITransport
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+        serve_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+                target = Target(client, f"ws://127.0.0.1:{port}", os.getpid())
+                return await run_scenarios(target, args, quiet(report, server_log))
+        finally:
+            server.should_exit = True
+            await serve_task
+
+
+async def run_http(args, report):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited with status {server.returncode}")
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("Server did not start within 60s")
+                    await asyncio.sleep(0.2)
+            target = Target(client, f"ws://127.0.0.1:{port}", server.pid)
+            return await run_scenarios(target, args, report)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def quiet(report, server_log):
+    """Wraps `report` so results reach the terminal while the app's prints are swallowed."""
+    def wrapped(name, concurrency, metrics):
+        server_log.seek(0)
+        server_log.truncate()
+        with contextlib.redirect_stdout(sys.__stdout__):
+            report(name, concurrency, metrics)
+    return wrapped
+
+
+def print_row(name, concurrency, metrics):
+    print(f"{name:>17} {concurrency:>4} {metrics['throughput_rps']:>8} {metrics['p50_ms']!s:>9} {metrics['p95_ms']!s:>9} "
+          f"{metrics['p99_ms']!s:>9} {metrics['peak_rss_mb']:>8} {metrics['errors']:>4}", flush=True)
+
+
+def compare(results, baseline, tolerance):
+    """Lists regressions beyond `tolerance` (a fraction) against a baseline run."""
+    regressions = []
+    for name, levels in results.items():
+        for concurrency, current in levels.items():
+            previous = baseline.get(name, {}).get(concurrency)
+            if not previous:
+                continue
+            checks = [
+                ("p95_ms", current["p95_ms"], previous["p95_ms"], 1),
+                ("peak_rss_mb", current["peak_rss_mb"], previous["peak_rss_mb"], 1),
+                ("throughput_rps", current["throughput_rps"], previous["throughput_rps"], -1),
+            ]
+            for metric, now, before, direction in checks:
+                if now is None or not before:
+                    continue
+                change = (now - before) / before
+                if change * direction > tolerance:
+                    regressions.append(f"{name} @ {concurrency}: {metric} {before} -> {now} ({change:+.0%})")
+            if current["errors"] > previous["errors"]:
+                regressions.append(f"{name} @ {concurrency}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def run_metadata(args):
+    return {
+        "mode": args.mode,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fake_llm_latency": os.environ["FAKE_LLM_LATENCY"],
+        "requests_per_level": args.requests,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="concurrency levels, in order")
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario and level (at least the concurrency)")
+    parser.add_argument("--output", default=None, help="write this run's results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression before failing")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline for its mode")
+    args = parser.parse_args()
+
+    manifesto_backup = None
+    if any(name.startswith("rules_") and name != "rules_read" for name in args.scenarios):
+        manifesto_backup = tempfile.NamedTemporaryFile(delete=False, suffix=".md").name
+        shutil.copyfile(MANIFESTO_PATH, manifesto_backup)
+
+    print(f"mode={args.mode} fake_latency={os.environ['FAKE_LLM_LATENCY']} requests/level={args.requests}")
+    print(f"{'scenario':>17} {'conc':>4} {'rps':>8} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'rss_mb':>8} {'errs':>4}")
+    try:
+        runner = run_inprocess if args.mode == "inprocess" else run_http
+        results = asyncio.run(runner(args, print_row))
+    finally:
+        if manifesto_backup:
+            shutil.copyfile(manifesto_backup, MANIFESTO_PATH)
+            os.remove(manifesto_backup)
+
+    run = {"meta": run_metadata(args), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2, ensure_ascii=False)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.save_baseline:
+        baseline[args.mode] = run
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Baseline for mode '{args.mode}' saved to {args.baseline}")
+        return
+
+    previous = baseline.get(args.mode)
+    if not previous:
+        print(f"No '{args.mode}' baseline in {args.baseline}; run with --save-baseline to create one")
+        return
+    if previous["meta"]["fake_llm_latency"] != run["meta"]["fake_llm_latency"]:
+        print("Warning: baseline was recorded with a different FAKE_LLM_LATENCY; comparison is not meaningful")
+    regressions = compare(results, previous["results"], args.tolerance)
+    if regressions:
+        print(f"Regressions beyond {args.tolerance:.0%} vs baseline ({previous['meta']['timestamp']}):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} vs baseline ({previous['meta']['timestamp']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Image normalisation benchmark.
+
+Runs normalize_image over a corpus of dashboard screenshots and reports bytes
+before/after, compression ratio and decode/encode time per image. Without
+--corpus, a synthetic corpus of dashboard-like PNG exports (720p to 4K, with
+and without alpha) is generated in memory.
+
+Usage (from backend/):
+    python benchmarks/bench_image_normalization.py
+    python benchmarks/bench_image_normalization.py --corpus ~/dashboards --max-edge 1600 --format WEBP
+"""
+import argparse
+import io
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from utils.auditor import normalize_image, AUDIT_IMAGE_MAX_EDGE, AUDIT_IMAGE_FORMAT, AUDIT_IMAGE_QUALITY
+
+SYNTHETIC_SIZES = [(1280, 720), (1920, 1080), (2560, 1440), (3840, 2160)]
+PALETTE = [(31, 78, 121), (242, 142, 43), (89, 161, 79), (225, 87, 89), (118, 183, 178)]
+
+
+def synthetic_dashboard(width, height, mode, seed):
+    """Draws a KPI row, charts and a table, roughly like a Power BI export."""
+    rng = random.Random(seed)
+    background = (255, 255, 255, 0) if mode == "RGBA" else (243, 242, 241)
+    image = Image.new(mode, (width, height), background)
+    draw = ImageDraw.Draw(image)
+    pad = width // 64
+
+    draw.text((pad, pad), "Sales Overview FY2024", fill=(20, 20, 20))
+    kpi_w = (width - 5 * pad) // 4
+    for i in range(4):
+        x = pad + i * (kpi_w + pad)
+        draw.rectangle([x, pad * 3, x + kpi_w, height // 6], fill=(255, 255, 255), outline=(200, 200, 200))
+        draw.text((x + pad, pad * 4), f"KPI {i + 1}: {rng.randint(100, 999)}K", fill=(20, 20, 20))
+
+    chart_top = height // 6 + pad
+    chart_w = (width - 3 * pad) // 2
+    for c in range(2):
+        x0 = pad + c * (chart_w + pad)
+        draw.rectangle([x0, chart_top, x0 + chart_w, height * 2 // 3], fill=(255, 255, 255), outline=(200, 200, 200))
+        bars = 12
+        for b in range(bars):
+            bar_h = rng.randint(height // 20, height // 3)
+            bx = x0 + pad + b * (chart_w - 2 * pad) // bars
+            draw.rectangle([bx, height * 2 // 3 - pad - bar_h, bx + chart_w // (bars * 2), height * 2 // 3 - pad], fill=PALETTE[b % len(PALETTE)])
+
+    row_h = max(12, height // 60)
+    for r in range((height // 3 - 2 * pad) // row_h):
+        y = height * 2 // 3 + pad + r * row_h
+        draw.line([pad, y, width - pad, y], fill=(220, 220, 220))
+        draw.text((pad * 2, y + 1), f"Region {r}  {rng.random() * 1000:.1f}", fill=(60, 60, 60))
+
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def load_corpus(path):
+    corpus = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith((".png", ".jpg", ".jpeg", ".webp", ".bmp")):
+            with open(os.path.join(path, name), "rb") as f:
+                corpus.append((name, f.read()))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of dashboard screenshots")
+    parser.add_argument("--max-edge", type=int, default=AUDIT_IMAGE_MAX_EDGE)
+    parser.add_argument("--format", default=AUDIT_IMAGE_FORMAT)
+    parser.add_argument("--quality", type=int, default=AUDIT_IMAGE_QUALITY)
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = [
+            (f"synthetic_{w}x{h}_{mode.lower()}.png", synthetic_dashboard(w, h, mode, seed=w + h))
+            for w, h in SYNTHETIC_SIZES for mode in ("RGB", "RGBA")
+        ]
+
+    print(f"max_edge={args.max_edge} format={args.format} quality={args.quality}")
+    print(f"{'image':<34} {'before (KB)':>12} {'after (KB)':>11} {'ratio':>6} {'decode ms':>10} {'encode ms':>10}")
+    total_before = total_after = 0
+    for name, data in corpus:
+        _, stats = normalize_image(data, args.max_edge, args.format.upper(), args.quality)
+        total_before += stats["original_bytes"]
+        total_after += stats["normalized_bytes"]
+        print(
+            f"{name[:34]:<34} {stats['original_bytes'] / 1024:>12.1f} {stats['normalized_bytes'] / 1024:>11.1f} "
+            f"{stats['original_bytes'] / stats['normalized_bytes']:>6.1f} {stats['decode_ms']:>10.1f} {stats['encode_ms']:>10.1f}"
+        )
+    print(f"{'TOTAL':<34} {total_before / 1024:>12.1f} {total_after / 1024:>11.1f} {total_before / max(total_after, 1):>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Perceptual index benchmark.
+
+Fills the multi-index hash table with N random 64-bit hashes, queries it with
+bit-flipped copies of stored hashes, and reports insert time, query latency and
+recall at several Hamming radii next to a linear scan.
+
+Usage (from backend/):
+    python benchmarks/bench_phash_index.py --sizes 10000 100000 300000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.phash_index import MultiIndexHash, hamming_distance
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--radii", type=int, nargs="+", default=[4, 6, 8, 11])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'size':>8} {'insert (s)':>11} {'radius':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} {'linear (ms)':>12} {'recall':>7}")
+    for size in args.sizes:
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        index = MultiIndexHash()
+        start = time.perf_counter()
+        for i, value in enumerate(hashes):
+            index.add(value, i)
+        insert_time = time.perf_counter() - start
+
+        targets = rng.sample(range(size), args.queries)
+        for radius in args.radii:
+            timings = []
+            found = 0
+            for target in targets:
+                query = flip_bits(hashes[target], rng.randint(0, radius), rng)
+                start = time.perf_counter()
+                matches = index.search(query, radius)
+                timings.append((time.perf_counter() - start) * 1000)
+                found += any(payload == target for _, payload in matches)
+
+            query = flip_bits(hashes[targets[0]], radius, rng)
+            start = time.perf_counter()
+            [i for i, value in enumerate(hashes) if hamming_distance(query, value) <= radius]
+            linear = (time.perf_counter() - start) * 1000
+
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{size:>8} {insert_time:>11.2f} {radius:>7} {statistics.median(timings):>9.3f} {p95:>9.3f} {linear:>12.1f} {found / len(targets):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
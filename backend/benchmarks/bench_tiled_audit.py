@@ -0,0 +1,174 @@
+"""
+Tiled vs single-shot audit benchmark.
+
+Plants small red markers (stand-ins for small defects such as illegible labels)
+on synthetic dashboard pages of increasing size, then audits each page with the
+single-shot path and with tiled=True. The fake vision model "sees" a marker only
+if it is still saturated red in the image it receives, so detail lost to
+downscaling shows up as missed violations, and its latency grows with the pixel
+count of the image, like a real vision call.
+
+Reports per page size: latency, number of vision calls, marker recall and
+duplicate reports that survived the merge.
+
+Usage (from backend/):
+    python benchmarks/bench_tiled_audit.py
+    python benchmarks/bench_tiled_audit.py --markers 30 --base-latency 0.3 --latency-per-mp 0.4
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AUDIT_CACHE_DIR", tempfile.mkdtemp(prefix="bench-tiled-"))
+os.environ.setdefault("PROMPT_CACHE_BACKEND", "local")
+
+import google.generativeai as genai
+import numpy as np
+from PIL import Image, ImageDraw
+
+from bench_image_normalization import synthetic_dashboard
+
+PAGE_SIZES = [(1920, 1080), (3840, 1080), (1600, 4800), (5120, 2880)]
+MARKER_SIZE = 4
+MARKER_SECTION = "3. Typography & Readability"
+LAYOUT_VIOLATION = {
+    "rule_section": "1. Layout & Grid Architecture",
+    "issue": "Görseller ızgaraya hizalı değil",
+    "recommendation": "Görselleri ortak bir ızgaraya hizalayın",
+    "severity": "Medium",
+    "bbox": [0.0, 0.0, 1.0, 0.2]
+}
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def find_markers(image):
+    """Bounding boxes (0-1 fractions) of saturated red blobs in a PIL image."""
+    pixels = np.asarray(image.convert("RGB")).astype(np.int16)
+    mask = (pixels[:, :, 0] > 150) & (pixels[:, :, 1] < 60) & (pixels[:, :, 2] < 60)
+    ys, xs = np.nonzero(mask)
+    clusters = []
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        for cluster in clusters:
+            if abs(cluster[0] - x) <= 8 and abs(cluster[1] - y) <= 8:
+                cluster[2] = min(cluster[2], x)
+                cluster[3] = min(cluster[3], y)
+                cluster[4] = max(cluster[4], x)
+                cluster[5] = max(cluster[5], y)
+                break
+        else:
+            clusters.append([x, y, x, y, x, y])
+    width, height = image.size
+    return [[(c[2] - 1) / width, (c[3] - 1) / height, (c[4] + 2) / width, (c[5] + 2) / height] for c in clusters]
+
+
+class FakeVisionModel:
+    """Blocking stand-in for genai.GenerativeModel whose latency and findings depend on the image."""
+    base_latency = 0.3
+    latency_per_mp = 0.4
+    calls = 0
+    lock = threading.Lock()
+
+    def __init__(self, model_name, system_instruction=None, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        with FakeVisionModel.lock:
+            FakeVisionModel.calls += 1
+        prompt = "".join(p for p in contents if isinstance(p, str))
+        blob = next(p for p in contents if isinstance(p, dict))
+        image = Image.open(io.BytesIO(blob["data"]))
+        time.sleep(self.base_latency + self.latency_per_mp * image.width * image.height / 1e6)
+
+        violations = []
+        if "TAMAMINI" not in prompt:
+            for bbox in find_markers(image):
+                violations.append({
+                    "rule_section": MARKER_SECTION,
+                    "issue": "Etiket okunamayacak kadar küçük",
+                    "recommendation": "Yazı boyutunu en az 10pt yapın",
+                    "severity": "Low",
+                    "bbox": bbox
+                })
+        if "bölgesidir" not in prompt:
+            violations.append(dict(LAYOUT_VIOLATION))
+        return _FakeResponse(json.dumps({"score": 70, "summary": "Benchmark denetimi", "violations": violations, "positive_points": []}))
+
+
+def make_page(width, height, markers, seed):
+    """Synthetic dashboard page with `markers` small red squares at random spots; returns (png_bytes, centres)."""
+    rng = random.Random(seed)
+    image = Image.open(io.BytesIO(synthetic_dashboard(width, height, "RGB", seed)))
+    draw = ImageDraw.Draw(image)
+    centres = []
+    while len(centres) < markers:
+        x, y = rng.randrange(20, width - 20), rng.randrange(20, height - 20)
+        if all(abs(x - cx) > 40 or abs(y - cy) > 40 for cx, cy in centres):
+            draw.rectangle([x, y, x + MARKER_SIZE - 1, y + MARKER_SIZE - 1], fill=(230, 0, 0))
+            centres.append((x + MARKER_SIZE / 2, y + MARKER_SIZE / 2))
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue(), centres
+
+
+def score_recall(result, centres, width, height):
+    """Returns (recall, duplicates) of marker violations against the planted centres."""
+    hits = {}
+    for violation in result.get("violations", []):
+        if violation.get("rule_section") != MARKER_SECTION or "bbox" not in violation:
+            continue
+        x0, y0, x1, y1 = violation["bbox"]
+        if max(x0, y0, x1, y1) <= 1.0:
+            # Single-shot bboxes are fractions of the page, tiled ones are page pixels
+            x0, x1, y0, y1 = x0 * width, x1 * width, y0 * height, y1 * height
+        for i, (cx, cy) in enumerate(centres):
+            if x0 - 4 <= cx <= x1 + 4 and y0 - 4 <= cy <= y1 + 4:
+                hits[i] = hits.get(i, 0) + 1
+                break
+    return len(hits) / len(centres), sum(count - 1 for count in hits.values())
+
+
+async def run(args):
+    from utils.auditor import audit_dashboard
+    from utils.common import load_manifesto
+
+    manifesto = load_manifesto()
+    print(f"{'page':>11} {'mode':>7} {'calls':>5} {'latency_s':>9} {'recall':>6} {'dupes':>5} {'score':>5}")
+    for width, height in PAGE_SIZES:
+        page, centres = make_page(width, height, args.markers, seed=width * height)
+        for tiled in (False, True):
+            FakeVisionModel.calls = 0
+            start = time.perf_counter()
+            result = await audit_dashboard(page, manifesto, tiled=tiled)
+            elapsed = time.perf_counter() - start
+            recall, duplicates = score_recall(result, centres, width, height)
+            print(f"{width:>5}x{height:<5} {'tiled' if tiled else 'single':>7} {FakeVisionModel.calls:>5} "
+                  f"{elapsed:>9.2f} {recall:>6.2f} {duplicates:>5} {result['score']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--markers", type=int, default=20, help="small defects planted per page")
+    parser.add_argument("--base-latency", type=float, default=0.3, help="fixed seconds per fake vision call")
+    parser.add_argument("--latency-per-mp", type=float, default=0.4, help="extra seconds per megapixel sent")
+    args = parser.parse_args()
+
+    FakeVisionModel.base_latency = args.base_latency
+    FakeVisionModel.latency_per_mp = args.latency_per_mp
+    genai.GenerativeModel = FakeVisionModel
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Deterministic check for the streamed audit parser (utils/json_stream.AuditStreamParser).
+
+Canned audit documents whose strings hold escaped quotes, backslashes, braces and
+brackets are fed to the parser split in two at every byte offset, and one character
+at a time. Each run must end with the same object json.loads gives, and its events
+must carry every violation once, in order, and every other top-level field once with
+its final value. Every truncated prefix must then give an incomplete result holding
+only fields and violations that completed before the cut. Exits 1 on any mismatch.
+
+Usage (from backend/):
+    python benchmarks/check_json_stream.py
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.json_stream import AuditStreamParser
+
+AUDIT = {
+    "score": 64,
+    "summary": 'Başlık "Satış {2024}" ve [Q1] kartları \\ ayırıcıyla çakışıyor: {"x": 1}',
+    "violations": [
+        {
+            "rule_section": "1. Layout",
+            "rule": "Grid Alignment",
+            "severity": "Medium",
+            "issue": 'Kart "Gelir}" 3px kaymış, \\\\server\\share yolu görünüyor',
+            "recommendation": "Kartları {ızgara} çizgisine hizala; \"snap\" açık olsun",
+            "bbox": [0.1, 0.2, 0.45, 0.5],
+        },
+        {
+            "rule_section": "4. Color",
+            "rule": "3-Color Rule",
+            "severity": "High",
+            "issue": "5 farklı vurgu rengi: [#1F4E79, #C00000, ...]",
+            "recommendation": "Paleti ]] üç renge indir }}",
+            "details": {"colors": ["#1F4E79", "#C00000"], "nested": {"a": [1, {"b": "}"}]}},
+        },
+        {"rule_section": "2. Text", "rule": "Font", "severity": "Low", "issue": "tab\tve satır\nsonu", "recommendation": ""},
+    ],
+    "positive_points": ["Tutarlı \"KPI\" başlıkları", "Boş { alan yok"],
+    "empty": [],
+    "flag": True,
+    "note": None,
+}
+
+DOCUMENTS = {
+    "compact": json.dumps(AUDIT, ensure_ascii=False, separators=(",", ":")),
+    "pretty": json.dumps(AUDIT, ensure_ascii=False, indent=2),
+    "ascii escapes": json.dumps(AUDIT),
+    "fenced": "```json\n" + json.dumps(AUDIT, ensure_ascii=False, indent=2) + "\n```",
+}
+
+
+def check_events(events, expected):
+    """Violations once each and in order; every other field once with its final value."""
+    violations = [data for event, data in events if event == "violation"]
+    fields = [(event, data) for event, data in events if event != "violation"]
+    problems = []
+    if violations != expected["violations"]:
+        problems.append(f"violation events {len(violations)} != {len(expected['violations'])}")
+    if fields != [(key, value) for key, value in expected.items() if key != "violations"]:
+        problems.append(f"field events {[event for event, _ in fields]}")
+    return problems
+
+
+def run(chunks):
+    parser = AuditStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return parser, events
+
+
+def check_document(name, text):
+    expected = json.loads(text.strip().strip("`").removeprefix("json"))
+    failures = []
+
+    splits = [[text[:offset], text[offset:]] for offset in range(len(text) + 1)] + [list(text)]
+    for chunks in splits:
+        try:
+            parser, events = run(chunks)
+            problems = check_events(events, expected)
+            if parser.result() != (expected, True):
+                problems.append("result differs from json.loads")
+        except Exception as e:
+            problems = [f"parser raised {type(e).__name__}: {e}"]
+        if problems:
+            failures.append(f"split at {len(chunks[0]) if len(chunks) == 2 else 'every char'}: {'; '.join(problems)}")
+
+    seen = 0
+    for cut in range(len(text)):
+        try:
+            parser, events = run([text[:cut]])
+            partial, complete = parser.result()
+        except Exception as e:
+            failures.append(f"truncated at {cut}: parser raised {type(e).__name__}: {e}")
+            continue
+        problems = []
+        if complete and cut < len(text.rstrip("`\n")):
+            problems.append("reported complete")
+        if not complete:
+            violations = partial["violations"]
+            if violations != expected["violations"][:len(violations)]:
+                problems.append("violations are not a prefix of the full list")
+            if len(violations) < seen:
+                problems.append("lost a violation that had completed")
+            seen = len(violations)
+            stray = [key for key, value in partial.items() if key != "violations" and expected.get(key, object()) != value]
+            if stray:
+                problems.append(f"fields not in their final form: {stray}")
+        if problems:
+            failures.append(f"truncated at {cut}: {'; '.join(problems)}")
+
+    print(f"{name}: {len(text)} chars, {len(splits)} splits, {len(text)} truncations "
+          f"{'ok' if not failures else f'FAIL ({len(failures)})'}")
+    for failure in failures[:5]:
+        print(f"    {failure}")
+    return len(failures)
+
+
+def main():
+    return sum(check_document(name, text) for name, text in DOCUMENTS.items())
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
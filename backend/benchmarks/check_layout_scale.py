@@ -0,0 +1,80 @@
+"""
+Regression check for the local layout analysis on large uploads.
+
+Draws perfectly aligned grids of cards with a fixed gap at sizes above
+AUDIT_IMAGE_MAX_EDGE, sends each through POST /audit (fake LLM provider, so the
+upload is normalised exactly as in production) and checks that the local layout
+measurements are in screenshot pixels: the reported minimum gap equals the drawn
+gap, the misalignment is 0 and no local Grid Alignment or Whitespace violation is
+raised. Exits 1 on the first failing page.
+
+Usage (from backend/):
+    python benchmarks/check_layout_scale.py
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "constant:0")
+os.environ.setdefault("AUDIT_CACHE_DIR", tempfile.mkdtemp(prefix="check-layout-"))
+
+import httpx
+from PIL import Image, ImageDraw
+
+# (width, height, gap in px): the sizes the layout check used to misread after downscaling
+PAGES = [(2560, 1440, 24), (3840, 2160, 30), (1920, 1080, 24)]
+COLUMNS, ROWS = 4, 3
+
+
+def aligned_grid(width, height, gap):
+    """COLUMNS x ROWS bordered cards on a grey page, every edge on the grid and `gap` px apart."""
+    image = Image.new("RGB", (width, height), (243, 242, 241))
+    draw = ImageDraw.Draw(image)
+    card_w = (width - (COLUMNS + 1) * gap) // COLUMNS
+    card_h = (height - (ROWS + 1) * gap) // ROWS
+    for row in range(ROWS):
+        for col in range(COLUMNS):
+            left, top = gap + col * (card_w + gap), gap + row * (card_h + gap)
+            draw.rectangle((left, top, left + card_w - 1, top + card_h - 1), fill=(255, 255, 255), outline=(200, 200, 200))
+            for bar in range(5):
+                bar_h = card_h // 3 + bar * card_h // 12
+                x = left + card_w // 8 + bar * card_w // 7
+                draw.rectangle((x, top + card_h - 8 - bar_h, x + card_w // 10, top + card_h - 8), fill=(31, 78, 121))
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+async def main():
+    with contextlib.redirect_stdout(io.StringIO()):
+        from main import app
+        from utils.layout_analysis import LAYOUT_RULES
+
+    failures = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check", timeout=None) as client:
+        for width, height, gap in PAGES:
+            files = {"file": ("grid.png", aligned_grid(width, height, gap), "image/png")}
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = await client.post("/audit", files=files)
+            response.raise_for_status()
+            audit = response.json()["audit_result"]
+            layout = audit["local_analysis"]["layout"]
+            local = [v["issue"] for v in audit["violations"]
+                     if v.get("source") == "local" and v.get("rule") in LAYOUT_RULES.values()]
+            ok = layout["min_gap_px"] == gap and layout["max_misalignment_px"] == 0 and not local
+            failures += not ok
+            print(f"{width}x{height} gap {gap}: min_gap_px={layout['min_gap_px']} "
+                  f"misalignment={layout['max_misalignment_px']} local violations={len(local)} {'ok' if ok else 'FAIL'}")
+            for issue in local:
+                print(f"    {issue}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
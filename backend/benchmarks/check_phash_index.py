@@ -0,0 +1,95 @@
+"""
+Deterministic check for MultiIndexHash (utils/phash_index.py) against a brute-force scan.
+
+A seeded mix of adds, re-adds (same payload, new hash) and removes runs over clustered
+64-bit hashes, so neighbours sit at every distance from 0 up to well past the search
+radius. After each round, search() is compared with a linear Hamming scan of the
+expected contents for radii 0-12 (results must match exactly and come nearest first),
+and the chunk tables must hold each live entry exactly once with no empty buckets.
+Exits 1 on any mismatch.
+
+Usage (from backend/):
+    python benchmarks/check_phash_index.py
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.phash_index import CHUNKS, HASH_BITS, MultiIndexHash, hamming_distance
+
+SEED = 20241017
+ROUNDS = 40
+OPERATIONS_PER_ROUND = 50
+QUERIES_PER_ROUND = 20
+RADII = range(13)
+
+
+def flip(value, bits, rng):
+    for bit in rng.sample(range(HASH_BITS), bits):
+        value ^= 1 << bit
+    return value
+
+
+def check_tables(index, expected):
+    """Every live entry is in exactly one bucket per chunk table, and no bucket is empty."""
+    problems = []
+    if len(index) != len(expected):
+        problems.append(f"len {len(index)} != {len(expected)}")
+    for i, table in enumerate(index._tables):
+        ids = [entry_id for bucket in table.values() for entry_id in bucket]
+        if any(not bucket for bucket in table.values()):
+            problems.append(f"table {i} keeps an empty bucket")
+        if sorted(ids) != sorted(index._entries):
+            problems.append(f"table {i} holds {len(ids)} ids for {len(index._entries)} entries")
+    stored = {payload: index._entries[entry_id][0] for payload, entry_id in index._ids.items()}
+    if stored != expected:
+        problems.append("stored hashes differ from the expected contents")
+    return problems
+
+
+def main():
+    rng = random.Random(SEED)
+    centres = [rng.getrandbits(HASH_BITS) for _ in range(6)]
+    index = MultiIndexHash()
+    expected = {}
+    failures = 0
+    searches = 0
+
+    for round_number in range(ROUNDS):
+        for _ in range(OPERATIONS_PER_ROUND):
+            payload = f"audit-{rng.randrange(120)}"
+            if payload in expected and rng.random() < 0.35:
+                index.remove(payload)
+                del expected[payload]
+            else:
+                value = flip(rng.choice(centres), rng.randrange(16), rng)
+                index.add(value, payload)
+                expected[payload] = value
+        index.remove("never-added")
+
+        problems = check_tables(index, expected)
+        for _ in range(QUERIES_PER_ROUND):
+            query = flip(rng.choice(centres), rng.randrange(12), rng)
+            for radius in RADII:
+                searches += 1
+                found = index.search(query, radius)
+                brute = sorted((hamming_distance(query, value), payload) for payload, value in expected.items()
+                               if hamming_distance(query, value) <= radius)
+                distances = [distance for distance, _ in found]
+                if sorted(found) != brute or distances != sorted(distances):
+                    problems.append(f"radius {radius}: {len(found)} results, brute force {len(brute)}")
+        if problems:
+            failures += 1
+            print(f"round {round_number}: {len(expected)} entries FAIL")
+            for problem in problems[:5]:
+                print(f"    {problem}")
+
+    print(f"{ROUNDS} rounds, {searches} searches, {len(expected)} entries at the end "
+          f"({CHUNKS} chunk tables): {'ok' if not failures else f'FAIL in {failures} rounds'}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -0,0 +1,109 @@
+"""
+Deterministic check for the scoring engine (utils/scoring.ScoringEngine).
+
+Scores hand-computed violation lists (severity penalties, section weights from both
+"4. Color" and "Bölüm 4" spellings, unknown severities, clamping), checks that rescore
+drops disabled and removed rules in any case, keeps the model's number once as
+model_score, leaves its input untouched and is idempotent, that a seeded shuffle of the
+violations never changes the score, and that refresh_if_changed picks up weights saved
+to the file by someone else exactly once. Runs against a temporary weights file.
+Exits 1 on any mismatch.
+
+Usage (from backend/):
+    python benchmarks/check_scoring.py
+"""
+import os
+import sys
+import copy
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["SCORING_WEIGHTS_PATH"] = os.path.join(tempfile.mkdtemp(prefix="check-scoring-"), "weights.json")
+
+from utils.scoring import DEFAULT_WEIGHTS, ScoringEngine, save_scoring_weights
+
+WEIGHTS = {
+    "severity": {"High": 15.0, "Medium": 8.0, "Low": 3.0},
+    "sections": {"1": 2.0, "4": 0.5},
+    "disabled_rules": ["3-Color Rule"],
+}
+
+
+def violation(section, severity, rule=None):
+    v = {"rule_section": section, "severity": severity}
+    if rule is not None:
+        v["rule"] = rule
+    return v
+
+
+# (label, violations, expected score under WEIGHTS)
+SCORES = [
+    ("no violations", [], 100),
+    ("one of each severity", [violation("2. Text", "High"), violation("3. Charts", "Medium"), violation("5. KPI", "Low")], 74),
+    ("section weight 2", [violation("1. Layout", "Medium")], 84),
+    ("section weight 0.5, Turkish spelling", [violation("Bölüm 4: Renk", "Medium"), violation("Section 4", "Medium")], 92),
+    ("unknown severity counts as Medium", [violation("2. Text", "Critical"), violation("2. Text", None)], 84),
+    ("section without a number weighs 1", [violation("Genel", "High")], 85),
+    ("clamped at 0", [violation("1. Layout", "High")] * 5, 0),
+]
+
+
+def check(label, actual, expected, failures):
+    ok = actual == expected
+    failures += [] if ok else [label]
+    print(f"{label}: {'ok' if ok else f'FAIL, got {actual!r}, expected {expected!r}'}")
+
+
+def main():
+    failures = []
+    engine = ScoringEngine(copy.deepcopy(WEIGHTS))
+
+    for label, violations, expected in SCORES:
+        check(label, engine.score(violations), expected, failures)
+
+    audit = {
+        "score": 41,
+        "summary": "s",
+        "violations": [
+            violation("4. Color", "High", "3-color rule"),
+            violation("2. Text", "High", "Font Size"),
+            violation("1. Layout", "Low", "Grid Alignment"),
+            violation("3. Charts", "Medium"),
+        ],
+    }
+    original = copy.deepcopy(audit)
+    rescored = engine.rescore(audit)
+    check("rescore drops disabled rules in any case", [v.get("rule") for v in rescored["violations"]],
+          ["Font Size", "Grid Alignment", None], failures)
+    check("rescore score", rescored["score"], 100 - 15 - 6 - 8, failures)
+    check("rescore keeps the model score", rescored["model_score"], 41, failures)
+    check("rescore leaves its input alone", audit, original, failures)
+    check("rescore is idempotent", engine.rescore(rescored), rescored, failures)
+    removed = engine.rescore(rescored, removed_rules=["FONT SIZE"])
+    check("removed rules are dropped", (removed["score"], removed["model_score"]), (100 - 6 - 8, 41), failures)
+    check("empty results pass through", (engine.rescore(None), engine.rescore({})), (None, {}), failures)
+
+    rng = random.Random(7)
+    pool = [violation(f"{rng.randint(1, 6)}. X", rng.choice(["High", "Medium", "Low", "?"]), f"r{i}") for i in range(12)]
+    scores = set()
+    for _ in range(50):
+        rng.shuffle(pool)
+        scores.add(engine.score(pool))
+    check("order does not change the score", len(scores), 1, failures)
+
+    watcher = ScoringEngine()
+    check("defaults without a weights file", watcher.weights, DEFAULT_WEIGHTS, failures)
+    check("unchanged file is not reloaded", watcher.refresh_if_changed(), None, failures)
+    save_scoring_weights(copy.deepcopy(WEIGHTS))
+    check("saved weights are picked up", watcher.refresh_if_changed(), ["3-Color Rule"], failures)
+    check("and applied", watcher.rescore(original)["score"], rescored["score"], failures)
+    check("only once", watcher.refresh_if_changed(), None, failures)
+
+    print(f"{len(failures)} failed" if failures else "all ok")
+    return len(failures)
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
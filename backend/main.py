@@ -1,29 +1,61 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body, Query, Header, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 import uvicorn
 import os
 import json
+import time
 import asyncio
 import base64
+import zipfile
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 
-from utils.common import load_manifesto, configure_genai, parse_manifesto_to_rules, save_manifesto_from_rules, save_manifesto
-from utils.auditor import audit_dashboard, generate_dashboard_simulation, get_chat_response
-from utils.builder import generate_assets, revise_assets
-from utils.gemini_live import GeminiLiveSession
-
-# Load environment variables
+# Load environment variables before importing utils, which read their settings at import time
 load_dotenv()
 
+from utils.common import configure_genai
+from utils.auditor import AUDIT_IMAGE_MAX_EDGE, AUDIT_TILED_MAX_EDGE, audit_dashboard, stream_audit_dashboard, audit_single_rule, merge_rule_violations, generate_dashboard_simulation, get_chat_response, normalize_image
+from utils.builder import generate_assets, revise_assets
+from utils.llm_client import generate_content, PROMPT_CACHE, LLM_SCHEDULER
+from utils.single_flight import SINGLE_FLIGHT, input_digest
+from utils.idempotency import IdempotencyStore, IdempotencyConflictError, IDEMPOTENCY_KEY_MAX_LENGTH
+from utils.audit_cache import AuditCache, make_cache_key, digest_cache_key, manifesto_digest
+from utils.phash_index import PerceptualIndex, dhash, PHASH_MAX_DISTANCE
+from utils.batch import expand_batch_uploads, stream_ndjson_batch, BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY
+from utils.jobs import JobQueue, QueueFullError
+from utils.pipeline import Stage, run_stages, sse_event
+from utils.llm_providers import PROVIDER
+from utils.prompt_budget import PROMPT_REPORT
+from utils.manifesto_index import MANIFESTO_INDEX
+from utils.manifesto_store import MANIFESTO_STORE, ManifestoVersionConflict
+from utils.local_rules import strip_rules
+from utils.scoring import SCORING
+from utils.metrics import METRICS, MetricsMiddleware, CACHE_LOOKUPS, WEBSOCKET_SESSIONS, WEBSOCKET_AUDIO_CHUNKS, observe_stage
+
 # Configure Gemini (non-blocking - allow server to start even without API key)
-try:
-    configure_genai()
-except Exception as e:
-    print(f"Warning: Gemini API not configured: {e}. Server will start but AI features may not work.")
+if PROVIDER.name == "gemini":
+    try:
+        configure_genai()
+    except Exception as e:
+        print(f"Warning: Gemini API not configured: {e}. Server will start but AI features may not work.")
+else:
+    print(f"Using '{PROVIDER.name}' LLM provider; Gemini API is not called.")
 
-app = FastAPI(title="Power BI Auditor API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    """Starts the background workers (AUDIT_JOBS, PROMPT_CACHE, defined below) with the app and stops them on shutdown."""
+    AUDIT_JOBS.start()
+    PROMPT_CACHE.start()
+    try:
+        yield
+    finally:
+        await AUDIT_JOBS.stop()
+        await PROMPT_CACHE.stop()
+
+app = FastAPI(title="Power BI Auditor API", version="1.0.0", lifespan=lifespan)
 
 # CORS Configuration
 # Get allowed origins from environment variable or use defaults
@@ -40,16 +72,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load Manifesto
-MANIFESTO_TEXT = load_manifesto()
+# Per-route latency histograms for GET /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Load Manifesto (parsed once into MANIFESTO_STORE; rule edits go through the store)
+MANIFESTO_VERSION, MANIFESTO_TEXT, _, _ = MANIFESTO_STORE.snapshot()
+MANIFESTO_INDEX.sync(MANIFESTO_TEXT, rules=MANIFESTO_STORE.rules)
+
+# The manifesto as audits see it: rules disabled in manifesto_weights.json are left out.
+# Audit cache keys use this text, so disabling a rule changes the version too.
+AUDIT_MANIFESTO_TEXT = strip_rules(MANIFESTO_TEXT, SCORING.weights["disabled_rules"])
+
+# Audit-manifesto digest -> (previous digest, names of the rules removed in between).
+# Deleting or disabling a rule only takes findings away, so on a cache miss an audit
+# stored under an earlier version is re-scored without those rules instead of
+# calling Gemini again. Kept in memory; the chain is followed at most
+# RESCORE_LINEAGE_DEPTH versions back.
+RESCORE_LINEAGE = {}
+RESCORE_LINEAGE_DEPTH = 8
+
+# Perceptual-hash index of cached audits for opt-in near-duplicate reuse
+PHASH_INDEX = PerceptualIndex()
+
+# Audit result cache (memory LRU + SQLite). Keys include the manifesto digest,
+# so saving a new manifesto invalidates old entries automatically. Audits leaving
+# the cache leave the perceptual index with them.
+AUDIT_CACHE = AuditCache(on_evict=PHASH_INDEX.remove)
+
+def prune_phash_index():
+    """Drops perceptual index entries of other manifesto versions; near-duplicates are only looked up for the current one."""
+    digest = manifesto_digest(AUDIT_MANIFESTO_TEXT)
+    PHASH_INDEX.keep_manifestos([digest, f"{digest}:tiled"])
+
+PHASH_INDEX.retain(AUDIT_CACHE.contains)
+prune_phash_index()
+
+# Stored responses for retried requests carrying an Idempotency-Key header
+IDEMPOTENCY_STORE = IdempotencyStore()
+
+# How /auditor re-audits after adding a rule: "incremental" checks only the new rule
+# against the image and merges it into the prior audit, "full" re-runs the whole audit
+AUDITOR_REAUDIT_MODE = os.getenv("AUDITOR_REAUDIT_MODE", "incremental")
+
+def refresh_audit_manifesto(removed_rules=()):
+    """
+    Recomputes AUDIT_MANIFESTO_TEXT. If it changed because `removed_rules` were deleted
+    or disabled, the new version is linked to the old one in RESCORE_LINEAGE.
+    """
+    global AUDIT_MANIFESTO_TEXT
+    previous = manifesto_digest(AUDIT_MANIFESTO_TEXT)
+    AUDIT_MANIFESTO_TEXT = strip_rules(MANIFESTO_TEXT, SCORING.weights["disabled_rules"])
+    current = manifesto_digest(AUDIT_MANIFESTO_TEXT)
+    if current == previous:
+        return
+    if removed_rules:
+        RESCORE_LINEAGE[current] = (previous, frozenset(removed_rules))
+    prune_phash_index()
 
 # Global variable to track manifesto changes
-def reload_manifesto():
-    """Reloads the manifesto from file."""
-    global MANIFESTO_TEXT
-    MANIFESTO_TEXT = load_manifesto()
+def reload_manifesto(removed_rules=()):
+    """
+    Picks up the manifesto held by MANIFESTO_STORE after a write (or a change saved by
+    another process); a no-op while its version is unchanged. `removed_rules`: names of
+    the rules the write deleted.
+    """
+    global MANIFESTO_TEXT, MANIFESTO_VERSION
+    version, text, rules, _ = MANIFESTO_STORE.snapshot()
+    if version == MANIFESTO_VERSION:
+        return MANIFESTO_TEXT
+    # Cached audits can only drop the removed rules' findings if nothing else changed in between
+    if version != MANIFESTO_VERSION + 1:
+        removed_rules = ()
+    MANIFESTO_VERSION, MANIFESTO_TEXT = version, text
+    refresh_audit_manifesto(removed_rules)
+    # Cached prompt prefixes embed the old manifesto; the next request registers the new one
+    PROMPT_CACHE.invalidate()
+    # Re-index only the rules that changed
+    MANIFESTO_INDEX.sync(MANIFESTO_TEXT, rules=rules)
     return MANIFESTO_TEXT
 
+def refresh_scoring():
+    """
+    Picks up scoring weights another process saved (a stat check unless they changed)
+    and strips the rules they disabled from AUDIT_MANIFESTO_TEXT. Called before SCORING
+    is used on request paths.
+    """
+    newly_disabled = SCORING.refresh_if_changed()
+    if newly_disabled is not None:
+        refresh_audit_manifesto(removed_rules=newly_disabled)
+
 # --- Pydantic Models ---
 class SimulateRequest(BaseModel):
     audit_result: Dict[str, Any]
@@ -72,16 +183,166 @@ class RuleUpdateRequest(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
     sub_rules: Optional[List[str]] = None
+    expected_version: Optional[int] = None  # manifesto version the edit is based on; 409 if it moved
 
 class RuleAddRequest(BaseModel):
     section_id: int
     name: str
     description: str
     sub_rules: Optional[List[str]] = None
+    expected_version: Optional[int] = None
 
 class RuleDeleteRequest(BaseModel):
     section_id: int
     rule_id: int
+    expected_version: Optional[int] = None
+
+class ScoringUpdateRequest(BaseModel):
+    severity: Optional[Dict[str, float]] = None
+    sections: Optional[Dict[str, float]] = None
+    disabled_rules: Optional[List[str]] = None
+
+class RescoreRequest(BaseModel):
+    audit_result: Dict[str, Any]
+    removed_rules: Optional[List[str]] = None
+
+# --- Audit helpers ---
+
+async def compute_phash(contents: bytes):
+    """Perceptual hash of the normalised image, or None if it cannot be computed."""
+    try:
+        with observe_stage("phash"):
+            return await asyncio.to_thread(dhash, contents)
+    except Exception as e:
+        print(f"Perceptual hash failed: {e}")
+        return None
+
+async def rescored_from_lineage(contents: bytes, variant: str = ""):
+    """
+    Looks for an audit of the same image cached under an earlier manifesto version
+    that differs only by deleted or disabled rules (RESCORE_LINEAGE), and returns it
+    re-scored without those rules. Returns None when there is none.
+    """
+    digest = manifesto_digest(AUDIT_MANIFESTO_TEXT)
+    removed = set()
+    for _ in range(RESCORE_LINEAGE_DEPTH):
+        if digest not in RESCORE_LINEAGE:
+            return None
+        digest, names = RESCORE_LINEAGE[digest]
+        removed |= names
+        result, _ = await AUDIT_CACHE.get(digest_cache_key(contents, digest, variant))
+        if result is not None:
+            return SCORING.rescore(result, removed)
+    return None
+
+async def run_cached_audit(contents: bytes, near_duplicate: str = "off", max_distance: int = PHASH_MAX_DISTANCE, on_neighbour=None, tiled: bool = False):
+    """
+    Runs audit_dashboard behind the exact-match cache and the perceptual index.
+    near_duplicate: "off" (exact cache only), "reuse" (return the nearest prior audit
+    without calling Gemini) or "prior" (send the nearest prior audit as a starting point).
+    on_neighbour(result, distance), if given, is called with the nearest prior audit
+    before the Gemini call starts, so callers can begin dependent work speculatively.
+    The upload is normalised first; the normalised bytes are what get hashed, cached and sent,
+    while the local colour and layout checks measure the upload itself.
+    tiled=True runs the tiled audit mode; its results are cached and indexed separately.
+    Cached audits are re-scored with the current scoring weights on the way out; an audit
+    of an earlier manifesto version that only lost rules since is reused the same way.
+    Returns (audit_result, cache_info, image_stats); audit_result is None if the audit failed.
+    """
+    refresh_scoring()
+    max_edge = AUDIT_TILED_MAX_EDGE if tiled else AUDIT_IMAGE_MAX_EDGE
+    upload = contents
+    try:
+        with observe_stage("image_decode"):
+            contents, image_stats = await asyncio.to_thread(normalize_image, contents, max_edge)
+    except Exception as e:
+        print(f"Error processing image: {e}")
+        return None, {"hit": False, "tier": None}, None
+
+    variant = "tiled" if tiled else ""
+    cache_key = make_cache_key(contents, AUDIT_MANIFESTO_TEXT, variant)
+    result, cache_tier = await AUDIT_CACHE.get(cache_key)
+    if result is not None:
+        CACHE_LOOKUPS.inc(cache="audit", result=cache_tier)
+        return SCORING.rescore(result), {"hit": True, "tier": cache_tier}, image_stats
+
+    result = await rescored_from_lineage(contents, variant)
+    if result is not None:
+        CACHE_LOOKUPS.inc(cache="audit", result="rescored")
+        await AUDIT_CACHE.put(cache_key, result)
+        return result, {"hit": True, "tier": "rescored"}, image_stats
+
+    digest = manifesto_digest(AUDIT_MANIFESTO_TEXT) + (f":{variant}" if variant else "")
+    phash = await compute_phash(contents)
+
+    neighbour, distance = None, None
+    if (near_duplicate != "off" or on_neighbour) and phash is not None:
+        for candidate_distance, candidate_key in PHASH_INDEX.neighbours(phash, digest, max_distance):
+            neighbour, _ = await AUDIT_CACHE.get(candidate_key)
+            if neighbour is not None:
+                distance = candidate_distance
+                break
+
+    if neighbour is not None and near_duplicate == "reuse":
+        CACHE_LOOKUPS.inc(cache="audit", result="near_duplicate")
+        neighbour = SCORING.rescore(neighbour)
+        await AUDIT_CACHE.put(cache_key, neighbour)
+        return neighbour, {"hit": True, "tier": "near_duplicate", "distance": distance}, image_stats
+
+    if neighbour is not None and on_neighbour:
+        on_neighbour(neighbour, distance)
+
+    CACHE_LOOKUPS.inc(cache="audit", result="miss")
+    prior_result = neighbour if near_duplicate == "prior" else None
+    result = await audit_dashboard(contents, AUDIT_MANIFESTO_TEXT, prior_result=prior_result, preprocess=False, tiled=tiled, source_bytes=upload)
+    if not result:
+        return None, {"hit": False, "tier": None}, image_stats
+
+    await AUDIT_CACHE.put(cache_key, result)
+    if phash is not None:
+        PHASH_INDEX.add(phash, cache_key, digest)
+
+    cache_info = {"hit": False, "tier": None}
+    if prior_result is not None:
+        cache_info["prior_distance"] = distance
+    return result, cache_info, image_stats
+
+async def run_idempotent(scope: str, idempotency_key: Optional[str], fingerprint: str, response: Response, handler):
+    """
+    Runs `handler()` once per Idempotency-Key: retries with the same key and body get the
+    first completed result (marked with an Idempotent-Replayed header) or wait for it if it
+    is still running; the same key with a different body is rejected with 422.
+    Without a key the handler simply runs.
+    """
+    if not idempotency_key:
+        return await handler()
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+    try:
+        result, replayed = await IDEMPOTENCY_STORE.run(f"{scope}:{idempotency_key}", fingerprint, handler)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    CACHE_LOOKUPS.inc(cache="idempotency", result="replay" if replayed else "miss")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+async def run_audit_job(job):
+    """Background worker handler for POST /jobs/audit."""
+    payload = job.payload
+    with job.stage("audit"):
+        result, cache_info, image_stats = await run_cached_audit(payload["contents"], payload["near_duplicate"])
+    if not result:
+        raise RuntimeError("Audit failed")
+
+    output = {"audit_result": result, "cache": cache_info, "image": image_stats}
+    if payload["include_assets"]:
+        with job.stage("assets"):
+            output["assets"] = await generate_assets(result, MANIFESTO_TEXT)
+    return output
+
+# Background audit jobs: POST /jobs/audit returns immediately, GET /jobs/{id} polls
+AUDIT_JOBS = JobQueue(run_audit_job)
 
 # --- Endpoints ---
 
@@ -90,28 +351,338 @@ async def root():
     return {"message": "Power BI Auditor API is running"}
 
 @app.post("/audit")
-async def audit_endpoint(file: UploadFile = File(...)):
+async def audit_endpoint(
+    response: Response,
+    file: UploadFile = File(...),
+    near_duplicate: str = Query("off", pattern="^(off|reuse|prior)$"),
+    max_distance: int = Query(PHASH_MAX_DISTANCE, ge=0, le=32),
+    tiled: bool = Query(False),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Audits an uploaded dashboard image.
+    Identical images audited against the same manifesto are served from the audit cache.
+    Opt-in near_duplicate=reuse|prior looks up prior audits within max_distance bits of perceptual hash.
+    tiled=true audits large or multi-panel pages as overlapping tiles plus a whole-page layout pass.
+    Retries sent with the same Idempotency-Key replay the first response.
     """
     if not MANIFESTO_TEXT:
         raise HTTPException(status_code=500, detail="Manifesto not found")
     
+    contents = await file.read()
+
+    async def handle():
+        try:
+            result, cache_info, image_stats = await run_cached_audit(contents, near_duplicate, max_distance, tiled=tiled)
+            if not result:
+                raise HTTPException(status_code=500, detail="Audit failed")
+            
+            # Generate initial assets (theme, action list)
+            assets = await generate_assets(result, MANIFESTO_TEXT)
+            
+            return {
+                "audit_result": result,
+                "assets": assets,
+                "cache": cache_info,
+                "image": image_stats
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    fingerprint = input_digest(contents, near_duplicate, max_distance, tiled)
+    return await run_idempotent("audit", idempotency_key, fingerprint, response, handle)
+
+@app.post("/audit/stream")
+async def audit_stream_endpoint(file: UploadFile = File(...)):
+    """
+    Streams an audit as Server-Sent Events: `summary` and one `violation` event per entry as
+    soon as each is complete in the model output, then `score` and `result` with the full
+    audit. `score` is always the scoring engine's value (the one in `result`), on cache hits
+    and misses alike. If the model stream is cut off, `result` carries the completed part
+    with complete=false and is not cached.
+    """
+    if not MANIFESTO_TEXT:
+        raise HTTPException(status_code=500, detail="Manifesto not found")
+
+    refresh_scoring()
+    upload = await file.read()
     try:
-        contents = await file.read()
-        result = audit_dashboard(contents, MANIFESTO_TEXT)
-        if not result:
-            raise HTTPException(status_code=500, detail="Audit failed")
-        
-        # Generate initial assets (theme, action list)
-        assets = generate_assets(result, MANIFESTO_TEXT)
-        
-        return {
-            "audit_result": result,
-            "assets": assets
-        }
+        with observe_stage("image_decode"):
+            contents, image_stats = await asyncio.to_thread(normalize_image, upload)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+
+    cache_key = make_cache_key(contents, AUDIT_MANIFESTO_TEXT)
+    cached, cache_tier = await AUDIT_CACHE.get(cache_key)
+    if cached is not None:
+        cached = SCORING.rescore(cached)
+    else:
+        cached = await rescored_from_lineage(contents)
+        if cached is not None:
+            cache_tier = "rescored"
+            await AUDIT_CACHE.put(cache_key, cached)
+    CACHE_LOOKUPS.inc(cache="audit", result=cache_tier or "miss")
+
+    async def events():
+        if cached is not None:
+            if "summary" in cached:
+                yield sse_event("summary", cached["summary"])
+            for violation in cached.get("violations", []):
+                yield sse_event("violation", violation)
+            yield sse_event("score", cached["score"])
+            yield sse_event("result", {
+                "audit_result": cached,
+                "complete": True,
+                "error": None,
+                "cache": {"hit": True, "tier": cache_tier},
+                "image": image_stats
+            })
+            return
+
+        async for event, data in stream_audit_dashboard(contents, AUDIT_MANIFESTO_TEXT, preprocess=False, source_bytes=upload):
+            if event == "result":
+                if data["complete"]:
+                    await AUDIT_CACHE.put(cache_key, data["audit_result"])
+                    phash = await compute_phash(contents)
+                    if phash is not None:
+                        PHASH_INDEX.add(phash, cache_key, manifesto_digest(AUDIT_MANIFESTO_TEXT))
+                data["cache"] = {"hit": False, "tier": None}
+                data["image"] = image_stats
+            yield sse_event(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/audit/batch")
+async def audit_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    include_assets: bool = Form(False),
+    concurrency: int = Form(BATCH_CONCURRENCY),
+    near_duplicate: str = Form("off", pattern="^(off|reuse|prior)$")
+):
+    """
+    Audits many dashboard images (multiple files and/or zip archives) in one request.
+    Results stream back as NDJSON, one line per image in completion order, followed by a summary line.
+    Asset generation is off by default to keep bulk runs at one LLM call per image.
+    """
+    if not MANIFESTO_TEXT:
+        raise HTTPException(status_code=500, detail="Manifesto not found")
+
+    uploads = [(upload.filename, await upload.read()) for upload in files]
+    try:
+        items = expand_batch_uploads(uploads)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found in batch")
+
+    async def audit_item(filename, contents):
+        result, cache_info, image_stats = await run_cached_audit(contents, near_duplicate)
+        if not result:
+            raise RuntimeError("Audit failed")
+        output = {"audit_result": result, "cache": cache_info, "image": image_stats}
+        if include_assets:
+            output["assets"] = await generate_assets(result, MANIFESTO_TEXT)
+        return output
+
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    return StreamingResponse(
+        stream_ndjson_batch(items, audit_item, concurrency),
+        media_type="application/x-ndjson"
+    )
+
+def findings_signature(audit_result):
+    """Violations reduced to sorted (section, severity) pairs; decides whether speculative work still applies."""
+    return sorted((v.get("rule_section", ""), v.get("severity", "")) for v in audit_result.get("violations", []))
+
+@app.post("/audit/pipeline")
+async def audit_pipeline_endpoint(
+    file: UploadFile = File(...),
+    user_feedback: Optional[str] = Form(None),
+    speculative: bool = Form(False),
+    near_duplicate: str = Form("off", pattern="^(off|reuse|prior)$")
+):
+    """
+    Runs audit -> (assets || simulation) as a DAG and streams each stage result as Server-Sent Events,
+    so wall-clock is audit + max(assets, simulation) instead of the sum.
+    With speculative=true and a near-duplicate prior audit, assets and simulation start from the prior
+    result while the fresh audit runs; they are kept only if the fresh audit reports the same violations
+    (by section and severity), otherwise they are cancelled and rerun from the fresh result.
+    """
+    if not MANIFESTO_TEXT:
+        raise HTTPException(status_code=500, detail="Manifesto not found")
+
+    contents = await file.read()
+    speculation = {}
+
+    def start_speculation(prior_result, distance):
+        speculation["signature"] = findings_signature(prior_result)
+        speculation["assets"] = asyncio.create_task(generate_assets(prior_result, MANIFESTO_TEXT))
+        speculation["simulation"] = asyncio.create_task(
+            generate_dashboard_simulation(MANIFESTO_TEXT, prior_result, user_feedback)
+        )
+
+    async def speculative_or_fresh(name, audit_result, fresh):
+        task = speculation.get(name)
+        if task and speculation["signature"] == findings_signature(audit_result):
+            return await task, True
+        if task:
+            task.cancel()
+        return await fresh(), False
+
+    async def audit_stage(results):
+        result, cache_info, image_stats = await run_cached_audit(
+            contents, near_duplicate, on_neighbour=start_speculation if speculative else None
+        )
+        if not result:
+            raise RuntimeError("Audit failed")
+        return {"audit_result": result, "cache": cache_info, "image": image_stats}
+
+    async def assets_stage(results):
+        audit_result = results["audit"]["audit_result"]
+        assets, reused = await speculative_or_fresh(
+            "assets", audit_result, lambda: generate_assets(audit_result, MANIFESTO_TEXT)
+        )
+        if not assets:
+            raise RuntimeError("Asset generation failed")
+        return {"assets": assets, "speculative": reused}
+
+    async def simulation_stage(results):
+        audit_result = results["audit"]["audit_result"]
+        svg, reused = await speculative_or_fresh(
+            "simulation", audit_result, lambda: generate_dashboard_simulation(MANIFESTO_TEXT, audit_result, user_feedback)
+        )
+        if not svg:
+            raise RuntimeError("Simulation failed")
+        return {"svg": svg, "speculative": reused}
+
+    stages = [
+        Stage("audit", audit_stage),
+        Stage("assets", assets_stage, deps=["audit"]),
+        Stage("simulation", simulation_stage, deps=["audit"])
+    ]
+
+    async def events():
+        start = time.perf_counter()
+        timings = {}
+        try:
+            async for name, status, value, elapsed in run_stages(stages):
+                timings[name] = elapsed
+                if status == "ok":
+                    yield sse_event(name, value)
+                else:
+                    yield sse_event("stage_error", {"stage": name, "status": status, "error": value})
+            yield sse_event("done", {
+                "stages_ms": timings,
+                "total_ms": round((time.perf_counter() - start) * 1000, 1)
+            })
+        finally:
+            for key in ("assets", "simulation"):
+                task = speculation.get(key)
+                if task and not task.done():
+                    task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/jobs/audit", status_code=202)
+async def submit_audit_job(
+    file: UploadFile = File(...),
+    include_assets: bool = Form(True),
+    near_duplicate: str = Form("off", pattern="^(off|reuse|prior)$")
+):
+    """
+    Queues an audit (plus assets) as a background job and returns its id right away.
+    Rejects with 429 when the queue is full so bursts don't exhaust the Gemini quota.
+    """
+    if not MANIFESTO_TEXT:
+        raise HTTPException(status_code=500, detail="Manifesto not found")
+
+    contents = await file.read()
+    try:
+        job = AUDIT_JOBS.submit("audit", {
+            "contents": contents,
+            "include_assets": include_assets,
+            "near_duplicate": near_duplicate
+        })
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Returns a job's status (queued, running, succeeded, failed), stage timings and result.
+    """
+    job = AUDIT_JOBS.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+def collect_component_metrics():
+    """Scrape-time export of counters kept by the scheduler, single-flight, prompt cache and audit cache."""
+    scheduler = LLM_SCHEDULER.stats()
+    families = [
+        ("llm_scheduler_events_total", "counter", "Scheduler events: admitted calls, throttled waits, quota errors, retries, dropped calls.",
+         [({"event": event}, scheduler[event]) for event in ("calls", "throttled", "rate_limited", "retried", "dropped")]),
+        ("llm_scheduler_throttled_seconds_total", "counter", "Total time calls waited for RPM/TPM budget.",
+         [({}, scheduler["throttled_seconds"])]),
+        ("llm_scheduler_state", "gauge", "Current adaptive concurrency limit, in-flight and waiting calls.",
+         [({"state": state}, scheduler[state]) for state in ("concurrency_limit", "in_flight", "waiting")]),
+    ]
+    single_flight = []
+    for name, counters in SINGLE_FLIGHT.stats().items():
+        single_flight.append(({"function": name, "result": "executed"}, counters["calls"] - counters["coalesced"]))
+        single_flight.append(({"function": name, "result": "coalesced"}, counters["coalesced"]))
+    families.append(("single_flight_calls_total", "counter", "Calls to coalesced LLM functions that ran upstream or joined an in-flight call.", single_flight))
+    families.append(("prompt_cache_hits_total", "counter", "Requests served from an existing prompt prefix cache entry.",
+                     [({"prefix": entry["name"], "model": entry["model"]}, entry["hits"]) for entry in PROMPT_CACHE.stats()["entries"]]))
+    audit_cache = AUDIT_CACHE.stats()
+    families.append(("audit_cache_entries", "gauge", "Entries in the audit result cache by tier.",
+                     [({"tier": "memory"}, audit_cache["memory_entries"]), ({"tier": "disk"}, audit_cache["disk_entries"])]))
+    families.append(("phash_index_entries", "gauge", "Perceptual hashes of cached audits in the near-duplicate index.", [({}, len(PHASH_INDEX))]))
+    return families
+
+METRICS.add_collector(collect_component_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition: request latency per route, per-stage timings
+    (image_decode, phash, prompt_build, llm_call, json_parse, generate_assets),
+    per-model LLM latency, tokens and retries, cache hits and WebSocket gauges.
+    """
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """
+    Returns the shared Gemini scheduler counters (throttled, rate_limited, retried, dropped),
+    its current concurrency limit, per-function single-flight coalescing counts, the
+    prompt cache entries and the manifesto retrieval index.
+    """
+    return {
+        "scheduler": LLM_SCHEDULER.stats(),
+        "single_flight": SINGLE_FLIGHT.stats(),
+        "prompt_cache": PROMPT_CACHE.stats(),
+        "manifesto_index": MANIFESTO_INDEX.stats()
+    }
+
+@app.get("/llm/prompts")
+async def llm_prompts():
+    """
+    Average prompt composition per endpoint since startup: calls, budget, average and
+    maximum estimated tokens, how many prompts were trimmed or stayed over budget, and
+    each section's average tokens, share of the prompt and trim count.
+    """
+    return {"endpoints": PROMPT_REPORT.report()}
 
 @app.post("/simulate")
 async def simulate_endpoint(request: SimulateRequest):
@@ -121,34 +692,34 @@ async def simulate_endpoint(request: SimulateRequest):
     if not MANIFESTO_TEXT:
         raise HTTPException(status_code=500, detail="Manifesto not found")
         
-    svg = generate_dashboard_simulation(MANIFESTO_TEXT, request.audit_result, request.user_feedback)
+    svg = await generate_dashboard_simulation(MANIFESTO_TEXT, request.audit_result, request.user_feedback)
     if not svg:
         raise HTTPException(status_code=500, detail="Simulation failed")
     
     return {"svg": svg}
 
 @app.post("/revise")
-async def revise_endpoint(request: ReviseRequest):
+async def revise_endpoint(request: ReviseRequest, response: Response, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """
     Revises assets based on user feedback.
+    Retries sent with the same Idempotency-Key replay the first response.
     """
     if not MANIFESTO_TEXT:
         raise HTTPException(status_code=500, detail="Manifesto not found")
-        
-    updated_assets = revise_assets(request.current_assets, request.user_feedback, MANIFESTO_TEXT)
-    if not updated_assets:
-        raise HTTPException(status_code=500, detail="Revision failed")
-        
-    return updated_assets
+
+    async def handle():
+        updated_assets = await revise_assets(request.current_assets, request.user_feedback, MANIFESTO_TEXT)
+        if not updated_assets:
+            raise HTTPException(status_code=500, detail="Revision failed")
+        return updated_assets
+
+    return await run_idempotent("revise", idempotency_key, input_digest(request.model_dump()), response, handle)
 
 async def handle_auditor_command(rule_description: str, audit_result: Dict[str, Any], dashboard_image: Optional[str] = None):
     """
     Handles /auditor command: Analyzes rule description, adds to manifesto if valid, and optionally re-audits.
     """
-    import google.generativeai as genai
-    
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
-    
+    refresh_scoring()
     # Step 1: Analyze if the rule description is valid and should be added
     analysis_prompt = f"""
     Sen bir Power BI Manifesto Kuralları Uzmanısın.
@@ -175,7 +746,7 @@ async def handle_auditor_command(rule_description: str, audit_result: Dict[str,
     """
     
     try:
-        analysis_response = model.generate_content(
+        analysis_response = await generate_content(
             analysis_prompt,
             generation_config={"response_mime_type": "application/json"}
         )
@@ -189,10 +760,7 @@ async def handle_auditor_command(rule_description: str, audit_result: Dict[str,
             }
         
         # Step 2: Add rule to manifesto
-        rules = parse_manifesto_to_rules(MANIFESTO_TEXT)
-        
-        # Find the section
-        section = next((s for s in rules if s["id"] == analysis["section_id"]), None)
+        section = MANIFESTO_STORE.section(analysis["section_id"])
         if not section:
             return {
                 "response": f"❌ Bölüm {analysis['section_id']} bulunamadı.",
@@ -200,36 +768,53 @@ async def handle_auditor_command(rule_description: str, audit_result: Dict[str,
                 "requires_reaudit": False
             }
         
-        # Add new rule
-        new_rule_id = len(section["rules"]) + 1
-        section["rules"].append({
-            "id": new_rule_id,
+        # Add new rule and save updated manifesto
+        saved = await MANIFESTO_STORE.write_section(section["id"], lambda s: s["rules"].append({
+            "id": len(s["rules"]) + 1,
             "name": analysis["rule_name"],
             "description": analysis["rule_description"]
-        })
-        
-        # Save updated manifesto
-        updated_manifesto = save_manifesto_from_rules(rules)
-        save_manifesto(updated_manifesto)
+        }))
         reload_manifesto()
+        section = MANIFESTO_STORE.section(section["id"])
+        if not saved or not section:
+            return {
+                "response": "❌ Kural kaydedilemedi, manifesto değiştirilmedi.",
+                "command": "auditor",
+                "requires_reaudit": False
+            }
+        # Same "<id>. <title>" form the full audit reports, so section weights apply to the new violations
+        section_title = f"{section['id']}. {section['title']}"
         
-        # Step 3: Re-audit if image provided
+        # Step 3: Re-audit if image provided. With a prior audit only the new rule is
+        # checked and merged in; otherwise (or if that fails) the full manifesto is used.
         reaudit_result = None
+        reaudit_mode = None
         if dashboard_image:
             try:
                 image_bytes = base64.b64decode(dashboard_image)
-                reaudit_result = audit_dashboard(image_bytes, MANIFESTO_TEXT)
+                if AUDITOR_REAUDIT_MODE == "incremental" and audit_result and "score" in audit_result:
+                    new_violations = await audit_single_rule(image_bytes, section_title, section["rules"][-1])
+                    if new_violations is not None:
+                        reaudit_result, added = merge_rule_violations(audit_result, new_violations)
+                        reaudit_mode = "incremental"
+                if reaudit_result is None:
+                    reaudit_result = await audit_dashboard(image_bytes, AUDIT_MANIFESTO_TEXT)
+                    reaudit_mode = "full" if reaudit_result else None
             except Exception as e:
                 print(f"Re-audit error: {e}")
         
         response_msg = f"✅ Kural eklendi: **{analysis['rule_name']}**\n\n{analysis['rule_description']}\n\nBölüm {analysis['section_id']}: {section['title']}"
         
         if reaudit_result:
-            response_msg += f"\n\n🔄 Yeniden değerlendirme tamamlandı. Yeni puan: {reaudit_result.get('score', 'N/A')}/100"
+            if reaudit_mode == "incremental":
+                response_msg += f"\n\n🔄 Yalnızca yeni kural değerlendirildi ({len(added)} yeni ihlal). Yeni puan: {reaudit_result.get('score', 'N/A')}/100"
+            else:
+                response_msg += f"\n\n🔄 Tam yeniden değerlendirme tamamlandı. Yeni puan: {reaudit_result.get('score', 'N/A')}/100"
             return {
                 "response": response_msg,
                 "command": "auditor",
                 "requires_reaudit": True,
+                "reaudit_mode": reaudit_mode,
                 "new_audit_result": reaudit_result
             }
         else:
@@ -248,14 +833,20 @@ async def handle_auditor_command(rule_description: str, audit_result: Dict[str,
         }
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, response: Response, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """
     Chat with the consultant. Supports special commands:
     - /auditor <rule_description>: Add a new rule to manifesto and re-audit dashboard
+    Retries sent with the same Idempotency-Key replay the first response, so a retried
+    /auditor command does not add its rule twice.
     """
     if not MANIFESTO_TEXT:
         raise HTTPException(status_code=500, detail="Manifesto not found")
-    
+
+    return await run_idempotent("chat", idempotency_key, input_digest(request.model_dump()), response, lambda: handle_chat(request))
+
+async def handle_chat(request: ChatRequest):
+    """Answers one chat message or runs its command."""
     user_input = request.user_input.strip()
     
     # Check for commands
@@ -273,16 +864,61 @@ async def chat_endpoint(request: ChatRequest):
         return await handle_auditor_command(rule_description, request.audit_result, request.dashboard_image)
     
     # Normal chat response
-    response = get_chat_response(request.chat_history, user_input, MANIFESTO_TEXT, request.audit_result)
+    response = await get_chat_response(request.chat_history, user_input, MANIFESTO_TEXT, request.audit_result)
     return {"response": response, "command": None, "requires_reaudit": False}
 
+async def manifesto_snapshot():
+    """
+    MANIFESTO_STORE.snapshot() after picking up a manifesto another process saved
+    (a stat check unless something changed; the re-read itself runs off the event loop).
+    """
+    if await MANIFESTO_STORE.refresh_if_changed():
+        reload_manifesto()
+    return MANIFESTO_STORE.snapshot()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists `etag` (weak comparison) or is `*`."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+def conditional_response(etag: str, if_none_match: Optional[str], response: Response):
+    """
+    Sets the ETag (revalidated on every use) on `response`. Returns an empty 304
+    response when the client already has this version, else None.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+@app.get("/manifesto/version")
+async def get_manifesto_version(response: Response, if_none_match: Optional[str] = Header(None, alias="If-None-Match")):
+    """
+    The current manifesto version and ETag, for clients and other replicas to poll.
+    """
+    version, _, _, etag = await manifesto_snapshot()
+    return conditional_response(etag, if_none_match, response) or {"version": version, "etag": etag}
+
+@app.get("/manifesto")
+async def get_manifesto(response: Response, if_none_match: Optional[str] = Header(None, alias="If-None-Match")):
+    """
+    Returns the raw manifesto markdown. Supports If-None-Match (304 when unchanged).
+    """
+    _, text, _, etag = await manifesto_snapshot()
+    return conditional_response(etag, if_none_match, response) or PlainTextResponse(
+        text, media_type="text/markdown; charset=utf-8", headers=dict(response.headers))
+
 @app.get("/manifesto/rules")
-async def get_manifesto_rules():
+async def get_manifesto_rules(response: Response, if_none_match: Optional[str] = Header(None, alias="If-None-Match")):
     """
-    Returns the manifesto rules in structured format.
+    Returns the manifesto rules in structured format, with the manifesto version.
+    Supports If-None-Match (304 when unchanged).
     """
-    rules = parse_manifesto_to_rules(MANIFESTO_TEXT)
-    return {"rules": rules}
+    version, _, rules, etag = await manifesto_snapshot()
+    return conditional_response(etag, if_none_match, response) or {"rules": rules, "version": version}
 
 @app.post("/manifesto/rules/update")
 async def update_manifesto_rule(request: RuleUpdateRequest):
@@ -290,30 +926,27 @@ async def update_manifesto_rule(request: RuleUpdateRequest):
     Updates a specific rule in the manifesto.
     """
     try:
-        rules = parse_manifesto_to_rules(MANIFESTO_TEXT)
-        
         # Find and update the rule
-        for section in rules:
-            if section["id"] == request.section_id:
-                if request.rule_id:
-                    for rule in section["rules"]:
-                        if rule["id"] == request.rule_id:
-                            if request.name:
-                                rule["name"] = request.name
-                            if request.description:
-                                rule["description"] = request.description
-                            if request.sub_rules is not None:
-                                rule["sub_rules"] = request.sub_rules
-                            break
-                break
+        def change(section):
+            for rule in section["rules"]:
+                if request.rule_id and rule["id"] == request.rule_id:
+                    if request.name:
+                        rule["name"] = request.name
+                    if request.description:
+                        rule["description"] = request.description
+                    if request.sub_rules is not None:
+                        rule["sub_rules"] = request.sub_rules
+                    break
         
         # Convert back to text and save
-        new_manifesto = save_manifesto_from_rules(rules)
-        if save_manifesto(new_manifesto):
+        if await MANIFESTO_STORE.write_section(request.section_id, change, request.expected_version):
             reload_manifesto()
-            return {"success": True, "message": "Rule updated successfully"}
+            return {"success": True, "message": "Rule updated successfully", "version": MANIFESTO_STORE.version}
         else:
             raise HTTPException(status_code=500, detail="Failed to save manifesto")
+    except ManifestoVersionConflict as e:
+        reload_manifesto()
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -323,27 +956,24 @@ async def add_manifesto_rule(request: RuleAddRequest):
     Adds a new rule to a section.
     """
     try:
-        rules = parse_manifesto_to_rules(MANIFESTO_TEXT)
-        
         # Find the section and add the rule
-        for section in rules:
-            if section["id"] == request.section_id:
-                new_rule = {
-                    "id": len(section["rules"]) + 1,
-                    "name": request.name,
-                    "description": request.description,
-                    "sub_rules": request.sub_rules or []
-                }
-                section["rules"].append(new_rule)
-                break
+        def change(section):
+            section["rules"].append({
+                "id": len(section["rules"]) + 1,
+                "name": request.name,
+                "description": request.description,
+                "sub_rules": request.sub_rules or []
+            })
         
         # Convert back to text and save
-        new_manifesto = save_manifesto_from_rules(rules)
-        if save_manifesto(new_manifesto):
+        if await MANIFESTO_STORE.write_section(request.section_id, change, request.expected_version):
             reload_manifesto()
-            return {"success": True, "message": "Rule added successfully"}
+            return {"success": True, "message": "Rule added successfully", "version": MANIFESTO_STORE.version}
         else:
             raise HTTPException(status_code=500, detail="Failed to save manifesto")
+    except ManifestoVersionConflict as e:
+        reload_manifesto()
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -353,38 +983,70 @@ async def delete_manifesto_rule(request: RuleDeleteRequest):
     Deletes a rule from a section.
     """
     try:
-        rules = parse_manifesto_to_rules(MANIFESTO_TEXT)
+        # Find and remove the rule (the store renumbers the rest)
+        removed = []
         
-        # Find and remove the rule
-        for section in rules:
-            if section["id"] == request.section_id:
-                section["rules"] = [r for r in section["rules"] if r["id"] != request.rule_id]
-                # Re-number rules
-                for idx, rule in enumerate(section["rules"], 1):
-                    rule["id"] = idx
-                break
+        def change(section):
+            removed.extend(r["name"] for r in section["rules"] if r["id"] == request.rule_id)
+            section["rules"] = [r for r in section["rules"] if r["id"] != request.rule_id]
         
         # Convert back to text and save
-        new_manifesto = save_manifesto_from_rules(rules)
-        if save_manifesto(new_manifesto):
-            reload_manifesto()
-            return {"success": True, "message": "Rule deleted successfully"}
+        if await MANIFESTO_STORE.write_section(request.section_id, change, request.expected_version):
+            # Cached audits stay valid minus the deleted rule's findings
+            reload_manifesto(removed_rules=removed)
+            return {"success": True, "message": "Rule deleted successfully", "version": MANIFESTO_STORE.version}
         else:
             raise HTTPException(status_code=500, detail="Failed to save manifesto")
+    except ManifestoVersionConflict as e:
+        reload_manifesto()
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/manifesto/scoring")
+async def get_scoring_weights():
+    """
+    Returns the scoring weights: points per severity, multiplier per section id and
+    the disabled rules.
+    """
+    refresh_scoring()
+    return {"weights": SCORING.weights}
+
+@app.post("/manifesto/scoring")
+async def update_scoring_weights(request: ScoringUpdateRequest):
+    """
+    Updates the scoring weights (only the fields given). Stored audits are re-scored
+    with the new weights when they are next read; disabled rules are also left out of
+    new audits, and cached audits are reused without their findings.
+    """
+    updated = await SCORING.update(request.severity, request.sections, request.disabled_rules)
+    if updated is None:
+        raise HTTPException(status_code=500, detail="Failed to save scoring weights")
+    weights, newly_disabled = updated
+    refresh_audit_manifesto(removed_rules=newly_disabled)
+    return {"success": True, "weights": weights}
+
+@app.post("/audit/rescore")
+async def rescore_audit(request: RescoreRequest):
+    """
+    Re-scores a stored audit result with the current weights, without calling Gemini.
+    Violations of disabled rules, and of any rules in removed_rules, are dropped.
+    """
+    refresh_scoring()
+    return {"audit_result": SCORING.rescore(request.audit_result, request.removed_rules or ())}
+
 @app.websocket("/ws/live")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     
     api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    if not api_key and PROVIDER.name == "gemini":
         await websocket.close(code=1008, reason="API Key not found")
         return
 
     session = None
     receive_task = None
+    WEBSOCKET_SESSIONS.inc(endpoint="/ws/live")
     
     try:
         # Send connection status
@@ -395,7 +1057,7 @@ async def websocket_endpoint(websocket: WebSocket):
         
         # Context will be received in the main loop, initialize session first
         try:
-            session = GeminiLiveSession(api_key=api_key, audit_context=None)
+            session = PROVIDER.live_session(api_key=api_key, audit_context=None)
             await session.connect()
         except Exception as e:
             error_msg = str(e)
@@ -438,6 +1100,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 audio_received_count = 0
                 async for audio_chunk in session.receive_audio():
                     audio_received_count += 1
+                    WEBSOCKET_AUDIO_CHUNKS.inc(endpoint="/ws/live", direction="out")
                     print(f"✅ Received audio chunk #{audio_received_count} from Gemini, size: {len(audio_chunk)} bytes")
                     if websocket.client_state.name == "CONNECTED":
                         # Send audio chunk to frontend (base64 encoded)
@@ -485,6 +1148,7 @@ async def websocket_endpoint(websocket: WebSocket):
                     try:
                         audio_bytes = base64.b64decode(data.get("data"))
                         audio_chunk_count += 1
+                        WEBSOCKET_AUDIO_CHUNKS.inc(endpoint="/ws/live", direction="in")
                         
                         # Check if frontend marked this as the final chunk
                         turn_complete = data.get("turn_complete", False)
@@ -555,6 +1219,7 @@ async def websocket_endpoint(websocket: WebSocket):
             except:
                 pass
     finally:
+        WEBSOCKET_SESSIONS.dec(endpoint="/ws/live")
         if session:
             try:
                 await session.close()
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache")
+AUDIT_CACHE_DIR = os.getenv("AUDIT_CACHE_DIR", DEFAULT_CACHE_DIR)
+AUDIT_CACHE_MEMORY_ENTRIES = int(os.getenv("AUDIT_CACHE_MEMORY_ENTRIES", "256"))
+AUDIT_CACHE_DISK_MB = float(os.getenv("AUDIT_CACHE_DISK_MB", "64"))
+# Disk entries not read for this many days are dropped (0 keeps them until the size budget evicts them)
+AUDIT_CACHE_TTL_DAYS = float(os.getenv("AUDIT_CACHE_TTL_DAYS", "30"))
+
+
+def manifesto_digest(manifesto_text: str) -> str:
+    """Short version digest of the manifesto; any edit produces a new digest."""
+    return hashlib.sha256(manifesto_text.encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(image_bytes: bytes, manifesto_text: str, variant: str = "") -> str:
+    """
+    Content-addressed key: SHA-256 of the image plus the manifesto version digest.
+    `variant` separates results of different audit modes (e.g. "tiled") for the same image.
+    """
+    return digest_cache_key(image_bytes, manifesto_digest(manifesto_text), variant)
+
+
+def digest_cache_key(image_bytes: bytes, digest: str, variant: str = "") -> str:
+    """make_cache_key for a manifesto version known only by its digest (e.g. an earlier version)."""
+    key = f"{hashlib.sha256(image_bytes).hexdigest()}:{digest}"
+    return f"{key}:{variant}" if variant else key
+
+
+class AuditCache:
+    """
+    Two-tier cache for audit results.
+    Tier 1 is an in-memory LRU; tier 2 is a SQLite file evicted by total payload size
+    (least recently accessed first) and by age (not read for ttl_days). Entries are
+    never invalidated explicitly: a manifesto edit changes the key, and stale entries
+    age out of both tiers. on_evict, if given, is called (outside the lock) with the
+    keys that left both tiers, so indexes over the cache can drop them.
+    get and put are coroutines: memory hits are answered inline, while every SQLite
+    access runs in a worker thread so the disk tier never blocks the event loop.
+    The memory tier has its own lock, never held during I/O.
+    """
+
+    def __init__(self, cache_dir=AUDIT_CACHE_DIR, memory_entries=AUDIT_CACHE_MEMORY_ENTRIES, disk_max_mb=AUDIT_CACHE_DISK_MB,
+                 ttl_days=AUDIT_CACHE_TTL_DAYS, on_evict=None):
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = int(disk_max_mb * 1024 * 1024)
+        self.ttl_seconds = ttl_days * 86400
+        self.on_evict = on_evict
+        self._memory = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_bytes = 0
+
+        if self.disk_max_bytes > 0:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                self._db = sqlite3.connect(os.path.join(cache_dir, "audit_cache.sqlite3"), check_same_thread=False)
+                # get/put commit on the request path: WAL with synchronous=NORMAL does not fsync per
+                # commit, and a cache losing its last writes on a power cut only costs a re-audit
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS audits ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS audits_accessed ON audits(accessed_at)")
+                self._db.commit()
+                self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM audits").fetchone()[0]
+                evicted = self._evict_disk()
+                self._db.commit()
+            except Exception as e:
+                print(f"Audit disk cache disabled: {e}")
+                self._db = None
+            else:
+                self._evicted(evicted)
+
+    async def get(self, key):
+        """Returns (result, tier) where tier is "memory" or "disk", or (None, None) on a miss."""
+        with self._memory_lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key], "memory"
+
+        if self._db is None:
+            return None, None
+        result = await asyncio.to_thread(self._get_disk, key)
+        return (result, "disk") if result is not None else (None, None)
+
+    async def put(self, key, result):
+        """Stores a result in both tiers and evicts the disk tier down to its size and age budget."""
+        if self._db is None:
+            self._put(key, result)
+        else:
+            await asyncio.to_thread(self._put, key, result)
+
+    def contains(self, key):
+        """Whether either tier holds `key`; its recency is left alone."""
+        with self._lock:
+            return key in self._memory or self._on_disk(key)
+
+    def stats(self):
+        """Returns entry counts and disk usage for both tiers."""
+        with self._lock:
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM audits").fetchone()[0]
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes
+            }
+
+    def _get_disk(self, key):
+        """Reads `key` from the disk tier and promotes it to memory; None on a miss."""
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT value FROM audits WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self._db.execute("UPDATE audits SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+                result = json.loads(row[0])
+            except Exception as e:
+                print(f"Audit disk cache read error: {e}")
+                return None
+
+            evicted = self._remember(key, result)
+        self._evicted(evicted)
+        return result
+
+    def _put(self, key, result):
+        with self._lock:
+            evicted = self._store(key, result) if self._db is not None else []
+            evicted += self._remember(key, result)
+        self._evicted(evicted)
+
+    def _store(self, key, result):
+        """Writes a result to the disk tier; returns the keys evicted from both tiers to make room."""
+        value = json.dumps(result, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        if size > self.disk_max_bytes:
+            return []
+
+        try:
+            previous = self._db.execute("SELECT size FROM audits WHERE key = ?", (key,)).fetchone()
+            if previous:
+                self._disk_bytes -= previous[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO audits (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._disk_bytes += size
+            evicted = self._evict_disk()
+            self._db.commit()
+            return evicted
+        except Exception as e:
+            print(f"Audit disk cache write error: {e}")
+            return []
+
+    def _remember(self, key, result):
+        """Adds a result to the memory tier; returns the keys it pushed out that are not on disk either."""
+        with self._memory_lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            popped = []
+            while len(self._memory) > self.memory_entries:
+                popped.append(self._memory.popitem(last=False)[0])
+        return [old_key for old_key in popped if not self._on_disk(old_key)]
+
+    def _on_disk(self, key):
+        if self._db is None:
+            return False
+        try:
+            return self._db.execute("SELECT 1 FROM audits WHERE key = ?", (key,)).fetchone() is not None
+        except Exception as e:
+            print(f"Audit disk cache read error: {e}")
+            return False
+
+    def _evict_disk(self):
+        """Drops expired entries, then the least recently accessed ones down to the size budget; returns the keys not held in memory."""
+        removed = []
+        if self.ttl_seconds > 0:
+            expired = self._db.execute(
+                "SELECT key, size FROM audits WHERE accessed_at < ?", (time.time() - self.ttl_seconds,)
+            ).fetchall()
+            for key, size in expired:
+                self._db.execute("DELETE FROM audits WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                removed.append(key)
+        while self._disk_bytes > self.disk_max_bytes:
+            row = self._db.execute("SELECT key, size FROM audits ORDER BY accessed_at ASC LIMIT 1").fetchone()
+            if row is None:
+                self._disk_bytes = 0
+                break
+            self._db.execute("DELETE FROM audits WHERE key = ?", (row[0],))
+            self._disk_bytes -= row[1]
+            removed.append(row[0])
+        with self._memory_lock:
+            return [key for key in removed if key not in self._memory]
+
+    def _evicted(self, keys):
+        if keys and self.on_evict is not None:
+            try:
+                self.on_evict(keys)
+            except Exception as e:
+                print(f"Audit cache eviction callback failed: {e}")
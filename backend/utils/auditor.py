@@ -1,26 +1,158 @@
+import os
 import json
-import google.generativeai as genai
+import math
+import re
+import time
+import asyncio
 from PIL import Image
 import io
-import time
 
-def audit_dashboard(image_bytes, manifesto_text):
+from utils.llm_client import generate_content, stream_content, IMAGE_TOKEN_ESTIMATE
+from utils.prompt_cache import PromptPrefix
+from utils.json_stream import AuditStreamParser
+from utils.single_flight import coalesce, input_digest
+from utils.metrics import observe_stage
+from utils.prompt_budget import PromptBuilder, audit_result_renderings, count_tokens
+from utils.manifesto_index import rule_renderings
+from utils.local_rules import open_page, strip_rules
+from utils.color_analysis import LOCAL_COLOR_ANALYSIS, COLOR_RULES, analyze_colors
+from utils.layout_analysis import LOCAL_LAYOUT_ANALYSIS, LAYOUT_RULES, analyze_layout
+from utils.scoring import SCORING
+
+# Image normalisation settings for the vision call
+AUDIT_IMAGE_MAX_EDGE = int(os.getenv("AUDIT_IMAGE_MAX_EDGE", "2048"))
+AUDIT_IMAGE_FORMAT = os.getenv("AUDIT_IMAGE_FORMAT", "WEBP").upper()
+AUDIT_IMAGE_QUALITY = int(os.getenv("AUDIT_IMAGE_QUALITY", "85"))
+
+# Tiled audit mode: the page is kept at up to AUDIT_TILED_MAX_EDGE and cut into
+# overlapping tiles of about AUDIT_TILE_SIZE pixels, audited concurrently
+AUDIT_TILED_MAX_EDGE = int(os.getenv("AUDIT_TILED_MAX_EDGE", "8192"))
+AUDIT_TILE_SIZE = int(os.getenv("AUDIT_TILE_SIZE", "1024"))
+AUDIT_TILE_OVERLAP = float(os.getenv("AUDIT_TILE_OVERLAP", "0.15"))
+AUDIT_MAX_TILES = int(os.getenv("AUDIT_MAX_TILES", "12"))
+
+def normalize_image(image_bytes, max_edge=AUDIT_IMAGE_MAX_EDGE, image_format=AUDIT_IMAGE_FORMAT, quality=AUDIT_IMAGE_QUALITY):
     """
-    Audits the dashboard image against the manifesto using Gemini 2.5 Flash.
-    Returns a JSON object with score and feedback.
+    Preprocessing stage before the vision call.
+    Downscales to max_edge on the long side, flattens alpha onto white, drops
+    metadata (EXIF/ICC/text chunks are not carried over) and re-encodes compactly.
+    Flat-colour exports sometimes compress better losslessly, so when the lossy
+    output is larger than the upload a PNG encode is tried and the smaller one kept.
+    Returns (normalized_bytes, stats) where stats records sizes and timings.
     """
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+    image.draft("RGB", (max_edge, max_edge))
+    image.load()
+    decode_ms = (time.perf_counter() - start) * 1000
 
-    try:
-        image = Image.open(io.BytesIO(image_bytes))
-    except Exception as e:
-        print(f"Error processing image: {e}")
-        return None
+    start = time.perf_counter()
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
 
-    prompt = f"""
-    Sen "Acımasız Eleştirmen" (The Ruthless Critic), Kıdemli bir Power BI Denetçisisin.
-    Görevin, aşağıdaki Manifesto'ya göre verilen dashboard ekran görüntüsünü sıkı bir şekilde denetlemektir.
-    
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    normalized_bytes = encode_image(image, image_format, quality)
+
+    if len(normalized_bytes) > len(image_bytes) and image_format != "PNG":
+        png = io.BytesIO()
+        image.save(png, format="PNG", optimize=True)
+        if png.tell() < len(normalized_bytes):
+            normalized_bytes = png.getvalue()
+            image_format = "PNG"
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    stats = {
+        "original_bytes": len(image_bytes),
+        "normalized_bytes": len(normalized_bytes),
+        "original_size": list(original_size),
+        "normalized_size": list(image.size),
+        "format": image_format,
+        "decode_ms": round(decode_ms, 2),
+        "encode_ms": round(encode_ms, 2)
+    }
+    return normalized_bytes, stats
+
+def encode_image(image, image_format=AUDIT_IMAGE_FORMAT, quality=AUDIT_IMAGE_QUALITY):
+    """Encodes an RGB PIL image with the settings used for the vision call."""
+    out = io.BytesIO()
+    if image_format == "JPEG":
+        # 4:4:4 chroma keeps small coloured labels legible for the model
+        image.save(out, format="JPEG", quality=quality, optimize=True, subsampling=0)
+    elif image_format == "WEBP":
+        # method=2 is within a few percent of the default size at under half the encode time
+        image.save(out, format="WEBP", quality=quality, method=2)
+    else:
+        image.save(out, format=image_format, quality=quality)
+    return out.getvalue()
+
+def _tile_spans(length, tile_size, overlap):
+    # A side up to 1.25x the tile size stays in one tile rather than adding a sliver row;
+    # otherwise tiles are spread evenly so every seam gets the same overlap
+    count = max(1, math.ceil(length / tile_size - 0.25))
+    span = length / (count - (count - 1) * overlap)
+    step = span * (1 - overlap)
+    return [(round(i * step), min(length, round(i * step + span))) for i in range(count)]
+
+def tile_boxes(width, height, tile_size=AUDIT_TILE_SIZE, overlap=AUDIT_TILE_OVERLAP, max_tiles=AUDIT_MAX_TILES):
+    """
+    Overlapping (left, top, right, bottom) boxes covering a width x height page.
+    Neighbouring tiles share `overlap` of their edge so elements on a seam are seen whole
+    at least once. The tile size grows until the grid fits in max_tiles.
+    """
+    while True:
+        xs = _tile_spans(width, tile_size, overlap)
+        ys = _tile_spans(height, tile_size, overlap)
+        if len(xs) * len(ys) <= max_tiles:
+            break
+        tile_size = int(tile_size * 1.25)
+    return [(left, top, right, bottom) for top, bottom in ys for left, right in xs]
+
+def crop_tiles(image_bytes, boxes):
+    """Crops and encodes each box of the (already normalised) page image."""
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return [encode_image(image.crop(box)) for box in boxes]
+
+AUDITOR_SYSTEM_INSTRUCTION = """Sen "Acımasız Eleştirmen" (The Ruthless Critic), Kıdemli bir Power BI Denetçisisin.
+Görevin, aşağıdaki Manifesto'ya göre verilen dashboard ekran görüntüsünü sıkı bir şekilde denetlemektir."""
+
+# Checks measured locally (utils.color_analysis, utils.layout_analysis), as named in the audit instructions
+LOCAL_CHECK_NAMES = {
+    "color": "renk sayısı (3 renk kuralı), metin/arka plan kontrastı ve arka plan görselleri",
+    "layout": "görsellerin ızgara hizası ve aralarındaki boşluk"
+}
+
+def local_checks_enabled():
+    """The local analysers that are switched on, with the manifesto rules each one takes over."""
+    enabled = {}
+    if LOCAL_COLOR_ANALYSIS:
+        enabled["color"] = COLOR_RULES.values()
+    if LOCAL_LAYOUT_ANALYSIS:
+        enabled["layout"] = LAYOUT_RULES.values()
+    return enabled
+
+def auditor_prefix(manifesto_text):
+    """
+    Static head of the audit prompt (manifesto, instructions, output format).
+    It only changes with the manifesto, so it is served from the prompt cache.
+    Rules checked by the enabled local analysers are left out.
+    """
+    local_instruction = ""
+    enabled = local_checks_enabled()
+    if enabled:
+        manifesto_text = strip_rules(manifesto_text, [name for names in enabled.values() for name in names])
+        checks = "; ".join(LOCAL_CHECK_NAMES[analyser] for analyser in enabled)
+        local_instruction = f"\n    7. Şunlar yerel olarak ölçülüyor, bunlar için ihlal ÜRETME: {checks}."
+    return PromptPrefix("auditor", AUDITOR_SYSTEM_INSTRUCTION, f"""
     MANIFESTO:
     {manifesto_text}
     
@@ -30,7 +162,7 @@ def audit_dashboard(image_bytes, manifesto_text):
     3. ACIMASIZ OL. Her ihlal için puan kır.
     4. 100 puan ile başla.
     5. Bölüm 6: Anlamsal İsimlendirme & Erişilebilirlik konusuna dikkat et. Teknik isimler büyük hatadır.
-    6. ÇIKTI DİLİ: TÜRKÇE.
+    6. ÇIKTI DİLİ: TÜRKÇE.{local_instruction}
     
     ÇIKTI FORMATI (SADECE JSON):
     {{
@@ -39,6 +171,7 @@ def audit_dashboard(image_bytes, manifesto_text):
         "violations": [
             {{
                 "rule_section": "<bölüm_numarası_ve_adı>",
+                "rule": "<ihlal_edilen_kuralın_manifestodaki_adı>",
                 "issue": "<ihlal_açıklaması_türkçe>",
                 "recommendation": "<spesifik_çözüm_türkçe>",
                 "severity": "<High|Medium|Low>"
@@ -46,121 +179,526 @@ def audit_dashboard(image_bytes, manifesto_text):
         ],
         "positive_points": ["<nokta1_türkçe>", "<nokta2_türkçe>"]
     }}
+    """)
+
+AUDIT_INSTRUCTION = "Bu dashboard ekran görüntüsünü denetle."
+
+async def build_audit_contents(image_bytes, prior_result=None, preprocess=True, prefix=None, instruction=AUDIT_INSTRUCTION, endpoint="audit"):
     """
+    Builds the per-request part of the audit prompt (instruction text + image blob).
+    The prompt is accounted under `endpoint` with the cached `prefix` and the image
+    counted against its budget; prior_result is the only section that can be trimmed.
+    Returns None if the image cannot be decoded.
+    """
+    try:
+        if preprocess:
+            with observe_stage("image_decode"):
+                image_bytes, stats = await asyncio.to_thread(normalize_image, image_bytes)
+            print(f"Image normalized: {stats['original_bytes']} -> {stats['normalized_bytes']} bytes")
+        with observe_stage("prompt_build"):
+            image_part = {
+                "mime_type": Image.MIME[Image.open(io.BytesIO(image_bytes)).format],
+                "data": image_bytes
+            }
+    except Exception as e:
+        print(f"Error processing image: {e}")
+        return None
 
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(
-                [prompt, image],
-                generation_config={"response_mime_type": "application/json"}
-            )
+    # Only the variable part travels with each request; the manifesto prefix is cached
+    builder = PromptBuilder(endpoint)
+    if prefix is not None:
+        builder.add_fixed("prefix", count_tokens(prefix.system_instruction + prefix.text))
+    builder.add("instruction", instruction)
+
+    if prior_result:
+        prior_blocks = [f"""
+    ÖNCEKİ DENETİM (neredeyse aynı bir dashboard için):
+    {rendering}
+    
+    Bu sonucu başlangıç noktası olarak kullan: görselde hâlâ geçerli olan ihlalleri koru,
+    artık geçerli olmayanları çıkar, yeni ihlalleri ekle ve puanı buna göre güncelle.
+    """ for rendering in audit_result_renderings(prior_result)]
+        builder.add("prior_result", prior_blocks[0], priority=1, fallbacks=prior_blocks[1:] + [""])
+
+    builder.add_fixed("image", IMAGE_TOKEN_ESTIMATE)
+    return [builder.build(), image_part]
+
+@coalesce(lambda image_bytes, manifesto_text, prior_result=None, preprocess=True, tiled=False, source_bytes=None:
+          input_digest(image_bytes, manifesto_text, prior_result, preprocess, tiled, source_bytes))
+async def audit_dashboard(image_bytes, manifesto_text, prior_result=None, preprocess=True, tiled=False, source_bytes=None):
+    """
+    Audits the dashboard image against the manifesto using Gemini 2.5 Flash.
+    Returns a JSON object with score and feedback.
+    If prior_result is given (an audit of a near-identical dashboard), it is sent
+    as a starting point for the model to confirm or adjust.
+    Pass preprocess=False when image_bytes already went through normalize_image, and the
+    upload it came from as source_bytes.
+    tiled=True switches to audit_dashboard_tiled (prior_result is not used there).
+    The local colour and layout checks run alongside the model call on the upload itself
+    (source_bytes, else image_bytes), so they measure screenshot pixels rather than the
+    downscaled lossy copy the model gets; their findings are merged into its result and
+    the score is then recomputed from the violations by the scoring engine (utils.scoring).
+    """
+    if tiled:
+        return await audit_dashboard_tiled(image_bytes, manifesto_text, preprocess, source_bytes)
+
+    local_task = asyncio.create_task(run_local_checks(source_bytes or image_bytes, manifesto_text))
+    prefix = auditor_prefix(manifesto_text)
+    contents = await build_audit_contents(image_bytes, without_local_checks(prior_result), preprocess, prefix=prefix)
+    if contents is None:
+        local_task.cancel()
+        return None
+
+    try:
+        response = await generate_content(
+            contents,
+            generation_config={"response_mime_type": "application/json"},
+            prefix=prefix
+        )
+        with observe_stage("json_parse"):
+            result = json.loads(response.text)
+    except Exception as e:
+        print(f"Error during audit: {e}")
+        local_task.cancel()
+        return None
+    return finalize_audit(result, await local_task)
+
+async def stream_audit_dashboard(image_bytes, manifesto_text, preprocess=True, source_bytes=None):
+    """
+    Streaming variant of audit_dashboard.
+    Yields ("summary", str) and one ("violation", dict) per entry as soon as each is
+    syntactically complete in the model output, then ("score", int) with the engine score
+    of the finished audit and a final ("result", {"audit_result", "complete", "error"}).
+    The model's own score is not forwarded: it is replaced by the scoring engine's value
+    (kept as model_score in the result), so the two events always agree. If the stream is cut off,
+    audit_result holds whatever completed before the cut and complete is False.
+    Locally measured violations are yielded first, before the model output starts; as in
+    audit_dashboard they are measured on source_bytes (the upload) when given.
+    """
+    local_task = asyncio.create_task(run_local_checks(source_bytes or image_bytes, manifesto_text))
+    prefix = auditor_prefix(manifesto_text)
+    contents = await build_audit_contents(image_bytes, preprocess=preprocess, prefix=prefix)
+    if contents is None:
+        local_task.cancel()
+        yield "result", {"audit_result": None, "complete": False, "error": "Invalid image"}
+        return
+
+    local = await local_task
+    for violation in (local or {}).get("violations", []):
+        yield "violation", violation
+
+    parser = AuditStreamParser()
+    error = None
+    try:
+        async for chunk in stream_content(
+            contents,
+            generation_config={"response_mime_type": "application/json"},
+            prefix=prefix
+        ):
+            for event, data in parser.feed(chunk):
+                if event != "score":
+                    yield event, data
+    except Exception as e:
+        print(f"Error during streamed audit: {e}")
+        error = str(e)
+
+    result, complete = parser.result()
+    audit_result = finalize_audit(result, local)
+    if audit_result:
+        yield "score", audit_result["score"]
+    yield "result", {"audit_result": audit_result, "complete": complete, "error": error}
+
+SEVERITY_RANK = {"Low": 0, "Medium": 1, "High": 2}
+
+# Two violations of the same section whose boxes overlap by at least this share of
+# the smaller box are treated as the same finding seen from two tiles
+TILE_DUPLICATE_OVERLAP = float(os.getenv("TILE_DUPLICATE_OVERLAP", "0.5"))
+
+TILE_PROMPT = """Bu görsel, {width}x{height} piksellik bir dashboard sayfasının bir bölgesidir (x: {left}-{right}, y: {top}-{bottom}).
+    Yalnızca bu bölgede görünen öğeleri denetle. Bölüm 1 (sayfa yerleşimi ve ızgara) kurallarını DEĞERLENDİRME;
+    bunlar tüm sayfa üzerinde ayrıca denetleniyor. Bölge kenarında kesilmiş öğeleri yalnızca görünen kısmına göre değerlendir.
+    Her ihlale, ihlalin bu görseldeki konumunu 0-1 arası oranlarla veren "bbox": [x0, y0, x1, y1] alanını ekle."""
+
+LAYOUT_PROMPT = """Bu dashboard ekran görüntüsünün TAMAMINI yalnızca Bölüm 1 (sayfa yerleşimi ve ızgara) kurallarına göre denetle.
+    Diğer bölümleri değerlendirme; onlar sayfa bölge bölge ayrıca denetleniyor.
+    Her ihlale, ihlalin görseldeki konumunu 0-1 arası oranlarla veren "bbox": [x0, y0, x1, y1] alanını ekle."""
+
+def _section_key(rule_section):
+    """Compares sections by number when there is one ("1. Layout" == "Bölüm 1: Yerleşim")."""
+    match = re.search(r"\d+", str(rule_section))
+    return match.group(0) if match else str(rule_section).strip().lower()
+
+def _page_box(bbox, box):
+    """Maps a 0-1 bbox relative to `box` onto page pixels; None if the model gave no usable bbox."""
+    try:
+        x0, y0, x1, y1 = (min(max(float(v), 0.0), 1.0) for v in bbox)
+    except (TypeError, ValueError):
+        return None
+    left, top, right, bottom = box
+    width, height = right - left, bottom - top
+    return [round(left + min(x0, x1) * width), round(top + min(y0, y1) * height),
+            round(left + max(x0, x1) * width), round(top + max(y0, y1) * height)]
+
+def _boxes_overlap(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return smaller > 0 and ix * iy / smaller >= TILE_DUPLICATE_OVERLAP
+
+def merge_tile_violations(parts):
+    """
+    Merges violations from several audit parts, given as (violations, box) pairs where
+    each violation's 0-1 bbox is relative to `box` (page pixels).
+    A violation is a duplicate of a kept one if it has the same section and either their
+    page boxes overlap (TILE_DUPLICATE_OVERLAP) or, lacking boxes, the same issue text.
+    Duplicates keep the higher severity. Returns (violations, duplicates_removed).
+    """
+    merged = []
+    duplicates = 0
+    for violations, box in parts:
+        for violation in violations:
+            violation = dict(violation)
+            page_box = _page_box(violation.pop("bbox", None), box)
+            if page_box is not None:
+                violation["bbox"] = page_box
+            section = _section_key(violation.get("rule_section", ""))
+            issue = violation.get("issue", "").strip().lower()
+
+            match = None
+            for kept in merged:
+                if _section_key(kept.get("rule_section", "")) != section:
+                    continue
+                if page_box is not None and "bbox" in kept:
+                    if _boxes_overlap(page_box, kept["bbox"]):
+                        match = kept
+                        break
+                elif kept.get("issue", "").strip().lower() == issue:
+                    match = kept
+                    break
+
+            if match is None:
+                merged.append(violation)
+                continue
+            duplicates += 1
+            if SEVERITY_RANK.get(violation.get("severity"), 1) > SEVERITY_RANK.get(match.get("severity"), 1):
+                match["severity"] = violation["severity"]
+    return merged, duplicates
+
+async def _audit_part(image_bytes, prompt, manifesto_text, preprocess=False):
+    """One vision call of a tiled audit: `prompt` replaces the default instruction text."""
+    prefix = auditor_prefix(manifesto_text)
+    contents = await build_audit_contents(image_bytes, preprocess=preprocess, prefix=prefix, instruction=prompt, endpoint="audit_tile")
+    if contents is None:
+        return None
+    try:
+        response = await generate_content(
+            contents,
+            generation_config={"response_mime_type": "application/json"},
+            prefix=prefix
+        )
+        with observe_stage("json_parse"):
             return json.loads(response.text)
-        except Exception as e:
-            if "429" in str(e) or "Quota" in str(e):
-                wait_time = (2 ** attempt) * 5
-                print(f"Quota exceeded. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"Error during audit: {e}")
-                return None
-    print("Quota exceeded. Please try again later.")
-    return None
-
-def generate_dashboard_simulation(manifesto_text, audit_result, user_feedback=None):
+    except Exception as e:
+        print(f"Error during tiled audit part: {e}")
+        return None
+
+async def audit_dashboard_tiled(image_bytes, manifesto_text, preprocess=True, source_bytes=None):
     """
-    Generates a simulated image of the future dashboard state using 'gemini-2.5-flash' (SVG).
+    Tiled audit for very wide or long dashboards.
+    The page is cut into overlapping tiles that are audited concurrently (all sections
+    except the page-level Section 1), while one global pass over the downscaled page
+    covers Section 1. Violations are merged with spatial de-duplication and the score
+    is recomputed by the scoring engine. Pages that fit in one tile use the single-shot path.
+    The local checks run on source_bytes (the upload) when given, as in audit_dashboard.
+    """
+    source_bytes = source_bytes or image_bytes
+    try:
+        if preprocess:
+            with observe_stage("image_decode"):
+                image_bytes, _ = await asyncio.to_thread(normalize_image, image_bytes, AUDIT_TILED_MAX_EDGE)
+        width, height = Image.open(io.BytesIO(image_bytes)).size
+    except Exception as e:
+        print(f"Error processing image: {e}")
+        return None
+
+    boxes = tile_boxes(width, height)
+    if len(boxes) == 1:
+        return await audit_dashboard(image_bytes, manifesto_text, preprocess=False, source_bytes=source_bytes)
+
+    local_task = asyncio.create_task(run_local_checks(source_bytes, manifesto_text))
+    tiles = await asyncio.to_thread(crop_tiles, image_bytes, boxes)
+    prompts = [TILE_PROMPT.format(width=width, height=height, left=l, top=t, right=r, bottom=b) for l, t, r, b in boxes]
+    # The layout pass sees the whole page at the normal single-shot resolution
+    results = await asyncio.gather(
+        _audit_part(image_bytes, LAYOUT_PROMPT, manifesto_text, preprocess=max(width, height) > AUDIT_IMAGE_MAX_EDGE),
+        *[_audit_part(tile, prompt, manifesto_text) for tile, prompt in zip(tiles, prompts)]
+    )
+    layout, tile_results = results[0], results[1:]
+    if layout is None and all(result is None for result in tile_results):
+        local_task.cancel()
+        return None
+
+    parts = []
+    if layout is not None:
+        layout_violations = [v for v in layout.get("violations", []) if _section_key(v.get("rule_section", "")) == "1"]
+        parts.append((layout_violations, (0, 0, width, height)))
+    for result, box in zip(tile_results, boxes):
+        if result is not None:
+            tile_violations = [v for v in result.get("violations", []) if _section_key(v.get("rule_section", "")) != "1"]
+            parts.append((tile_violations, box))
+    violations, duplicates = merge_tile_violations(parts)
+
+    positive_points = []
+    for result in results:
+        for point in (result or {}).get("positive_points", []):
+            if point not in positive_points:
+                positive_points.append(point)
+
+    summary = next((result.get("summary") for result in results if result and result.get("summary")), "")
+    return finalize_audit({
+        "score": SCORING.score(violations),
+        "summary": summary,
+        "violations": violations,
+        "positive_points": positive_points,
+        "tiling": {
+            "tiles": len(boxes),
+            "page_size": [width, height],
+            "failed_tiles": sum(1 for result in tile_results if result is None),
+            "layout_pass": layout is not None,
+            "duplicates_removed": duplicates
+        }
+    }, await local_task)
+
+async def audit_single_rule(image_bytes, section_title, rule, preprocess=True):
+    """
+    Checks the dashboard image against one rule only (e.g. a rule just added via /auditor).
+    The prompt carries that rule instead of the whole manifesto.
+    Returns the list of violations for that rule, or None on error.
     """
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
+    instruction = f"""
+    {AUDITOR_SYSTEM_INSTRUCTION}
     
-    violations_summary = ", ".join([v['issue'] for v in audit_result.get('violations', [])[:5]])
+    Bu dashboard ekran görüntüsünü YALNIZCA aşağıdaki kurala göre denetle. Diğer kuralları değerlendirme.
     
-    prompt = f"""
-    Sen uzman bir UI Tasarımcısısın.
-    Aşağıdaki kurallara sıkı sıkıya uyan bir Power BI Dashboard'unun detaylı SVG kodunu oluştur:
-    {manifesto_text[:500]}...
+    BÖLÜM: {section_title}
+    KURAL: {rule["name"]}
+    AÇIKLAMA: {rule["description"]}
     
+    ÇIKTI DİLİ: TÜRKÇE.
+    ÇIKTI FORMATI (SADECE JSON, kural ihlal edilmiyorsa boş liste):
+    {{
+        "violations": [
+            {{
+                "rule_section": "{section_title}",
+                "rule": "{rule["name"]}",
+                "issue": "<ihlal_açıklaması_türkçe>",
+                "recommendation": "<spesifik_çözüm_türkçe>",
+                "severity": "<High|Medium|Low>"
+            }}
+        ]
+    }}
+    """
+    contents = await build_audit_contents(image_bytes, preprocess=preprocess, instruction=instruction, endpoint="rule_audit")
+    if contents is None:
+        return None
+
+    try:
+        response = await generate_content(
+            contents,
+            generation_config={"response_mime_type": "application/json"}
+        )
+        with observe_stage("json_parse"):
+            return json.loads(response.text).get("violations", [])
+    except Exception as e:
+        print(f"Error during single-rule audit: {e}")
+        return None
+
+def merge_rule_violations(prior_result, new_violations):
+    """
+    Merges violations from a single-rule audit into a prior audit result.
+    Duplicates (same section and issue) are dropped, and the score is recomputed
+    from the merged violations by the scoring engine.
+    """
+    merged = dict(prior_result)
+    violations = list(prior_result.get("violations", []))
+    seen = {(v.get("rule_section", "").strip().lower(), v.get("issue", "").strip().lower()) for v in violations}
+
+    added = []
+    for violation in new_violations:
+        key = (violation.get("rule_section", "").strip().lower(), violation.get("issue", "").strip().lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        added.append(violation)
+
+    merged["violations"] = violations + added
+    return SCORING.rescore(merged), added
+
+def local_analysis(image_bytes, manifesto_text):
+    """
+    Decodes the page once and runs the enabled local analysers on it.
+    Returns their merged results: "violations", "checked_rules" and each analyser's
+    measurements ("palette", "layout").
+    """
+    analysers = {"color": ("color_analysis", analyze_colors), "layout": ("layout_analysis", analyze_layout)}
+    image = open_page(image_bytes)
+    merged = {"violations": [], "checked_rules": []}
+    for analyser in local_checks_enabled():
+        stage, analyse = analysers[analyser]
+        with observe_stage(stage):
+            result = analyse(image, manifesto_text)
+        merged["violations"] += result.pop("violations")
+        merged["checked_rules"] += result.pop("checked_rules")
+        merged.update(result)
+    return merged
+
+async def run_local_checks(image_bytes, manifesto_text):
+    """
+    Runs local_analysis in a worker thread. Returns None when no local analyser is
+    enabled or the analysis fails; the audit then goes ahead with the model's findings only.
+    """
+    if not local_checks_enabled():
+        return None
+    try:
+        return await asyncio.to_thread(local_analysis, image_bytes, manifesto_text)
+    except Exception as e:
+        print(f"Error during local analysis: {e}")
+        return None
+
+def finalize_audit(result, local):
+    """
+    Adds locally measured violations (if any) to a model audit result like
+    merge_rule_violations, records the measurements under local_analysis, and scores
+    the result with the scoring engine; the model's own number is kept as model_score.
+    """
+    if not result:
+        return result
+    if not local:
+        return SCORING.rescore(result)
+    merged, _ = merge_rule_violations(result, local["violations"])
+    merged["local_analysis"] = {key: value for key, value in local.items() if key != "violations"}
+    return merged
+
+def without_local_checks(result):
+    """
+    An audit result without its local violations, re-scored from the remaining ones.
+    Used for the prior result sent to the model, which would otherwise repeat them.
+    """
+    if not result:
+        return result
+    stripped = {k: v for k, v in result.items() if k not in ("local_analysis", "model_score")}
+    stripped["violations"] = [v for v in result.get("violations", []) if v.get("source") != "local"]
+    stripped["score"] = SCORING.score(stripped["violations"])
+    return stripped
+
+@coalesce(lambda manifesto_text, audit_result, user_feedback=None: input_digest(manifesto_text, audit_result, user_feedback))
+async def generate_dashboard_simulation(manifesto_text, audit_result, user_feedback=None):
+    """
+    Generates a simulated image of the future dashboard state using 'gemini-2.5-flash' (SVG).
+    """
+    violations = audit_result.get('violations', [])
+    issues = [v['issue'] for v in violations]
+    violation_blocks = [f"""
     Önceki versiyonda bulunan şu ihlalleri düzeltmeli:
-    {violations_summary}
-    
+    {", ".join(issues[:count])}
+    """ for count in (5, 3, 1)]
+
+    # Only the manifesto rules relevant to these violations and the feedback
+    query = " ".join([f"{v.get('rule_section', '')} {v.get('issue', '')}" for v in violations[:5]] + [user_feedback or ""])
+    rule_blocks = [f"""
+    Aşağıdaki kurallara sıkı sıkıya uyan bir Power BI Dashboard'unun detaylı SVG kodunu oluştur:
+    {rules}
+    """ for rules in rule_renderings(manifesto_text, query)]
+
+    builder = PromptBuilder("simulate")
+    builder.add("instructions", """
+    Sen uzman bir UI Tasarımcısısın.""")
+    builder.add("manifesto", rule_blocks[0], priority=2, fallbacks=rule_blocks[1:])
+    builder.add("violations", violation_blocks[0], priority=1, fallbacks=violation_blocks[1:])
+    builder.add("user_feedback", f"""
     {f"Kullanıcı Revizyon İsteği: {user_feedback}" if user_feedback else ""}
-    
+    """)
+    builder.add("output", """
     ÇIKTI: Sadece dashboard arayüzünün ham SVG kodunu ver. Profesyonel, temiz görünmeli ve manifestodaki renkleri kullanmalı.
-    """
+    """)
+    prompt = builder.build()
     
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(prompt)
-            text = response.text
-            
-            # Robust SVG extraction using regex
-            import re
-            match = re.search(r'<svg.*?</svg>', text, re.DOTALL)
-            if match:
-                return match.group(0)
+    try:
+        response = await generate_content(prompt)
+        text = response.text
+        
+        # Robust SVG extraction using regex
+        match = re.search(r'<svg.*?</svg>', text, re.DOTALL)
+        if match:
+            return match.group(0)
+        
+        # Fallback: Check for markdown blocks if regex fails
+        if "```svg" in text:
+            return text.split("```svg")[1].split("```")[0].strip()
+        elif "```xml" in text:
+            return text.split("```xml")[1].split("```")[0].strip()
             
-            # Fallback: Check for markdown blocks if regex fails
-            if "```svg" in text:
-                return text.split("```svg")[1].split("```")[0].strip()
-            elif "```xml" in text:
-                return text.split("```xml")[1].split("```")[0].strip()
-                
-            return text.strip()
-        except Exception as e:
-            if "429" in str(e) or "Quota" in str(e):
-                wait_time = (2 ** attempt) * 5
-                print(f"Quota exceeded. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"Simulation generation failed: {e}")
-                return None
-    print("Quota exceeded. Please try again later.")
-    return None
-
-def get_chat_response(chat_history, user_input, manifesto_text, audit_result):
+        return text.strip()
+    except Exception as e:
+        print(f"Simulation generation failed: {e}")
+        return None
+
+async def get_chat_response(chat_history, user_input, manifesto_text, audit_result):
     """
     Generates a response from the Consultant based on chat history and audit context.
     """
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
-    
-    # 1. Optimize Context: Truncate History
-    # Keep only the last 5 messages to save tokens
-    recent_history = chat_history[-5:] if len(chat_history) > 5 else chat_history
-    
-    # 2. Optimize Context: Summarize Audit Result
-    # Instead of full JSON, send key metrics
+    # 1. Optimize Context: Summarize Audit Result
+    # Instead of full JSON, send key metrics; over budget, the summary text and then the top violations go
     audit_summary = {
         "score": audit_result.get('score'),
         "summary": audit_result.get('summary'),
         "violations_count": len(audit_result.get('violations', [])),
         "top_violations": [v['issue'] for v in audit_result.get('violations', [])[:3]]
     }
+    summaries = [audit_summary, {k: v for k, v in audit_summary.items() if k != "summary"},
+                 {k: audit_summary[k] for k in ("score", "violations_count")}]
+    summary_blocks = [f"""
+    Denetim Durumu:
+    {json.dumps(summary, ensure_ascii=False)}
+    """ for summary in summaries]
+
+    # 2. Optimize Context: Truncate History
+    # Keep only the last 5 messages to save tokens, fewer when over budget
+    history_blocks = [f"""
+    KULLANICI GEÇMİŞİ (Son 10 Mesaj):
+    {json.dumps(chat_history[-count:], ensure_ascii=False)}
+    """ for count in (5, 3, 1)] + [""]
+
+    # 3. Optimize Context: Manifesto rules relevant to the question and the top violations
+    query = " ".join([user_input] + [f"{v.get('rule_section', '')} {v.get('issue', '')}" for v in audit_result.get('violations', [])[:3]])
+    rule_blocks = [f"""
+    BAĞLAM:
+    Manifesto (İlgili Kurallar):
+    {rules}
+    """ for rules in rule_renderings(manifesto_text, query)]
 
     # Construct context
-    context = f"""
+    builder = PromptBuilder("chat")
+    builder.add("instructions", """
     Sen Kıdemli bir Veri Görselleştirme Danışmanısın.
     Kullanıcı ile Power BI dashboard'u hakkında konuşuyorsun.
-    
-    BAĞLAM:
-    Manifesto (Özet): {manifesto_text[:1000]}...
-    
-    Denetim Durumu:
-    {json.dumps(audit_summary, ensure_ascii=False)}
-    
-    KULLANICI GEÇMİŞİ (Son 10 Mesaj):
-    {json.dumps(recent_history, ensure_ascii=False)}
-    
+    """)
+    builder.add("manifesto", rule_blocks[0], priority=3, fallbacks=rule_blocks[1:])
+    builder.add("audit_summary", summary_blocks[0], priority=2, fallbacks=summary_blocks[1:])
+    builder.add("history", history_blocks[0], priority=1, fallbacks=history_blocks[1:])
+    builder.add("user_input", f"""
     SON KULLANICI MESAJI:
     {user_input}
-    
+    """)
+    builder.add("task", """
     GÖREV:
     Kullanıcının sorusunu yanıtla. Yardımcı ol, eğitici ol ama Manifesto kurallarından taviz verme.
     Kısa ve öz cevap ver.
-    """
+    """)
+    context = builder.build()
     
     try:
-        response = model.generate_content(context)
+        response = await generate_content(context)
         return response.text
     except Exception as e:
         return f"Üzgünüm, bir hata oluştu: {e}"
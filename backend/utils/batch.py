@@ -0,0 +1,85 @@
+import io
+import os
+import json
+import time
+import asyncio
+import zipfile
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "300"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_MAX_IMAGE_MB = float(os.getenv("BATCH_MAX_IMAGE_MB", "25"))
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif")
+
+
+def expand_batch_uploads(uploads):
+    """
+    Turns uploaded (filename, bytes) pairs into a flat list of images.
+    Zip archives are expanded in place (image entries only, in archive order).
+    Raises ValueError if the batch exceeds BATCH_MAX_ITEMS.
+    """
+    max_image_bytes = int(BATCH_MAX_IMAGE_MB * 1024 * 1024)
+    items = []
+    for filename, data in uploads:
+        if (filename or "").lower().endswith(".zip") or zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for entry in archive.infolist():
+                    name = entry.filename
+                    if entry.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    if entry.file_size > max_image_bytes:
+                        items.append((name, None))
+                        continue
+                    items.append((name, archive.read(entry)))
+        else:
+            items.append((filename, data))
+
+        if len(items) > BATCH_MAX_ITEMS:
+            raise ValueError(f"Batch exceeds {BATCH_MAX_ITEMS} images")
+    return items
+
+
+async def stream_ndjson_batch(items, worker, concurrency=BATCH_CONCURRENCY):
+    """
+    Runs `worker(filename, data)` over items with at most `concurrency` in flight and
+    yields one NDJSON line per item as soon as it finishes, then a summary line.
+    A failing item yields an error line; it never aborts the rest of the batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    async def run(index, filename, data):
+        async with semaphore:
+            item_start = time.perf_counter()
+            line = {"type": "item", "index": index, "filename": filename}
+            try:
+                if data is None:
+                    raise ValueError(f"Image exceeds {BATCH_MAX_IMAGE_MB:g} MB")
+                line.update(await worker(filename, data))
+                line["status"] = "ok"
+            except Exception as e:
+                line["status"] = "error"
+                line["error"] = str(e)
+            line["elapsed_ms"] = round((time.perf_counter() - item_start) * 1000, 1)
+            return line
+
+    tasks = [asyncio.create_task(run(i, filename, data)) for i, (filename, data) in enumerate(items)]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            succeeded += line["status"] == "ok"
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        # Client went away: stop paying for the remaining items
+        for task in tasks:
+            task.cancel()
+
+    yield json.dumps({
+        "type": "summary",
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }) + "\n"
@@ -1,23 +1,21 @@
 import json
-import google.generativeai as genai
-import time
 
-def generate_assets(audit_result, manifesto_text):
-    """
-    Generates a theme.json and a step-by-step action list based on the audit.
-    """
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
+from utils.llm_client import generate_content
+from utils.prompt_cache import PromptPrefix
+from utils.single_flight import coalesce, input_digest
+from utils.metrics import observe_stage, timed_stage
+from utils.prompt_budget import PromptBuilder, audit_result_renderings, assets_renderings, count_tokens
+from utils.manifesto_index import rule_renderings
 
-    prompt = f"""
-    Sen "İnşaatçı" (The Builder), bir Power BI Uygulama Uzmanısın.
-    Aşağıdaki Denetim Raporu ve Manifesto'ya dayanarak, dashboard'u düzeltmek için gerekli varlıkları oluştur.
+BUILDER_SYSTEM_INSTRUCTION = """Sen "İnşaatçı" (The Builder), bir Power BI Uygulama Uzmanısın.
+Aşağıdaki Denetim Raporu ve Manifesto'ya dayanarak, dashboard'u düzeltmek için gerekli varlıkları oluştur."""
 
+def builder_prefix(manifesto_text):
+    """Static head of the asset prompt; cached per manifesto version like the auditor's."""
+    return PromptPrefix("builder", BUILDER_SYSTEM_INSTRUCTION, f"""
     MANIFESTO:
     {manifesto_text}
 
-    DENETİM RAPORU:
-    {json.dumps(audit_result)}
-
     GÖREV:
     1. Manifesto'daki Renk ve Tipografi kurallarını uygulayan geçerli bir Power BI `theme.json` dosyası içeriği oluştur.
     2. Kullanıcının Power BI Desktop'ta uygulaması için adım adım bir Aksiyon Listesi oluştur.
@@ -44,46 +42,68 @@ def generate_assets(audit_result, manifesto_text):
             ...
         ]
     }}
+    """)
+
+@coalesce(lambda audit_result, manifesto_text: input_digest(audit_result, manifesto_text))
+@timed_stage("generate_assets")
+async def generate_assets(audit_result, manifesto_text):
     """
+    Generates a theme.json and a step-by-step action list based on the audit.
+    """
+    prefix = builder_prefix(manifesto_text)
+    report_blocks = [f"""
+    DENETİM RAPORU:
+    {rendering}
+    """ for rendering in audit_result_renderings(audit_result)]
 
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(
-                prompt,
-                generation_config={"response_mime_type": "application/json"}
-            )
+    builder = PromptBuilder("assets")
+    builder.add_fixed("prefix", count_tokens(prefix.system_instruction + prefix.text))
+    builder.add("audit_result", report_blocks[0], priority=1, fallbacks=report_blocks[1:])
+    prompt = builder.build()
+
+    try:
+        response = await generate_content(
+            prompt,
+            generation_config={"response_mime_type": "application/json"},
+            prefix=prefix
+        )
+        with observe_stage("json_parse"):
             return json.loads(response.text)
-        except Exception as e:
-            if "429" in str(e) or "Quota" in str(e):
-                wait_time = (2 ** attempt) * 5
-                print(f"Quota exceeded. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"Error generating assets: {e}")
-                return None
-    print("Quota exceeded. Please try again later.")
-    return None
+    except Exception as e:
+        print(f"Error generating assets: {e}")
+        return None
 
-def revise_assets(current_assets, user_feedback, manifesto_text):
+async def revise_assets(current_assets, user_feedback, manifesto_text):
     """
     Updates the theme.json and action_list based on user feedback.
+    Over budget, current_assets are sent with shorter action text and then without
+    theme_json.visualStyles; if the revised theme comes back without them, the
+    original visualStyles are kept.
     """
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
-    
-    prompt = f"""
+    assets_blocks = [f"""
+    MEVCUT VARLIKLAR:
+    {rendering}
+    """ for rendering in assets_renderings(current_assets)]
+
+    builder = PromptBuilder("revise")
+    builder.add("instructions", """
     Sen "İnşaatçı"sın (The Builder).
     Kullanıcı mevcut uygulama planını revize etmek istiyor.
-    
-    MEVCUT VARLIKLAR:
-    {json.dumps(current_assets)}
-    
+    """)
+    builder.add("current_assets", assets_blocks[0], priority=1, fallbacks=assets_blocks[1:])
+    builder.add("user_feedback", f"""
     KULLANICI GERİ BİLDİRİMİ:
     "{user_feedback}"
-    
-    MANIFESTO:
-    {manifesto_text[:1000]}...
-    
+    """)
+    # Only the manifesto rules relevant to the feedback and the planned actions
+    actions = [step for step in current_assets.get("action_list", []) if isinstance(step, dict)]
+    query = " ".join([user_feedback] + [f"{step.get('action', '')} {step.get('reason', '')}" for step in actions])
+    rule_blocks = [f"""
+    MANIFESTO (İlgili Kurallar):
+    {rules}
+    """ for rules in rule_renderings(manifesto_text, query)]
+    builder.add("manifesto", rule_blocks[0], priority=2, fallbacks=rule_blocks[1:])
+    builder.add("task", """
     GÖREV:
     `theme_json` ve `action_list` içeriğini kullanıcının geri bildirimine göre güncelle, ancak Manifesto'ya sadık kal.
     ÇIKTI DİLİ: TÜRKÇE.
@@ -95,27 +115,26 @@ def revise_assets(current_assets, user_feedback, manifesto_text):
     - Her aksiyon, dashboard içindeki görsel, renk, tipografi, isimlendirme gibi spesifik değişiklikleri içermeli.
     
     ÇIKTI FORMATI (SADECE JSON):
-    {{
-        "theme_json": {{ ... güncellenmiş json ... }},
+    {
+        "theme_json": { ... güncellenmiş json ... },
         "action_list": [ ... güncellenmiş liste ... ]
-    }}
-    """
+    }
+    """)
+    prompt = builder.build()
     
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(
-                prompt,
-                generation_config={"response_mime_type": "application/json"}
-            )
-            return json.loads(response.text)
-        except Exception as e:
-            if "429" in str(e) or "Quota" in str(e):
-                wait_time = (2 ** attempt) * 5
-                print(f"Quota exceeded. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"Revision failed: {e}")
-                return None
-    print("Quota exceeded. Please try again later.")
-    return None
+    try:
+        response = await generate_content(
+            prompt,
+            generation_config={"response_mime_type": "application/json"}
+        )
+        with observe_stage("json_parse"):
+            revised = json.loads(response.text)
+        original_theme = current_assets.get("theme_json")
+        revised_theme = revised.get("theme_json") if isinstance(revised, dict) else None
+        if (builder.level("current_assets") == 2 and isinstance(original_theme, dict)
+                and isinstance(revised_theme, dict) and "visualStyles" not in revised_theme):
+            revised_theme["visualStyles"] = original_theme["visualStyles"]
+        return revised
+    except Exception as e:
+        print(f"Revision failed: {e}")
+        return None
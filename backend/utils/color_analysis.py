@@ -0,0 +1,254 @@
+import os
+import numpy as np
+
+from utils.local_rules import page_pixels, rule_sections
+
+# Palette, contrast and background checks run locally and are taken out of the vision prompt
+LOCAL_COLOR_ANALYSIS = os.getenv("LOCAL_COLOR_ANALYSIS", "on") == "on"
+
+# Analysis resolution: large enough that 9-11pt labels keep their strokes
+COLOR_ANALYSIS_MAX_EDGE = int(os.getenv("COLOR_ANALYSIS_MAX_EDGE", "1280"))
+
+# A colour counts towards the palette if it covers at least this share of the page
+PALETTE_MIN_SHARE = float(os.getenv("PALETTE_MIN_SHARE", "0.005"))
+PALETTE_MAX_COLORS = 3
+# Colours closer than this (RGB distance) are one palette entry; below this chroma a colour is a neutral grey
+PALETTE_MERGE_DISTANCE = 48
+NEUTRAL_MAX_CHROMA = 24
+
+# WCAG 2.x AA: 4.5:1 for body text, 3:1 for large text
+CONTRAST_MIN_RATIO = 4.5
+CONTRAST_LARGE_MIN_RATIO = 3.0
+CONTRAST_BLOCK = 16
+# Marks fainter than this against their background are decoration (borders, gridlines, shading), not text
+CONTRAST_INK_RATIO = 1.5
+CONTRAST_MIN_BLOCKS = 2
+CONTRAST_MAX_VIOLATIONS = 3
+
+# A page whose most common colour covers less than this share, spread over many colours, has an image background
+BACKGROUND_MIN_SHARE = 0.15
+BACKGROUND_MAX_COLORS = 150
+
+# Manifesto rules (by name) fully checked here, and rules only partly checked here
+COLOR_RULES = {"palette": "3-Color Rule", "contrast": "Contrast"}
+PARTIAL_COLOR_RULES = {"background": "Data-Ink Ratio"}
+
+
+_SRGB = np.arange(256, dtype=np.float32) / 255.0
+_LINEAR = np.where(_SRGB <= 0.04045, _SRGB / 12.92, ((_SRGB + 0.055) / 1.055) ** 2.4).astype(np.float32)
+_LUMINANCE_TABLES = [_LINEAR * weight for weight in (0.2126, 0.7152, 0.0722)]
+
+
+def relative_luminance(rgb):
+    """WCAG relative luminance of uint8 sRGB values (any array shape ending in 3)."""
+    red, green, blue = _LUMINANCE_TABLES
+    # np.take and in-place sums: a third faster than fancy indexing on a full page
+    lum = np.take(red, rgb[..., 0])
+    lum += np.take(green, rgb[..., 1])
+    lum += np.take(blue, rgb[..., 2])
+    return lum
+
+
+def contrast_ratio(l1, l2):
+    """WCAG contrast ratio between two relative luminances (arrays broadcast)."""
+    return (np.maximum(l1, l2) + 0.05) / (np.minimum(l1, l2) + 0.05)
+
+
+def _hex(rgb):
+    return "#{:02X}{:02X}{:02X}".format(*(int(round(c)) for c in rgb))
+
+
+def extract_palette(pixels, min_share=PALETTE_MIN_SHARE):
+    """
+    Dominant colours of an RGB array: pixels are binned at 4 bits per channel, bins
+    covering at least min_share are averaged and merged when closer than
+    PALETTE_MERGE_DISTANCE. Returns [{"hex", "share", "neutral"}], largest first.
+    """
+    flat = pixels.reshape(-1, 3)
+    bins = ((flat[:, 0] >> 4).astype(np.int32) << 8) | ((flat[:, 1] >> 4).astype(np.int32) << 4) | (flat[:, 2] >> 4)
+    counts = np.bincount(bins, minlength=4096)
+    sums = np.stack([np.bincount(bins, weights=flat[:, c], minlength=4096) for c in range(3)], axis=1)
+    total = flat.shape[0]
+
+    clusters = []
+    for b in np.argsort(-counts, kind="stable"):
+        if counts[b] < min_share * total:
+            break
+        colour = sums[b] / counts[b]
+        for cluster in clusters:
+            if np.linalg.norm(cluster["sum"] / cluster["count"] - colour) < PALETTE_MERGE_DISTANCE:
+                cluster["sum"] += sums[b]
+                cluster["count"] += counts[b]
+                break
+        else:
+            clusters.append({"sum": sums[b].copy(), "count": int(counts[b])})
+
+    palette = []
+    for cluster in clusters:
+        colour = cluster["sum"] / cluster["count"]
+        palette.append({
+            "hex": _hex(colour),
+            "share": round(float(cluster["count"]) / total, 4),
+            "neutral": bool(colour.max() - colour.min() < NEUTRAL_MAX_CHROMA)
+        })
+    palette.sort(key=lambda entry: -entry["share"])
+    return palette, counts / total
+
+
+def _components(mask):
+    """4-connected components of a small boolean grid, as lists of (row, col)."""
+    seen = np.zeros_like(mask, dtype=bool)
+    components = []
+    for start in zip(*np.nonzero(mask)):
+        if seen[start]:
+            continue
+        stack, cells = [start], []
+        seen[start] = True
+        while stack:
+            r, c = stack.pop()
+            cells.append((r, c))
+            for nr, nc in ((r + 1, c), (r - 1, c), (r, c + 1), (r, c - 1)):
+                if 0 <= nr < mask.shape[0] and 0 <= nc < mask.shape[1] and mask[nr, nc] and not seen[nr, nc]:
+                    seen[nr, nc] = True
+                    stack.append((nr, nc))
+        components.append(cells)
+    return components
+
+
+def _long_runs(mask, length, axis):
+    """Pixels of a 2-D boolean mask lying on a run of at least `length` set pixels along `axis`."""
+    runs = np.moveaxis(mask, axis, -1)
+    # Erode by doubling shifts: starts[i] is set when runs[i:i + span] all are
+    starts = runs.copy()
+    span = 1
+    while span < length:
+        step = min(span, length - span)
+        starts[..., :-step] &= starts[..., step:]
+        starts[..., -step:] = False
+        span += step
+    # Dilate back: covered[i] is set when a run starts within the `length` positions ending at i
+    covered = starts
+    span = 1
+    while span < length:
+        step = min(span, length - span)
+        covered[..., step:] |= covered[..., :-step].copy()
+        span += step
+    return np.moveaxis(covered, -1, axis)
+
+
+def low_contrast_regions(pixels, block=CONTRAST_BLOCK):
+    """
+    Finds text-like blocks whose text/background contrast is below CONTRAST_MIN_RATIO.
+    Per block, the background is the median luminance and "ink" the pixels at least
+    CONTRAST_INK_RATIO away from it. Ink on straight runs at least a block long (grid,
+    axis and border lines) is cleared first. A block is text-like when the remaining ink
+    covers 4-45% of it and forms thin strokes in both directions (many transitions per
+    ink pixel horizontally and vertically), which excludes bars and areas. The
+    contrast of a text block is that of its lightest and darkest pixels (lines
+    excluded), taking the highest among neighbouring text blocks: anti-aliased glyphs
+    have few pixels at full text colour and a block may only catch a glyph's edge. Returns [{"bbox", "ratio", "blocks"}] per connected region, worst first.
+    """
+    height, width = pixels.shape[:2]
+    rows, cols = height // block, width // block
+    if not rows or not cols:
+        return []
+    # Each block's pixels are made contiguous once, so the per-block reductions below walk adjacent memory
+    tiles = pixels[:rows * block, :cols * block].reshape(rows, block, cols, block, 3).transpose(0, 2, 1, 3, 4)
+    blocks = relative_luminance(np.ascontiguousarray(tiles))
+
+    background = np.median(blocks.reshape(rows, cols, -1), axis=-1)[:, :, None, None]
+    ratios = contrast_ratio(blocks, background)
+    ink = ratios >= CONTRAST_INK_RATIO
+    page_ink = ink.transpose(0, 2, 1, 3).reshape(rows * block, cols * block)
+    lines = _long_runs(page_ink, block, 1) | _long_runs(page_ink, block, 0)
+    lines = np.ascontiguousarray(lines.reshape(rows, block, cols, block).transpose(0, 2, 1, 3))
+    ink &= ~lines
+    ink_count = ink.sum(axis=(-1, -2))
+    ink_share = ink_count / (block * block)
+    horizontal = (ink[:, :, :, 1:] != ink[:, :, :, :-1]).sum(axis=(-1, -2))
+    vertical = (ink[:, :, 1:, :] != ink[:, :, :-1, :]).sum(axis=(-1, -2))
+    safe_count = np.maximum(ink_count, 1)
+    text_like = (ink_share >= 0.04) & (ink_share <= 0.45) & (horizontal / safe_count >= 0.2) & (vertical / safe_count >= 0.2)
+
+    text_pixels = np.where(lines, background, blocks)
+    extremes = contrast_ratio(text_pixels.max(axis=(-1, -2)), text_pixels.min(axis=(-1, -2)))
+    # A block may only catch the anti-aliased edge of a glyph; the text it belongs to spans its neighbours
+    padded = np.pad(np.where(text_like, extremes, 0), 1)
+    neighbourhood = np.max([padded[1 + dr:rows + 1 + dr, 1 + dc:cols + 1 + dc] for dr in (-1, 0, 1) for dc in (-1, 0, 1)], axis=0)
+    block_ratio = np.where(text_like, neighbourhood, np.inf)
+    low = text_like & (block_ratio < CONTRAST_MIN_RATIO)
+
+    regions = []
+    for cells in _components(low):
+        if len(cells) < CONTRAST_MIN_BLOCKS:
+            continue
+        rs = [r for r, _ in cells]
+        cs = [c for _, c in cells]
+        regions.append({
+            "bbox": [round(float(v), 4) for v in (min(cs) * block / width, min(rs) * block / height,
+                                                  (max(cs) + 1) * block / width, (max(rs) + 1) * block / height)],
+            "ratio": round(float(np.median([block_ratio[cell] for cell in cells])), 2),
+            "blocks": len(cells)
+        })
+    regions.sort(key=lambda region: (region["ratio"], -region["blocks"]))
+    return regions
+
+
+def analyze_colors(image, manifesto_text):
+    """
+    Deterministic local checks for the manifesto's mechanical colour rules: palette size
+    (3-Color Rule), WCAG text contrast (Contrast) and image backgrounds (the background
+    part of Data-Ink Ratio) on a page decoded with open_page. Checks whose rule is not
+    in the manifesto are skipped. Returns {"palette", "violations", "checked_rules"};
+    violations follow the audit schema, name their "rule" and carry "source": "local".
+    """
+    sections = rule_sections(manifesto_text, {**COLOR_RULES, **PARTIAL_COLOR_RULES})
+    pixels = page_pixels(image, COLOR_ANALYSIS_MAX_EDGE)
+
+    # Shares are statistics over the page: every second pixel each way is plenty
+    palette, bin_shares = extract_palette(pixels[::2, ::2])
+    violations = []
+
+    if "palette" in sections:
+        colours = [entry for entry in palette if not entry["neutral"]]
+        if len(colours) > PALETTE_MAX_COLORS:
+            violations.append({
+                "rule_section": sections["palette"],
+                "rule": COLOR_RULES["palette"],
+                "issue": f"Sayfada {len(colours)} baskın renk kullanılmış ({', '.join(e['hex'] for e in colours)}); "
+                         f"en fazla {PALETTE_MAX_COLORS} ana renk ve nötr griler olmalı.",
+                "recommendation": f"Renkleri {PALETTE_MAX_COLORS} ana renge indirin; kategorileri aynı rengin tonlarıyla veya gri ile ayırın.",
+                "severity": "High" if len(colours) > PALETTE_MAX_COLORS + 2 else "Medium",
+                "source": "local"
+            })
+
+    if "contrast" in sections:
+        for region in low_contrast_regions(pixels)[:CONTRAST_MAX_VIOLATIONS]:
+            violations.append({
+                "rule_section": sections["contrast"],
+                "rule": COLOR_RULES["contrast"],
+                "issue": f"Metin ile arka plan kontrastı düşük (ölçülen ~{region['ratio']}:1, WCAG AA en az {CONTRAST_MIN_RATIO}:1).",
+                "recommendation": "Metin rengini koyulaştırın veya arka planı açın; en az 4.5:1 kontrast sağlayın.",
+                "severity": "High" if region["ratio"] < CONTRAST_LARGE_MIN_RATIO else "Medium",
+                "bbox": region["bbox"],
+                "source": "local"
+            })
+
+    if "background" in sections:
+        top_share = float(bin_shares.max())
+        busy_colours = int((bin_shares >= 0.0001).sum())
+        if top_share < BACKGROUND_MIN_SHARE and busy_colours > BACKGROUND_MAX_COLORS:
+            violations.append({
+                "rule_section": sections["background"],
+                "rule": PARTIAL_COLOR_RULES["background"],
+                "issue": "Arka planda fotoğraf veya desenli bir görsel kullanılmış; veriden dikkati dağıtıyor.",
+                "recommendation": "Arka plan görselini kaldırın; düz, nötr bir arka plan rengi kullanın.",
+                "severity": "Medium",
+                "source": "local"
+            })
+
+    return {
+        "palette": palette,
+        "violations": violations,
+        "checked_rules": sorted({**COLOR_RULES, **PARTIAL_COLOR_RULES}[check] for check in sections)
+    }
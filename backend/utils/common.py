@@ -2,13 +2,22 @@ import os
 import google.generativeai as genai
 import re
 import json
+import tempfile
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# manifesto.md lives in the backend root
+MANIFESTO_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "manifesto.md")
 
 def load_manifesto():
     """Reads the manifesto.md file from the backend directory."""
     try:
-        # Assuming manifesto.md is in the backend root
-        manifesto_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "manifesto.md")
-        with open(manifesto_path, "r", encoding="utf-8") as f:
+        with open(MANIFESTO_PATH, "r", encoding="utf-8") as f:
             return f.read()
     except FileNotFoundError:
         print("manifesto.md not found.")
@@ -72,7 +81,7 @@ def parse_manifesto_to_rules(manifesto_text: str) -> list:
 def save_manifesto_from_rules(rules: list) -> str:
     """Converts structured rules back to manifesto.md format."""
     lines = ["# Power BI UI/UX & Data Visualization Manifesto", ""]
-    lines.append("This document serves as the absolute source of truth for auditing Power BI dashboards. Any deviation from these rules leads to a penalty score.", "")
+    lines.extend(["This document serves as the absolute source of truth for auditing Power BI dashboards. Any deviation from these rules leads to a penalty score.", ""])
     
     for section in sorted(rules, key=lambda x: x["id"]):
         lines.append(f"## {section['id']}. {section['title']}")
@@ -88,12 +97,54 @@ def save_manifesto_from_rules(rules: list) -> str:
     
     return "\n".join(lines)
 
+def write_file_atomic(path: str, text: str):
+    """
+    Replaces the file at `path` with `text`. The text goes to a temporary file in the
+    same directory, is fsynced and then renamed over `path`, so readers see either the
+    old or the new content, never a partial file. Raises on failure.
+    """
+    directory, name = os.path.split(path)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, prefix=f".{name}-", suffix=".tmp", delete=False) as f:
+        temp_path = f.name
+        try:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        except Exception:
+            f.close()
+            os.remove(temp_path)
+            raise
+    try:
+        if os.path.exists(path):
+            # Temporary files are created owner-only; keep the file's permissions
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        os.replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Exclusive lock on `path` shared by all processes (flock, or msvcrt.locking on Windows); waits until it is free."""
+    with open(path, "a+") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
 def save_manifesto(manifesto_text: str):
-    """Saves manifesto text to manifesto.md file."""
+    """Saves manifesto text to manifesto.md file (atomically, see write_file_atomic)."""
     try:
-        manifesto_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "manifesto.md")
-        with open(manifesto_path, "w", encoding="utf-8") as f:
-            f.write(manifesto_text)
+        write_file_atomic(MANIFESTO_PATH, manifesto_text)
         return True
     except Exception as e:
         print(f"Error saving manifesto: {e}")
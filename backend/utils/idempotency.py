@@ -0,0 +1,82 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1000"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class IdempotencyConflictError(Exception):
+    """Raised when an Idempotency-Key is reused with a different request body."""
+
+
+class IdempotencyStore:
+    """
+    Remembers the outcome of requests sent with an Idempotency-Key.
+    The first request runs; retries with the same key and body get its stored result,
+    or await it if it is still running. Only successful results are kept, so a retry
+    after a failure runs again. Entries expire after ttl_seconds and the oldest settled
+    ones are evicted beyond max_entries. Requests still running are never evicted, so a
+    retry always joins them; while more than max_entries are in flight the store runs
+    over its limit and shrinks back as they settle.
+    """
+
+    def __init__(self, max_entries=IDEMPOTENCY_MAX_ENTRIES, ttl_seconds=IDEMPOTENCY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    async def run(self, key, fingerprint, factory):
+        """
+        Returns (result, replayed). `fingerprint` identifies the request body; a different
+        one under an existing key raises IdempotencyConflictError.
+        """
+        self._prune()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry["fingerprint"] != fingerprint:
+                raise IdempotencyConflictError("Idempotency-Key was already used with a different request")
+            self._entries.move_to_end(key)
+            if entry["task"] is None:
+                return entry["result"], True
+            return await asyncio.shield(entry["task"]), True
+
+        task = asyncio.ensure_future(factory())
+        entry = {"fingerprint": fingerprint, "task": task, "result": None, "expires_at": None}
+        self._entries[key] = entry
+        task.add_done_callback(lambda _: self._settle(key, entry))
+        self._evict()
+        return await asyncio.shield(task), False
+
+    def stats(self):
+        in_flight = sum(1 for entry in self._entries.values() if entry["task"] is not None)
+        return {"entries": len(self._entries), "in_flight": in_flight}
+
+    def _settle(self, key, entry):
+        if self._entries.get(key) is not entry:
+            return  # no longer stored
+        task = entry["task"]
+        if task.cancelled() or task.exception() is not None:
+            del self._entries[key]
+            return
+        entry["result"] = task.result()
+        entry["task"] = None
+        entry["expires_at"] = time.time() + self.ttl_seconds
+        self._evict()
+
+    def _evict(self):
+        """Drops the least recently used settled entries beyond max_entries."""
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        settled = [key for key, entry in self._entries.items() if entry["task"] is None][:excess]
+        for key in settled:
+            del self._entries[key]
+
+    def _prune(self):
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if entry["expires_at"] is not None and entry["expires_at"] < now]
+        for key in expired:
+            del self._entries[key]
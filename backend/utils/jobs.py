@@ -0,0 +1,122 @@
+import os
+import time
+import uuid
+import asyncio
+from contextlib import contextmanager
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "50"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at JOB_QUEUE_MAX_DEPTH and cannot accept new work."""
+
+
+class Job:
+    """A unit of background work with status, per-stage timings and result."""
+
+    def __init__(self, kind, payload):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {}
+        self.result = None
+        self.error = None
+
+    @contextmanager
+    def stage(self, name):
+        """Records the wall-clock duration of a stage in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stages": self.stages,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue drained by a fixed pool of asyncio workers.
+    `handler(job)` does the work and returns the result; it may use `job.stage(...)`
+    to record timings. Finished jobs are kept for JOB_RETENTION_SECONDS for polling.
+    """
+
+    def __init__(self, handler, workers=JOB_WORKERS, max_depth=JOB_QUEUE_MAX_DEPTH, retention_seconds=JOB_RETENTION_SECONDS):
+        self.handler = handler
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self._queue = asyncio.Queue(maxsize=max_depth)
+        self._jobs = {}
+        self._tasks = []
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind, payload):
+        """Queues a job and returns it immediately; raises QueueFullError when at capacity."""
+        self._prune()
+        job = Job(kind, payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self._queue.maxsize} pending)")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            job.stages["queue_wait"] = round((job.started_at - job.created_at) * 1000, 1)
+            try:
+                job.result = await self.handler(job)
+                job.status = "succeeded"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "Cancelled"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                # Uploaded bytes are no longer needed once the job has run
+                job.payload = None
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
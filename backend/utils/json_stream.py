@@ -0,0 +1,117 @@
+import json
+
+
+class AuditStreamParser:
+    """
+    Incremental parser for the streamed audit JSON document.
+    Text is fed in arbitrary chunks; `feed` returns the events that became
+    syntactically complete: ("score", int), ("summary", str), one ("violation", dict)
+    per `violations[]` entry, and (key, value) for any other top-level field.
+    Each character is scanned once, so total work is linear in the response size.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.violations = []
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._element_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        events = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if depth == 1 and self._expect == "key_end":
+                        self._key = json.loads(buffer[self._key_start:i + 1])
+                        self._expect = "colon"
+                continue
+
+            if depth == 0:
+                # Skip anything before the top-level object (e.g. a ```json fence)
+                if char == "{":
+                    self._stack.append("{")
+                    self._expect = "key"
+                continue
+
+            if depth == 1:
+                if self._expect == "key" and char == '"':
+                    self._key_start = i
+                    self._expect = "key_end"
+                    self._in_string = True
+                    continue
+                if self._expect == "colon" and char == ":":
+                    self._expect = "value"
+                    self._value_start = None
+                    continue
+                if self._expect == "value":
+                    if char in ",}":
+                        events.extend(self._end_value(buffer[self._value_start:i]))
+                        self._expect = "key"
+                        if char == "}":
+                            self._stack.pop()
+                        continue
+                    if self._value_start is None and not char.isspace():
+                        self._value_start = i
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and depth == 2 and self._key == "violations":
+                    self._element_start = i
+                self._stack.append(char)
+            elif char in "}]":
+                self._stack.pop()
+                if char == "}" and depth == 3 and self._key == "violations" and self._element_start is not None:
+                    violation = json.loads(buffer[self._element_start:i + 1])
+                    self.violations.append(violation)
+                    events.append(("violation", violation))
+                    self._element_start = None
+
+        self._pos = len(buffer)
+        return events
+
+    def _end_value(self, raw):
+        if self._value_start is None:
+            return []
+        value = json.loads(raw)
+        self.fields[self._key] = value
+        # Violations were already emitted one by one as they completed
+        if self._key == "violations":
+            return []
+        return [(self._key, value)]
+
+    def result(self):
+        """
+        Returns (result, complete). If the document parsed fully, result is the whole
+        JSON object; otherwise it is assembled from the fields and violations that
+        completed before the stream was cut off.
+        """
+        text = self.buffer.strip()
+        if text.startswith("```"):
+            text = text.strip("`").removeprefix("json").strip()
+        try:
+            return json.loads(text), True
+        except (json.JSONDecodeError, ValueError):
+            pass
+
+        partial = {key: value for key, value in self.fields.items() if key != "violations"}
+        partial["violations"] = list(self.violations)
+        return partial, False
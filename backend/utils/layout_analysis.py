@@ -0,0 +1,192 @@
+import os
+import math
+import numpy as np
+
+from utils.local_rules import rule_sections
+
+# Grid alignment and spacing between visuals are measured locally and taken out of the vision prompt
+LOCAL_LAYOUT_ANALYSIS = os.getenv("LOCAL_LAYOUT_ANALYSIS", "on") == "on"
+
+# Analysis resolution: 1080p pages are measured at full size so 1 px offsets are visible;
+# larger pages are reduced by an integer factor, keeping any foreground pixel of a block
+LAYOUT_ANALYSIS_MAX_EDGE = int(os.getenv("LAYOUT_ANALYSIS_MAX_EDGE", "1920"))
+
+# Minimum padding between visuals, in screenshot pixels (Section 1: "at least 20px")
+LAYOUT_MIN_GAP = int(os.getenv("LAYOUT_MIN_GAP", "20"))
+
+# Grey levels closer than this to the page background count as background
+LAYOUT_BACKGROUND_TOLERANCE = 6
+# A container is at least this share of the page in each direction; smaller blocks are titles, text or chart parts
+LAYOUT_MIN_CONTAINER = 0.04
+# Container edges within this many pixels of each other are meant to line up; any spread between them is misalignment
+LAYOUT_ALIGN_TOLERANCE = 10
+LAYOUT_MAX_DEPTH = 12
+LAYOUT_MAX_VIOLATIONS = 3
+
+# Manifesto rules (by name) checked here
+LAYOUT_RULES = {"alignment": "Grid Alignment", "whitespace": "Whitespace (Breathing Room)"}
+
+
+def foreground_mask(image, max_edge=LAYOUT_ANALYSIS_MAX_EDGE):
+    """
+    Pixels differing from the page background, reduced by an integer factor so the long
+    side is at most max_edge. A reduced pixel is foreground if any pixel it covers is, so
+    1 px borders survive. Returns (mask, factor).
+    """
+    grey = np.asarray(image.convert("L"))
+    background = page_background(grey)
+    mask = (grey > background + LAYOUT_BACKGROUND_TOLERANCE) | (grey < background - LAYOUT_BACKGROUND_TOLERANCE)
+    factor = math.ceil(max(mask.shape) / max_edge)
+    if factor > 1:
+        rows, cols = mask.shape[0] // factor, mask.shape[1] // factor
+        mask = mask[:rows * factor, :cols * factor].reshape(rows, factor, cols, factor).any(axis=(1, 3))
+    return mask, factor
+
+
+def page_background(grey):
+    """Grey level of the page background: the most common value on the outer frame of the page."""
+    frame = np.concatenate([grey[0], grey[-1], grey[:, 0], grey[:, -1]])
+    return int(np.bincount(frame, minlength=256).argmax())
+
+
+def _segments(profile):
+    """(start, end) runs of True in a 1-D boolean profile."""
+    edges = np.diff(np.concatenate([[0], profile.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def find_containers(mask, min_width, min_height):
+    """
+    Recursive XY-cut over the foreground mask: a region is split along every background
+    row band (or, failing that, column band) that crosses it completely, using the
+    projection profiles of the mask. Regions with no such band left are leaves: a card
+    with its own fill, or a visual held together by a border or axis lines. Leaves of
+    at least min_width x min_height are returned as (left, top, right, bottom) boxes.
+    """
+    containers = []
+    stack = [((0, 0, mask.shape[1], mask.shape[0]), 0)]
+    while stack:
+        (left, top, right, bottom), depth = stack.pop()
+        region = mask[top:bottom, left:right]
+        rows = _segments(region.any(axis=1))
+        if not rows:
+            continue
+        cols = _segments(region[rows[0][0]:rows[-1][1]].any(axis=0))
+        if depth < LAYOUT_MAX_DEPTH and len(rows) > 1:
+            children = [(left, top + start, right, top + end) for start, end in rows]
+        elif depth < LAYOUT_MAX_DEPTH and len(cols) > 1:
+            children = [(left + start, top + rows[0][0], left + end, top + rows[-1][1]) for start, end in cols]
+        else:
+            box = (left + cols[0][0], top + rows[0][0], left + cols[-1][1], top + rows[-1][1])
+            if box[2] - box[0] >= min_width and box[3] - box[1] >= min_height:
+                containers.append(box)
+            continue
+        stack.extend((child, depth + 1) for child in children
+                     if child[2] - child[0] >= min_width and child[3] - child[1] >= min_height)
+    containers.sort(key=lambda box: (box[1], box[0]))
+    return containers
+
+
+def alignment_groups(containers, edge):
+    """
+    Groups containers whose `edge` coordinate (0 = left, 1 = top) lies within
+    LAYOUT_ALIGN_TOLERANCE of the group's first edge. Returns groups of two or more
+    whose edges are not identical, as (spread, [boxes]), largest spread first.
+    """
+    ordered = sorted(containers, key=lambda box: box[edge])
+    groups, current = [], []
+    for box in ordered:
+        if current and box[edge] - current[0][edge] > LAYOUT_ALIGN_TOLERANCE:
+            groups.append(current)
+            current = []
+        current.append(box)
+    groups.append(current)
+    misaligned = [(group[-1][edge] - group[0][edge], group) for group in groups if len(group) > 1]
+    return sorted([item for item in misaligned if item[0] > 0], key=lambda item: -item[0])
+
+
+def neighbour_gaps(containers):
+    """
+    Gap to the nearest container on the right (axis 0) and below (axis 1) for each
+    container, among those overlapping it on the other axis. Returns
+    (gap, axis, box, neighbour) tuples.
+    """
+    gaps = []
+    for box in containers:
+        for axis in (0, 1):
+            other = 1 - axis
+            candidates = [
+                (candidate[axis] - box[axis + 2], candidate) for candidate in containers
+                if candidate[axis] >= box[axis + 2]
+                and min(box[other + 2], candidate[other + 2]) > max(box[other], candidate[other])
+            ]
+            if candidates:
+                gap, neighbour = min(candidates, key=lambda item: item[0])
+                gaps.append((gap, axis, box, neighbour))
+    return gaps
+
+
+def _union(boxes, width, height):
+    """Page-fraction bbox covering all boxes."""
+    return [round(float(v), 4) for v in (
+        min(b[0] for b in boxes) / width, min(b[1] for b in boxes) / height,
+        max(b[2] for b in boxes) / width, max(b[3] for b in boxes) / height)]
+
+
+def analyze_layout(image, manifesto_text):
+    """
+    Deterministic local checks for Section 1: grid alignment of the visual containers'
+    left and top edges, and the padding between neighbouring containers, on a page
+    decoded with open_page. Distances are reported in screenshot pixels. Returns
+    {"layout", "violations", "checked_rules"}; violations follow the audit schema, name
+    their "rule" and carry "source": "local".
+    """
+    sections = rule_sections(manifesto_text, LAYOUT_RULES)
+    mask, scale = foreground_mask(image)
+    height, width = mask.shape
+    containers = find_containers(mask, max(8, int(width * LAYOUT_MIN_CONTAINER)), max(8, int(height * LAYOUT_MIN_CONTAINER)))
+    misaligned = sorted(((spread, edge, group) for edge in (0, 1)
+                         for spread, group in alignment_groups(containers, edge)), key=lambda item: -item[0])
+    gaps = neighbour_gaps(containers)
+    violations = []
+
+    if "alignment" in sections:
+        for spread, edge, group in misaligned[:LAYOUT_MAX_VIOLATIONS]:
+            pixels = max(1, round(spread * scale))
+            side, axis = ("sol", "x") if edge == 0 else ("üst", "y")
+            violations.append({
+                "rule_section": sections["alignment"],
+                "rule": LAYOUT_RULES["alignment"],
+                "issue": f"{axis}≈{round(group[0][edge] * scale)} px hizasındaki {len(group)} görselin {side} kenarları aynı hizada değil ({pixels} px kayma).",
+                "recommendation": f"Görsellerin {side} kenarlarını aynı {axis.upper()} değerine getirin (Biçim > Genel > Özellikler > Konum).",
+                "severity": "Medium" if pixels > 2 else "Low",
+                "bbox": _union(group, width, height),
+                "source": "local"
+            })
+
+    if "whitespace" in sections:
+        min_gap = LAYOUT_MIN_GAP / scale
+        tight = sorted((item for item in gaps if item[0] < min_gap), key=lambda item: item[0])
+        for gap, axis, box, neighbour in tight[:LAYOUT_MAX_VIOLATIONS]:
+            pixels = round(gap * scale)
+            where = f"x≈{round(box[2] * scale)} px, y≈{round(box[1] * scale)} px" if axis == 0 else f"x≈{round(box[0] * scale)} px, y≈{round(box[3] * scale)} px"
+            arrangement = "Yan yana" if axis == 0 else "Alt alta"
+            violations.append({
+                "rule_section": sections["whitespace"],
+                "rule": LAYOUT_RULES["whitespace"],
+                "issue": f"{arrangement} iki görsel arasındaki boşluk {pixels} px ({where}); en az {LAYOUT_MIN_GAP} px olmalı.",
+                "recommendation": f"Görselleri aralarında en az {LAYOUT_MIN_GAP} px boşluk kalacak şekilde yeniden konumlandırın veya boyutlandırın.",
+                "severity": "High" if pixels < LAYOUT_MIN_GAP / 2 else "Medium",
+                "bbox": _union([box, neighbour], width, height),
+                "source": "local"
+            })
+
+    return {
+        "layout": {
+            "containers": [_union([box], width, height) for box in containers],
+            "min_gap_px": round(min(item[0] for item in gaps) * scale) if gaps else None,
+            "max_misalignment_px": round(misaligned[0][0] * scale) if misaligned else 0
+        },
+        "violations": violations,
+        "checked_rules": sorted(LAYOUT_RULES[check] for check in sections)
+    }
@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.llm_providers import PROVIDER
+from utils.metrics import LLM_REQUEST_SECONDS, LLM_RETRIES, observe_stage, record_usage_metadata
+from utils.prompt_cache import PromptCacheManager
+from utils.rate_limiter import RateLimitScheduler
+
+DEFAULT_MODEL = "models/gemini-2.5-flash"
+
+# The google-generativeai SDK is blocking, so every call runs on this bounded pool
+# instead of the event loop. Sized by env so deployments can match their quota.
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "16"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+# Flat per-image prompt cost used when reserving token budget
+IMAGE_TOKEN_ESTIMATE = int(os.getenv("IMAGE_TOKEN_ESTIMATE", "258"))
+
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="gemini")
+
+
+class QuotaExceededError(Exception):
+    """Raised when a call still hits the quota after all retries."""
+
+
+def is_quota_error(error) -> bool:
+    """Returns True if the SDK error is a 429 / quota error."""
+    return "429" in str(error) or "Quota" in str(error)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking callable on the LLM executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+# Provider-side caches for static prompt prefixes (manifesto + instructions)
+PROMPT_CACHE = PromptCacheManager(run_blocking)
+
+# One scheduler for every Gemini call in the process: RPM/TPM budget, AIMD concurrency, backoff
+LLM_SCHEDULER = RateLimitScheduler(is_quota_error)
+
+
+def estimate_tokens(contents, prefix=None):
+    """Rough prompt size used to reserve TPM budget: ~4 characters per token plus a flat cost per image."""
+    parts = contents if isinstance(contents, list) else [contents]
+    chars = sum(len(part) for part in parts if isinstance(part, str))
+    images = sum(1 for part in parts if isinstance(part, dict))
+    if prefix is not None:
+        chars += len(prefix.system_instruction) + len(prefix.text)
+    return chars // 4 + images * IMAGE_TOKEN_ESTIMATE
+
+
+def _usage_tokens(response):
+    try:
+        return response.usage_metadata.total_token_count
+    except AttributeError:
+        return None
+
+
+def _outcome(error):
+    return "quota" if is_quota_error(error) else "error"
+
+
+async def generate_content(contents, generation_config=None, model_name=DEFAULT_MODEL, max_retries=LLM_MAX_RETRIES, prefix=None):
+    """
+    Async wrapper around `GenerativeModel.generate_content`.
+    Every attempt goes through LLM_SCHEDULER (shared RPM/TPM budget and adaptive
+    concurrency); quota errors are retried after the scheduler's jittered backoff
+    using `asyncio.sleep`, so waiting requests never block other endpoints or the `/ws/live` relay.
+    If `prefix` (a PromptPrefix) is given, its static head is served from the
+    prompt cache and `contents` only carries the per-request parts.
+    """
+    estimated_tokens = estimate_tokens(contents, prefix)
+    if prefix is not None:
+        model, contents = await PROMPT_CACHE.bind(model_name, prefix, contents)
+    else:
+        model = PROVIDER.model(model_name)
+
+    with observe_stage("llm_call"):
+        for attempt in range(max_retries):
+            try:
+                async with LLM_SCHEDULER.slot(estimated_tokens) as record_usage:
+                    start = time.perf_counter()
+                    try:
+                        response = await run_blocking(
+                            model.generate_content,
+                            contents,
+                            generation_config=generation_config
+                        )
+                    except Exception as e:
+                        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model=model_name, outcome=_outcome(e))
+                        raise
+                    LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model=model_name, outcome="ok")
+                    record_usage(_usage_tokens(response))
+                    record_usage_metadata(model_name, getattr(response, "usage_metadata", None))
+                    return response
+            except Exception as e:
+                if not is_quota_error(e):
+                    if prefix is not None:
+                        # The cached handle may have expired provider-side; recreate it next time
+                        PROMPT_CACHE.discard(model_name, prefix)
+                    raise
+                if attempt == max_retries - 1:
+                    LLM_SCHEDULER.drop()
+                    raise QuotaExceededError("Quota exceeded. Please try again later.") from e
+                LLM_RETRIES.inc(model=model_name)
+                wait_time = LLM_SCHEDULER.backoff(attempt, e)
+                print(f"Quota exceeded. Retrying in {wait_time:.1f}s...")
+                await asyncio.sleep(wait_time)
+
+
+async def stream_content(contents, generation_config=None, model_name=DEFAULT_MODEL, max_retries=LLM_MAX_RETRIES, prefix=None):
+    """
+    Async generator over the text chunks of a streamed generation.
+    The SDK's blocking stream is drained on the LLM executor and handed to the
+    event loop chunk by chunk, holding one LLM_SCHEDULER slot for the whole stream.
+    Quota errors are retried only if nothing has been yielded yet; once output has
+    started, errors propagate to the caller.
+    """
+    estimated_tokens = estimate_tokens(contents, prefix)
+    if prefix is not None:
+        model, contents = await PROMPT_CACHE.bind(model_name, prefix, contents)
+    else:
+        model = PROVIDER.model(model_name)
+
+    loop = asyncio.get_running_loop()
+    end_of_stream = object()
+
+    for attempt in range(max_retries):
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        last_usage = {"metadata": None}
+
+        def produce():
+            def put(item):
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+                except RuntimeError:
+                    stop.set()  # event loop is gone
+            try:
+                for chunk in model.generate_content(contents, generation_config=generation_config, stream=True):
+                    if stop.is_set():
+                        return
+                    # Usage arrives with the final chunks; keep the latest one
+                    last_usage["metadata"] = getattr(chunk, "usage_metadata", None) or last_usage["metadata"]
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue  # chunk without text parts (e.g. final usage metadata)
+                    put(text)
+                put(end_of_stream)
+            except Exception as e:
+                put(e)
+
+        started = False
+        try:
+            async with LLM_SCHEDULER.slot(estimated_tokens) as record_usage:
+                start = time.perf_counter()
+                loop.run_in_executor(_executor, produce)
+                try:
+                    while True:
+                        item = await queue.get()
+                        if item is end_of_stream:
+                            break
+                        if isinstance(item, Exception):
+                            raise item
+                        started = True
+                        yield item
+                except Exception as e:
+                    LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model=model_name, outcome=_outcome(e))
+                    raise
+                # Measured to the last chunk, so this includes time the consumer spent between chunks
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model=model_name, outcome="ok")
+                record_usage(getattr(last_usage["metadata"], "total_token_count", None))
+                record_usage_metadata(model_name, last_usage["metadata"])
+                return
+        except Exception as e:
+            if started or not is_quota_error(e):
+                if prefix is not None and not is_quota_error(e):
+                    PROMPT_CACHE.discard(model_name, prefix)
+                raise
+            if attempt == max_retries - 1:
+                LLM_SCHEDULER.drop()
+                raise QuotaExceededError("Quota exceeded. Please try again later.") from e
+            LLM_RETRIES.inc(model=model_name)
+            wait_time = LLM_SCHEDULER.backoff(attempt, e)
+            print(f"Quota exceeded. Retrying in {wait_time:.1f}s...")
+            await asyncio.sleep(wait_time)
+        finally:
+            stop.set()
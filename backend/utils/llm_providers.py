@@ -0,0 +1,288 @@
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import threading
+import google.generativeai as genai
+
+from utils.gemini_live import GeminiLiveSession
+
+# "gemini" talks to the real API; "fake" answers locally for offline runs and load tests
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+
+# Fake provider settings (all ignored by the Gemini provider)
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:0.8,0.35")
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_RETRY_AFTER = float(os.getenv("FAKE_LLM_RETRY_AFTER", "1"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+FAKE_LLM_STREAM_CHUNK = int(os.getenv("FAKE_LLM_STREAM_CHUNK", "24"))
+FAKE_LLM_FIXTURES_DIR = os.getenv("FAKE_LLM_FIXTURES_DIR", "")
+# Spoken reply per /ws/live turn: 24 kHz 16-bit mono PCM, sent in 200 ms chunks
+FAKE_LIVE_REPLY_SECONDS = float(os.getenv("FAKE_LIVE_REPLY_SECONDS", "1"))
+FAKE_LIVE_CHUNK_BYTES = 9600
+
+FAKE_RESPONSES = {
+    "audit": {
+        "score": 62,
+        "summary": "Sahte denetim: renk paleti ve hizalama sorunları var.",
+        "violations": [
+            {
+                "rule_section": "1. Layout & Grid Architecture",
+                "rule": "Grid Alignment",
+                "issue": "KPI kartları ortak ızgaraya hizalı değil",
+                "recommendation": "Kartları 8px ızgaraya hizalayın",
+                "severity": "Medium"
+            },
+            {
+                "rule_section": "4. Color Palette & Semantics",
+                "rule": "3-Color Rule",
+                "issue": "Çok fazla renk kullanılmış",
+                "recommendation": "Paleti 3 ana renge indirin",
+                "severity": "High"
+            }
+        ],
+        "positive_points": ["KPI'lar sol üstte konumlanmış"]
+    },
+    "rule_audit": {"violations": []},
+    "rule_analysis": {
+        "is_valid": False,
+        "reason": "Sahte sağlayıcı manifesto'yu değiştirmez.",
+        "section_id": 1,
+        "rule_name": "",
+        "rule_description": ""
+    },
+    "assets": {
+        "theme_json": {"name": "Sahte Tema", "dataColors": ["#1F4E79", "#F28E2B", "#59A14F"]},
+        "action_list": [
+            {"step": 1, "action": "KPI kartlarını 8px ızgaraya hizalayın.", "reason": "1. Layout & Grid Architecture ihlali: KPI kartları ortak ızgaraya hizalı değil"},
+            {"step": 2, "action": "Grafik renklerini tema paletine indirin.", "reason": "4. Color Palette & Semantics ihlali: Çok fazla renk kullanılmış"}
+        ]
+    },
+    "simulation": (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="1280" height="720" viewBox="0 0 1280 720">'
+        '<rect width="1280" height="720" fill="#F3F2F1"/>'
+        '<rect x="24" y="24" width="296" height="120" fill="#FFFFFF"/><rect x="344" y="24" width="296" height="120" fill="#FFFFFF"/>'
+        '<rect x="664" y="24" width="296" height="120" fill="#FFFFFF"/><rect x="984" y="24" width="272" height="120" fill="#FFFFFF"/>'
+        '<rect x="24" y="168" width="616" height="528" fill="#FFFFFF"/><rect x="664" y="168" width="592" height="528" fill="#FFFFFF"/>'
+        '<text x="40" y="60" font-family="Segoe UI" font-size="16" fill="#252423">Toplam Satış</text>'
+        '</svg>'
+    ),
+    "chat": "Sahte danışman yanıtı: önce en yüksek önem derecesindeki ihlalleri düzeltin, ardından renk paletini sadeleştirin."
+}
+
+
+def parse_latency(spec):
+    """
+    Parses a latency distribution spec into a sampler `f(rng) -> seconds`:
+    "constant:0.5", "uniform:0.2,1.0", "normal:0.8,0.2" or "lognormal:<median>,<sigma>".
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "constant":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class GeminiProvider:
+    """Real Gemini models through the google-generativeai SDK."""
+    name = "gemini"
+
+    def model(self, model_name, system_instruction=None):
+        if system_instruction:
+            return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        return genai.GenerativeModel(model_name)
+
+    def cached_model(self, handle):
+        return genai.GenerativeModel.from_cached_content(cached_content=handle)
+
+    def live_session(self, api_key, audit_context=None):
+        return GeminiLiveSession(api_key=api_key, audit_context=audit_context)
+
+
+class _FakeResponse:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class _FakeUsage:
+    """Mirrors the SDK's usage_metadata fields, at ~4 characters per token plus 258 per image."""
+
+    def __init__(self, parts, text):
+        prompt = sum(len(part) for part in parts if isinstance(part, str)) // 4
+        self.prompt_token_count = prompt + 258 * sum(1 for part in parts if isinstance(part, dict))
+        self.candidates_token_count = len(text) // 4
+        self.cached_content_token_count = 0
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class _FakeModel:
+    """Stand-in for GenerativeModel that answers from the provider's canned responses."""
+
+    def __init__(self, provider, model_name, system_instruction=None):
+        self.provider = provider
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ""
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        parts = contents if isinstance(contents, list) else [contents]
+        latency, fail = self.provider.draw()
+        text = self.provider.respond(self.system_instruction, parts)
+        usage = _FakeUsage([self.system_instruction] + parts, text)
+        if stream:
+            return self._stream(text, usage, latency, fail)
+        time.sleep(latency)
+        if fail:
+            raise self.provider.quota_error()
+        return _FakeResponse(text, usage)
+
+    def _stream(self, text, usage, latency, fail):
+        # Half the latency before the first chunk, the rest spread over the chunks
+        time.sleep(latency / 2)
+        if fail:
+            raise self.provider.quota_error()
+        size = self.provider.stream_chunk
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for i, chunk in enumerate(chunks):
+            time.sleep(latency / 2 / len(chunks))
+            # Like the SDK, the final chunk carries the usage for the whole response
+            yield _FakeResponse(chunk, usage if i == len(chunks) - 1 else None)
+
+
+class FakeLiveSession:
+    """
+    Offline stand-in for GeminiLiveSession. Incoming audio is only counted; each completed
+    turn is answered, after a latency drawn from the provider, with FAKE_LIVE_REPLY_SECONDS
+    of silent PCM audio in FAKE_LIVE_CHUNK_BYTES chunks.
+    """
+
+    def __init__(self, provider, audit_context=None):
+        self.provider = provider
+        self.audit_context = audit_context
+        self.ws = None
+        self.bytes_received = 0
+        self._queue = None
+        self._tasks = set()
+
+    async def connect(self):
+        self._queue = asyncio.Queue()
+        self.ws = True  # the relay only checks that a connection exists
+
+    async def send_audio_chunk(self, audio_bytes, turn_complete=False):
+        self.bytes_received += len(audio_bytes)
+        if turn_complete:
+            await self.send_turn_complete()
+
+    async def send_turn_complete(self):
+        latency, _ = self.provider.draw()
+        task = asyncio.create_task(self._reply(latency))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _reply(self, latency):
+        await asyncio.sleep(latency)
+        remaining = int(FAKE_LIVE_REPLY_SECONDS * 24000 * 2)
+        while remaining > 0:
+            size = min(FAKE_LIVE_CHUNK_BYTES, remaining)
+            await self._queue.put(bytes(size))
+            remaining -= size
+
+    async def receive_audio(self):
+        while True:
+            chunk = await self._queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self.ws = None
+        if self._queue is not None:
+            await self._queue.put(None)
+
+
+class FakeProvider:
+    """
+    Deterministic offline provider for tests and load benchmarks.
+    Latency is drawn from a seeded distribution (see parse_latency), a share of calls
+    fail with a 429 carrying a retry hint, streaming splits the answer into chunks, and
+    answers are canned per prompt kind (audit, assets, simulation SVG, chat, /auditor
+    rule checks). A fixtures directory can override any kind with <kind>.json/.svg/.txt.
+    """
+    name = "fake"
+
+    def __init__(self, latency=FAKE_LLM_LATENCY, error_rate=FAKE_LLM_ERROR_RATE, retry_after=FAKE_LLM_RETRY_AFTER,
+                 seed=FAKE_LLM_SEED, stream_chunk=FAKE_LLM_STREAM_CHUNK, fixtures_dir=FAKE_LLM_FIXTURES_DIR):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.stream_chunk = max(1, stream_chunk)
+        self.responses = dict(FAKE_RESPONSES)
+        if fixtures_dir:
+            self._load_fixtures(fixtures_dir)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def model(self, model_name, system_instruction=None):
+        return _FakeModel(self, model_name, system_instruction)
+
+    def cached_model(self, handle):
+        raise RuntimeError("The fake provider has no cached-content API; use PROMPT_CACHE_BACKEND=local")
+
+    def live_session(self, api_key, audit_context=None):
+        return FakeLiveSession(self, audit_context)
+
+    def draw(self):
+        """Next (latency, fail) pair; calls draw in arrival order, so a run is reproducible."""
+        with self._lock:
+            return self.sample_latency(self._rng), self._rng.random() < self.error_rate
+
+    def quota_error(self):
+        return Exception(f"429 Resource has been exhausted (e.g. check quota). Please retry in {self.retry_after}s.")
+
+    def respond(self, system_instruction, parts):
+        prompt = system_instruction + "".join(part for part in parts if isinstance(part, str))
+        has_image = any(isinstance(part, dict) for part in parts)
+        if "is_valid" in prompt:
+            kind = "rule_analysis"
+        elif "YALNIZCA aşağıdaki kurala" in prompt:
+            kind = "rule_audit"
+        elif "İnşaatçı" in prompt:
+            kind = "assets"
+        elif has_image or "Acımasız Eleştirmen" in prompt:
+            kind = "audit"
+        elif "SVG kodunu" in prompt:
+            kind = "simulation"
+        else:
+            kind = "chat"
+        response = self.responses[kind]
+        return response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)
+
+    def _load_fixtures(self, fixtures_dir):
+        for name in os.listdir(fixtures_dir):
+            kind, ext = os.path.splitext(name)
+            if kind not in self.responses:
+                continue
+            with open(os.path.join(fixtures_dir, name), "r", encoding="utf-8") as f:
+                text = f.read()
+            self.responses[kind] = json.loads(text) if ext == ".json" else text
+
+
+def make_provider(name=LLM_PROVIDER):
+    if name == "fake":
+        return FakeProvider()
+    if name == "gemini":
+        return GeminiProvider()
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
+
+
+PROVIDER = make_provider()
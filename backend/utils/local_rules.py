@@ -0,0 +1,61 @@
+import io
+import re
+import functools
+import numpy as np
+from PIL import Image
+
+from utils.common import parse_manifesto_to_rules
+
+
+def open_page(image_bytes):
+    """Decodes a screenshot to RGB; transparent exports are flattened onto white, as normalize_image does for the model."""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        return flat
+    return image.convert("RGB")
+
+
+def page_pixels(image, max_edge):
+    """
+    The page as a NumPy array with the long side at most max_edge. Nearest-neighbour
+    keeps real pixel colours and hard edges; averaging would blend thin text and
+    borders into their background.
+    """
+    if max(image.size) > max_edge:
+        image = image.copy()
+        image.thumbnail((max_edge, max_edge), Image.Resampling.NEAREST)
+    return np.asarray(image)
+
+
+@functools.lru_cache(maxsize=8)
+def _rule_section_titles(manifesto_text):
+    """{lower-case rule name: "<id>. <title>"}; the manifesto only changes on rule edits, so this is parsed once per version."""
+    return {
+        rule["name"].strip().lower(): f"{section['id']}. {section['title']}"
+        for section in parse_manifesto_to_rules(manifesto_text) for rule in section["rules"]
+    }
+
+
+def rule_sections(manifesto_text, names):
+    """Maps each check in `names` ({check: rule name}) to the "<id>. <title>" section of that rule, if the manifesto has it."""
+    titles = _rule_section_titles(manifesto_text)
+    return {check: titles[name.lower()] for check, name in names.items() if name.lower() in titles}
+
+
+def strip_rules(manifesto_text, names):
+    """The manifesto without the named rules (their line and indented sub-items)."""
+    names = {name.lower() for name in names}
+    lines = []
+    skipping = False
+    for line in manifesto_text.split("\n"):
+        rule_match = re.match(r"^\*\s+\*\*(.+?):\*\*", line)
+        if rule_match:
+            skipping = rule_match.group(1).strip().lower() in names
+        elif not re.match(r"^\s+\*", line):
+            skipping = False
+        if not skipping:
+            lines.append(line)
+    return "\n".join(lines)
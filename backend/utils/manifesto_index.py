@@ -0,0 +1,200 @@
+import os
+import re
+import math
+import hashlib
+import threading
+from collections import Counter
+
+from utils.common import parse_manifesto_to_rules
+
+# How many rules a prompt gets from the manifesto, most relevant first
+MANIFESTO_TOP_K = int(os.getenv("MANIFESTO_TOP_K", "6"))
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Section titles are repeated in each rule document so a query naming the section
+# (violations carry rule_section) ranks all of that section's rules up
+SECTION_TITLE_WEIGHT = 2
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "by", "at", "from", "as", "is", "are",
+    "be", "must", "should", "if", "it", "its", "that", "this", "than", "all", "any", "e", "g", "use", "only",
+    "ve", "bir", "bu", "da", "de", "ile", "için", "çok", "daha", "en", "mi", "ne", "nasıl", "olarak",
+}
+
+# The manifesto is English while violations, feedback and chat are Turkish: query tokens
+# starting with one of these stems are expanded with the English terms they stand for
+QUERY_GLOSSARY = {
+    "hiza": "alignment align grid", "ızgara": "grid", "boşluk": "whitespace padding", "dolgu": "padding",
+    "sıkışık": "cluttered whitespace", "akış": "flow", "kaydır": "scroll", "mürekkep": "ink", "gölge": "shadows 3d",
+    "kenarlık": "borders", "pasta": "pie", "halka": "donut", "zaman": "time series", "çizgi": "line",
+    "çubuk": "bar", "sütun": "bar", "karşılaştır": "comparisons", "lejant": "legends", "gösterge": "legends",
+    "etiket": "labels labeling", "yazı": "font typography text", "tipografi": "typography font",
+    "başlık": "title titles headers", "hiyerarşi": "hierarchy", "okun": "readability", "dikey": "vertical",
+    "eğik": "slanted angled", "renk": "color palette", "palet": "palette color", "yeşil": "green",
+    "kırmızı": "red", "kontrast": "contrast wcag", "körlü": "blindness", "dilimleyici": "slicer panel",
+    "filtre": "filters slicer", "etkileşim": "interaction", "ipuc": "tooltips", "isim": "naming names",
+    "adlandır": "naming", "alan": "field", "ölçü": "measures", "erişilebil": "accessibility", "tablo": "tables",
+    "arka": "background", "tema": "palette color", "tuval": "canvas", "sayfa": "page canvas",
+}
+
+
+def _stem(token):
+    if len(token) > 5 and token.endswith("ing"):
+        return token[:-3]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lower-cased word tokens without stopwords, with English plurals and -ing folded."""
+    # str.lower() turns "İ" into "i" plus a combining dot, which would split the word
+    text = text.replace("İ", "i").lower()
+    return [_stem(token) for token in re.findall(r"\w+", text) if token not in _STOPWORDS]
+
+
+def expand_query(text):
+    """Query tokens plus the English glossary terms of any Turkish domain words."""
+    tokens = tokenize(text)
+    expanded = list(tokens)
+    for token in tokens:
+        for stem, terms in QUERY_GLOSSARY.items():
+            if token.startswith(stem):
+                expanded.extend(tokenize(terms))
+    return expanded
+
+
+def _rule_documents(rules):
+    """One (key, text, entry) per rule, or per section if it has none; keys are content digests."""
+    documents = []
+    seen = Counter()
+    for section in rules:
+        title = f"{section['id']}. {section['title']}"
+        section_rules = section.get("rules") or [None]
+        for rule in section_rules:
+            parts = [title] * SECTION_TITLE_WEIGHT
+            if rule is not None:
+                parts += [rule["name"], rule["description"], *rule.get("sub_rules", [])]
+            text = "\n".join(parts)
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            seen[digest] += 1
+            documents.append(((digest, seen[digest]), text, {"section_id": section["id"], "section_title": section["title"], "rule": rule}))
+    return documents
+
+
+class ManifestoIndex:
+    """
+    In-memory BM25 index over the rules produced by parse_manifesto_to_rules.
+    `sync(manifesto_text)` is a no-op while the manifesto is unchanged (callers holding
+    the parsed rules, e.g. ManifestoStore, can pass them to skip parsing); after an edit only
+    added or changed rules are tokenized, and removed ones are subtracted from the
+    document frequencies. `select` renders the most relevant rules as manifesto markdown.
+    """
+
+    def __init__(self):
+        self._digest = None
+        self._documents = {}  # key -> {"tf", "length", "entry"}
+        self._order = []      # keys in manifesto order
+        self._df = Counter()
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self.counters = {"syncs": 0, "documents_indexed": 0, "documents_reused": 0}
+
+    def sync(self, manifesto_text, rules=None):
+        digest = hashlib.sha256(manifesto_text.encode("utf-8")).hexdigest()
+        if digest == self._digest:
+            return
+        with self._lock:
+            if digest == self._digest:
+                return
+            documents = _rule_documents(rules if rules is not None else parse_manifesto_to_rules(manifesto_text))
+            keys = {key for key, _, _ in documents}
+            for key in [k for k in self._documents if k not in keys]:
+                removed = self._documents.pop(key)
+                self._df.subtract(removed["tf"].keys())
+                self._total_length -= removed["length"]
+            for key, text, entry in documents:
+                if key in self._documents:
+                    self._documents[key]["entry"] = entry  # positions may shift after a delete
+                    self.counters["documents_reused"] += 1
+                    continue
+                tf = Counter(tokenize(text))
+                self._documents[key] = {"tf": tf, "length": sum(tf.values()), "entry": entry}
+                self._df.update(tf.keys())
+                self._total_length += sum(tf.values())
+                self.counters["documents_indexed"] += 1
+            self._df = +self._df  # drop terms whose count fell to zero
+            self._order = [key for key, _, _ in documents]
+            self._digest = digest
+            self.counters["syncs"] += 1
+
+    def search(self, query, top_k=MANIFESTO_TOP_K):
+        """Returns up to top_k (score, entry) pairs with a positive score, best first."""
+        terms = Counter(expand_query(query))
+        n = len(self._order)
+        if not terms or not n:
+            return []
+        avg_length = self._total_length / n
+        scored = []
+        for position, key in enumerate(self._order):
+            document = self._documents[key]
+            score = 0.0
+            for term, query_count in terms.items():
+                tf = document["tf"].get(term)
+                if not tf:
+                    continue
+                df = self._df[term]
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * document["length"] / avg_length))
+                score += idf * norm * query_count
+            if score > 0:
+                scored.append((-score, position, document["entry"]))
+        scored.sort(key=lambda item: item[:2])
+        return [(-score, entry) for score, _, entry in scored[:top_k]]
+
+    def select(self, manifesto_text, query, top_k=MANIFESTO_TOP_K):
+        """
+        The top_k rules most relevant to `query` as manifesto markdown, grouped by section
+        in manifesto order. If nothing matches, the first rule of each section is used, so
+        the prompt still covers every topic.
+        """
+        self.sync(manifesto_text)
+        hits = [entry for _, entry in self.search(query, top_k)]
+        if not hits:
+            first_per_section = {}
+            for key in self._order:
+                entry = self._documents[key]["entry"]
+                first_per_section.setdefault(entry["section_id"], entry)
+            hits = list(first_per_section.values())[:top_k]
+        return render_rules(hits)
+
+    def stats(self):
+        return {**self.counters, "documents": len(self._order), "terms": len(self._df)}
+
+
+def rule_renderings(manifesto_text, query, top_k=MANIFESTO_TOP_K):
+    """Relevant rules at top_k, about half of that and 1, as PromptBuilder renderings."""
+    counts = sorted({top_k, max(1, top_k // 2), 1}, reverse=True)
+    return [MANIFESTO_INDEX.select(manifesto_text, query, count) for count in counts]
+
+
+def render_rules(entries):
+    """Manifesto-style markdown for rule entries, sections and rules in manifesto order."""
+    sections = {}
+    for entry in sorted(entries, key=lambda e: (e["section_id"], e["rule"]["id"] if e["rule"] else 0)):
+        sections.setdefault((entry["section_id"], entry["section_title"]), []).append(entry["rule"])
+    lines = []
+    for (section_id, title), rules in sections.items():
+        lines.append(f"## {section_id}. {title}")
+        for rule in rules:
+            if rule is None:
+                continue
+            lines.append(f"* **{rule['name']}:** {rule['description']}")
+            lines.extend(f"    * {sub_rule}" for sub_rule in rule.get("sub_rules", []))
+    return "\n".join(lines)
+
+
+MANIFESTO_INDEX = ManifestoIndex()
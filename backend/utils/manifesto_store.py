@@ -0,0 +1,185 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+
+from utils.common import MANIFESTO_PATH, load_manifesto, parse_manifesto_to_rules, save_manifesto_from_rules, save_manifesto, write_file_atomic, file_lock
+
+# Rule edits from every process serialise on this lock file. The version of the saved
+# manifesto is kept next to it, so all processes agree on the version numbers.
+MANIFESTO_LOCK_PATH = MANIFESTO_PATH + ".lock"
+MANIFESTO_VERSION_PATH = MANIFESTO_PATH + ".version"
+
+
+class ManifestoVersionConflict(Exception):
+    """Raised when an edit expects a manifesto version that is no longer the current one."""
+
+    def __init__(self, expected_version, current_version):
+        super().__init__(f"Manifesto version conflict: expected {expected_version}, current {current_version}")
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _read_version_file():
+    """(version, digest of the manifesto it belongs to); (0, None) if there is none."""
+    try:
+        with open(MANIFESTO_VERSION_PATH, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        return int(stored["version"]), stored["digest"]
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return 0, None
+
+
+def _write_version_file(version, digest):
+    try:
+        write_file_atomic(MANIFESTO_VERSION_PATH, json.dumps({"version": version, "digest": digest}))
+    except Exception as e:
+        print(f"Error saving manifesto version: {e}")
+
+
+def _disk_stamp():
+    """(inode, mtime, size) of manifesto.md and its version file; both are replaced on every save."""
+    stamp = []
+    for path in (MANIFESTO_PATH, MANIFESTO_VERSION_PATH):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+class ManifestoStore:
+    """
+    The manifesto held parsed in memory: `rules` is what parse_manifesto_to_rules returns,
+    indexed by section id and by (section id, rule id), and `text` is its markdown.
+    `version` goes up by one on every change and is shared by all processes through
+    manifesto.md.version, so caches and prompt builders can key on it instead of
+    hashing the text. Markdown is only rendered, and the file only written, by
+    write_section; `rules` must be treated as read-only. All of it is swapped in as one
+    tuple, so snapshot() never mixes two versions.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._write_lock = asyncio.Lock()
+        self._state = (0, None, [], '"0"', {}, {})
+        self._disk_stamp = None
+        self._pending_refresh = None
+        self.refresh()
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    @property
+    def text(self):
+        return self._state[1]
+
+    @property
+    def rules(self):
+        return self._state[2]
+
+    @property
+    def etag(self):
+        return self._state[3]
+
+    def snapshot(self):
+        """(version, text, rules, etag) of one and the same manifesto."""
+        return self._state[:4]
+
+    async def refresh_if_changed(self):
+        """
+        refresh() if manifesto.md or its version file changed on disk since this store
+        last read or wrote them; otherwise only two stat calls. The refresh waits for the
+        locks a write may hold, so it runs in a worker thread, and concurrent callers
+        share it. Returns True if the held manifesto changed.
+        """
+        if _disk_stamp() == self._disk_stamp:
+            return False
+        if self._pending_refresh is None or self._pending_refresh.done():
+            self._pending_refresh = asyncio.ensure_future(asyncio.to_thread(self.refresh))
+        return await asyncio.shield(self._pending_refresh)
+
+    def refresh(self):
+        """
+        Re-reads manifesto.md under the file lock, picking up edits saved by another
+        process or by hand. Returns True if the held manifesto changed.
+        """
+        with self._lock, file_lock(MANIFESTO_LOCK_PATH):
+            return self._refresh()
+
+    def _refresh(self):
+        text = load_manifesto()
+        version, digest = _read_version_file()
+        if text == self.text and version == self.version:
+            self._disk_stamp = _disk_stamp()
+            return False
+        if digest != _digest(text) or version <= self.version:
+            # Saved without a version (edited by hand, first start) or the version file was lost
+            version = max(version, self.version) + 1
+            _write_version_file(version, _digest(text))
+        self._set(text, version)
+        self._disk_stamp = _disk_stamp()
+        return True
+
+    def _set(self, text, version):
+        rules = parse_manifesto_to_rules(text)
+        sections = {section["id"]: section for section in rules}
+        rule_index = {(section["id"], rule["id"]): rule for section in rules for rule in section["rules"]}
+        # The digest part keeps tags unique should the version file ever be lost and the count restart
+        etag = f'"{version}-{_digest(text)[:8]}"'
+        self._state = (version, text, rules, etag, sections, rule_index)
+
+    def section(self, section_id):
+        """The section with this id, or None."""
+        return self._state[4].get(section_id)
+
+    def rule(self, section_id, rule_id):
+        """The rule with this id in the given section, or None."""
+        return self._state[5].get((section_id, rule_id))
+
+    async def write_section(self, section_id, change, expected_version=None):
+        """
+        Applies change(section) to a copy of section `section_id` (nothing changes if
+        there is no such section), renders the manifesto and saves manifesto.md; the
+        version only moves if the markdown changed. The saved markdown is parsed back,
+        so ids are renumbered as a reload would.
+        Edits are serialised by an asyncio lock within the process and a file lock
+        across processes, and are applied to the latest saved manifesto. If
+        expected_version is given and is not the current version,
+        ManifestoVersionConflict is raised and nothing is written.
+        Returns False if saving failed.
+        """
+        async with self._write_lock:
+            return await asyncio.to_thread(self._write_section, section_id, change, expected_version)
+
+    def _write_section(self, section_id, change, expected_version):
+        with self._lock, file_lock(MANIFESTO_LOCK_PATH):
+            if _disk_stamp() != self._disk_stamp:
+                self._refresh()
+            if expected_version is not None and expected_version != self.version:
+                raise ManifestoVersionConflict(expected_version, self.version)
+            rules = []
+            for section in self.rules:
+                if section["id"] == section_id:
+                    section = {**section, "rules": [dict(rule) for rule in section["rules"]]}
+                    change(section)
+                rules.append(section)
+            text = save_manifesto_from_rules(rules)
+            if text == self.text:
+                return True
+            if not save_manifesto(text):
+                return False
+            self._set(text, self.version + 1)
+            _write_version_file(self.version, _digest(text))
+            self._disk_stamp = _disk_stamp()
+            return True
+
+
+MANIFESTO_STORE = ManifestoStore()
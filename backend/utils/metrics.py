@@ -0,0 +1,247 @@
+import os
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+
+# Prefix of every exported metric name
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "dashboard_agent")
+
+# Latency buckets in seconds: image work is milliseconds, Gemini calls take seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """Base for labelled metrics: one child value per distinct label tuple."""
+    kind = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, value in children:
+            lines.extend(self._render_child(list(zip(self.label_names, key)), value))
+        return lines
+
+    def _render_child(self, pairs, value):
+        return [f"{self.name}{_format_labels(pairs)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            child["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            child["sum"] += value
+
+    def _render_child(self, pairs, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child["counts"]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(round(child['sum'], 6))}")
+        lines.append(f"{self.name}_count{_format_labels(pairs)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus registry rendering the text exposition format (0.0.4).
+    Besides metrics updated in place, collectors are called at scrape time to export
+    counters other components already keep; each returns a list of
+    (name, kind, help, [(labels_dict, value), ...]).
+    """
+
+    def __init__(self, namespace=METRICS_NAMESPACE):
+        self.namespace = namespace
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._add(Counter(f"{self.namespace}_{name}", help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._add(Gauge(f"{self.namespace}_{name}", help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(f"{self.namespace}_{name}", help_text, label_names, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{full_name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = METRICS.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template, method and status.",
+    ["endpoint", "method", "status"])
+STAGE_SECONDS = METRICS.histogram(
+    "stage_duration_seconds", "Time spent in one processing stage (image_decode, phash, color_analysis, layout_analysis, prompt_build, llm_call, json_parse, generate_assets).",
+    ["stage"])
+LLM_REQUEST_SECONDS = METRICS.histogram(
+    "llm_request_duration_seconds", "Latency of a single LLM attempt by model and outcome (ok, quota, error).",
+    ["model", "outcome"])
+LLM_TOKENS = METRICS.counter(
+    "llm_tokens_total", "Tokens reported by the provider's usage metadata, by model and kind (prompt, response, cached).",
+    ["model", "kind"])
+LLM_RETRIES = METRICS.counter(
+    "llm_retries_total", "LLM attempts retried after a quota error.", ["model"])
+CACHE_LOOKUPS = METRICS.counter(
+    "cache_lookups_total", "Cache lookups by cache and result (memory, disk, near_duplicate, rescored, miss).", ["cache", "result"])
+WEBSOCKET_SESSIONS = METRICS.gauge(
+    "websocket_sessions_active", "Open WebSocket sessions.", ["endpoint"])
+WEBSOCKET_AUDIO_CHUNKS = METRICS.counter(
+    "websocket_audio_chunks_total", "Audio chunks relayed over WebSocket sessions, by direction (in, out).", ["endpoint", "direction"])
+
+
+@contextmanager
+def observe_stage(stage):
+    """Times the enclosed block into STAGE_SECONDS, whether it succeeds or raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed_stage(stage):
+    """Decorator form of observe_stage for async functions."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with observe_stage(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage_metadata(model_name, usage):
+    """Adds the prompt/response/cached token counts of an SDK usage_metadata object, if any."""
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("response", "candidates_token_count"), ("cached", "cached_content_token_count")):
+        count = getattr(usage, field, None)
+        if count:
+            LLM_TOKENS.inc(count, model=model_name, kind=kind)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording HTTP_REQUEST_SECONDS. The endpoint label is the matched
+    route template (e.g. /jobs/{job_id}), so path parameters do not create new series;
+    unmatched paths share "unmatched". Timing runs until the last body chunk is sent,
+    so streamed responses (SSE, NDJSON) are measured end to end.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=scope["method"], status=status["code"])
@@ -0,0 +1,210 @@
+import io
+import os
+import sqlite3
+import threading
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+
+from utils.audit_cache import AUDIT_CACHE_DIR
+
+HASH_BITS = 64
+CHUNK_BITS = 16
+CHUNKS = HASH_BITS // CHUNK_BITS
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+
+
+def dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """
+    64-bit difference hash. The image is reduced to a (hash_size+1) x hash_size
+    greyscale thumbnail and each bit records whether a pixel is brighter than its
+    right-hand neighbour, so re-exports at other sizes or with small label changes
+    land within a few bits of each other.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("L", (hash_size * 16, hash_size * 16))
+    thumb = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = np.asarray(thumb, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes.
+    Each hash is split into four 16-bit chunks with one lookup table per chunk. By the
+    pigeonhole principle, any hash within distance r of the query matches it within
+    r // 4 bits on at least one chunk, so only those buckets need a full comparison.
+    Payloads are unique: adding one again replaces its hash.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._ids = {}
+        self._next_id = 0
+        self._tables = [{} for _ in range(CHUNKS)]
+        self._flip_masks = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, value: int, payload):
+        self.remove(payload)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (value, payload)
+        self._ids[payload] = entry_id
+        for i, chunk in enumerate(self._chunks(value)):
+            self._tables[i].setdefault(chunk, []).append(entry_id)
+
+    def remove(self, payload):
+        """Drops the hash stored with `payload`, if there is one."""
+        entry_id = self._ids.pop(payload, None)
+        if entry_id is None:
+            return
+        value, _ = self._entries.pop(entry_id)
+        for i, chunk in enumerate(self._chunks(value)):
+            bucket = self._tables[i][chunk]
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._tables[i][chunk]
+
+    def search(self, value: int, max_distance: int):
+        """Returns [(distance, payload)] for every stored hash within max_distance, nearest first."""
+        masks = self._masks(max_distance // CHUNKS)
+        seen = set()
+        matches = []
+        for i, chunk in enumerate(self._chunks(value)):
+            table = self._tables[i]
+            for mask in masks:
+                for entry_id in table.get(chunk ^ mask, ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    distance = hamming_distance(value, self._entries[entry_id][0])
+                    if distance <= max_distance:
+                        matches.append((distance, entry_id))
+        matches.sort()
+        return [(distance, self._entries[entry_id][1]) for distance, entry_id in matches]
+
+    @staticmethod
+    def _chunks(value: int):
+        mask = (1 << CHUNK_BITS) - 1
+        return [(value >> (CHUNK_BITS * i)) & mask for i in range(CHUNKS)]
+
+    def _masks(self, radius: int):
+        """All 16-bit XOR masks with at most `radius` bits set (cached per radius)."""
+        if radius not in self._flip_masks:
+            masks = [0]
+            for r in range(1, radius + 1):
+                for bits in combinations(range(CHUNK_BITS), r):
+                    masks.append(sum(1 << b for b in bits))
+            self._flip_masks[radius] = masks
+        return self._flip_masks[radius]
+
+
+class PerceptualIndex:
+    """
+    Near-duplicate lookup for audits, stored next to the audit cache.
+    Hashes are partitioned by manifesto digest so a neighbour is only ever reused
+    for the same manifesto version. Entries are persisted to SQLite and the
+    in-memory index is rebuilt from it at startup. Entries only point at cached
+    audits, so they are dropped when their audit leaves the cache (remove, retain)
+    or their manifesto version is replaced (keep_manifestos).
+    """
+
+    def __init__(self, cache_dir=AUDIT_CACHE_DIR):
+        self._indexes = {}
+        self._manifestos = {}
+        self._lock = threading.Lock()
+        self._db = None
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(cache_dir, "phash_index.sqlite3"), check_same_thread=False)
+            # Same durability trade-off as the audit cache: no fsync per commit on the request path
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS phashes ("
+                "cache_key TEXT PRIMARY KEY, manifesto TEXT NOT NULL, phash TEXT NOT NULL)"
+            )
+            self._db.commit()
+            for cache_key, digest, phash in self._db.execute("SELECT cache_key, manifesto, phash FROM phashes"):
+                self._index_for(digest).add(int(phash, 16), cache_key)
+                self._manifestos[cache_key] = digest
+        except Exception as e:
+            print(f"Perceptual index persistence disabled: {e}")
+            self._db = None
+
+    def add(self, phash: int, cache_key: str, manifesto: str):
+        with self._lock:
+            if cache_key in self._manifestos:
+                return
+            self._manifestos[cache_key] = manifesto
+            self._index_for(manifesto).add(phash, cache_key)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO phashes (cache_key, manifesto, phash) VALUES (?, ?, ?)",
+                    (cache_key, manifesto, f"{phash:016x}")
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"Perceptual index write error: {e}")
+
+    def __len__(self):
+        return len(self._manifestos)
+
+    def remove(self, cache_keys):
+        """Drops the entries of these audit cache keys (e.g. evicted from the audit cache)."""
+        with self._lock:
+            removed = []
+            for cache_key in cache_keys:
+                manifesto = self._manifestos.pop(cache_key, None)
+                if manifesto is None:
+                    continue
+                index = self._indexes[manifesto]
+                index.remove(cache_key)
+                if not len(index):
+                    del self._indexes[manifesto]
+                removed.append((cache_key,))
+            if self._db is None or not removed:
+                return
+            try:
+                self._db.executemany("DELETE FROM phashes WHERE cache_key = ?", removed)
+                self._db.commit()
+            except Exception as e:
+                print(f"Perceptual index write error: {e}")
+
+    def retain(self, keep):
+        """Keeps only the entries whose cache key satisfies keep(cache_key); keep is called without the lock held."""
+        with self._lock:
+            cache_keys = list(self._manifestos)
+        self.remove([cache_key for cache_key in cache_keys if not keep(cache_key)])
+
+    def keep_manifestos(self, manifestos):
+        """Drops every partition except those of the given manifesto digests (after a manifesto change)."""
+        manifestos = set(manifestos)
+        with self._lock:
+            stale = [cache_key for cache_key, manifesto in self._manifestos.items() if manifesto not in manifestos]
+        self.remove(stale)
+
+    def neighbours(self, phash: int, manifesto: str, max_distance: int = PHASH_MAX_DISTANCE):
+        """Returns [(distance, cache_key)] of prior audits within max_distance, nearest first."""
+        with self._lock:
+            index = self._indexes.get(manifesto)
+            if index is None:
+                return []
+            return index.search(phash, max_distance)
+
+    def _index_for(self, manifesto):
+        if manifesto not in self._indexes:
+            self._indexes[manifesto] = MultiIndexHash()
+        return self._indexes[manifesto]
@@ -0,0 +1,72 @@
+import json
+import time
+import asyncio
+
+
+class Stage:
+    """A pipeline step: `func(results)` is awaited once every stage in `deps` has succeeded."""
+
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+
+async def run_stages(stages):
+    """
+    Runs a small DAG of stages, starting each one as soon as its dependencies finish.
+    Yields (name, status, value, elapsed_ms) in completion order, where status is
+    "ok", "error" (value is the message) or "skipped" (a dependency failed).
+    Stages still running when the consumer stops iterating are cancelled.
+    """
+    results = {}
+    failed = set()
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+
+    async def timed(stage):
+        start = time.perf_counter()
+        try:
+            value = await stage.func(results)
+            return "ok", value, (time.perf_counter() - start) * 1000
+        except Exception as e:
+            return "error", str(e), (time.perf_counter() - start) * 1000
+
+    def start_ready():
+        for name, stage in list(pending.items()):
+            if all(dep in results for dep in stage.deps):
+                del pending[name]
+                running[asyncio.create_task(timed(stage))] = stage
+
+    try:
+        start_ready()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage = running.pop(task)
+                status, value, elapsed = task.result()
+                if status == "ok":
+                    results[stage.name] = value
+                else:
+                    failed.add(stage.name)
+                yield stage.name, status, value, round(elapsed, 1)
+
+            # Anything downstream of a failure will never become ready
+            skipped = True
+            while skipped:
+                skipped = False
+                for name, stage in list(pending.items()):
+                    if any(dep in failed for dep in stage.deps):
+                        del pending[name]
+                        failed.add(name)
+                        skipped = True
+                        yield name, "skipped", None, 0.0
+            start_ready()
+    finally:
+        for task in running:
+            task.cancel()
+
+
+def sse_event(event, data):
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,190 @@
+import os
+import json
+import threading
+
+from utils.metrics import METRICS
+
+# Token estimate used for accounting: ~4 characters per token, like the scheduler's estimate
+PROMPT_CHARS_PER_TOKEN = 4
+
+# Per-endpoint prompt budgets in tokens (cached prefix and images included);
+# override with PROMPT_BUDGET_<ENDPOINT>, 0 disables trimming for that endpoint
+DEFAULT_PROMPT_BUDGETS = {
+    "audit": 8000,
+    "audit_tile": 8000,
+    "rule_audit": 2000,
+    "assets": 8000,
+    "revise": 6000,
+    "simulate": 2000,
+    "chat": 4000,
+}
+PROMPT_BUDGETS = {
+    endpoint: int(os.getenv(f"PROMPT_BUDGET_{endpoint.upper()}", str(budget)))
+    for endpoint, budget in DEFAULT_PROMPT_BUDGETS.items()
+}
+
+# Free-text fields (issue, recommendation, action, reason) are cut to this many characters when trimming
+PROMPT_TRIM_TEXT_CHARS = int(os.getenv("PROMPT_TRIM_TEXT_CHARS", "160"))
+
+PROMPT_TOKENS = METRICS.histogram(
+    "prompt_tokens", "Estimated prompt size in tokens after budget trimming, by endpoint.", ["endpoint"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+PROMPT_TRIMS = METRICS.counter(
+    "prompt_trims_total", "Prompt sections replaced by a shorter rendering to fit the budget.", ["endpoint", "section"])
+
+
+def count_tokens(text):
+    return (len(text) + PROMPT_CHARS_PER_TOKEN - 1) // PROMPT_CHARS_PER_TOKEN
+
+
+def _cut(text, limit):
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def audit_result_renderings(audit_result, text_limit=PROMPT_TRIM_TEXT_CHARS):
+    """
+    Progressively smaller JSON renderings of an audit result, for PromptBuilder fallbacks:
+    full; without positive_points; with issue/recommendation cut to text_limit characters;
+    without recommendations. The local measurements (local_analysis) and the model's own
+    score (model_score) are bookkeeping for the UI and never rendered; the locally found
+    violations themselves are kept.
+    """
+    result = {k: v for k, v in audit_result.items() if k not in ("local_analysis", "model_score")}
+    renderings = [result]
+    result = {k: v for k, v in result.items() if k != "positive_points"}
+    renderings.append(result)
+    violations = [
+        {**v, **{field: _cut(v[field], text_limit) for field in ("issue", "recommendation") if isinstance(v.get(field), str)}}
+        for v in result.get("violations", [])
+    ]
+    result = {**result, "violations": violations}
+    renderings.append(result)
+    renderings.append({**result, "violations": [{k: val for k, val in v.items() if k != "recommendation"} for v in violations]})
+    return [json.dumps(r, ensure_ascii=False) for r in renderings]
+
+
+def assets_renderings(assets, text_limit=PROMPT_TRIM_TEXT_CHARS):
+    """
+    Progressively smaller JSON renderings of builder assets: full; with action and reason
+    text cut to text_limit characters; additionally without theme_json.visualStyles,
+    usually the bulk of a theme (callers should restore it if the model drops it).
+    """
+    renderings = [assets]
+    actions = [
+        {**step, **{field: _cut(step[field], text_limit) for field in ("action", "reason") if isinstance(step.get(field), str)}}
+        for step in assets.get("action_list", []) if isinstance(step, dict)
+    ]
+    trimmed = {**assets, "action_list": actions}
+    renderings.append(trimmed)
+    theme = trimmed.get("theme_json")
+    if isinstance(theme, dict) and "visualStyles" in theme:
+        renderings.append({**trimmed, "theme_json": {k: v for k, v in theme.items() if k != "visualStyles"}})
+    return [json.dumps(r, ensure_ascii=False) for r in renderings]
+
+
+class PromptBuilder:
+    """
+    Assembles a prompt from named sections and keeps it within the endpoint's token budget.
+    Sections added with a priority can be trimmed: each has a list of progressively shorter
+    renderings (the last may be "" to drop it). While the prompt is over budget, the
+    lowest-priority section that can still shrink (the later one on ties) moves to its next
+    rendering, so the same inputs always produce the same prompt. Sections without a
+    priority are never trimmed; if the prompt is still over budget it is sent as is and
+    counted as over budget. Parts that are not text (images, a cached prefix) are counted
+    with add_fixed.
+    """
+
+    def __init__(self, endpoint, budget=None):
+        self.endpoint = endpoint
+        self.budget = PROMPT_BUDGETS.get(endpoint, 0) if budget is None else budget
+        self.sections = []
+
+    def add(self, name, text, priority=None, fallbacks=()):
+        renderings = [text, *fallbacks] if priority is not None else [text]
+        self.sections.append({"name": name, "renderings": renderings, "tokens": [count_tokens(r) for r in renderings],
+                              "priority": priority, "level": 0, "fixed": False})
+        return self
+
+    def add_fixed(self, name, tokens):
+        self.sections.append({"name": name, "renderings": [""], "tokens": [tokens], "priority": None, "level": 0, "fixed": True})
+        return self
+
+    def level(self, name):
+        """Index of the rendering used for section `name` (0 = untrimmed)."""
+        return next(s["level"] for s in self.sections if s["name"] == name)
+
+    def total_tokens(self):
+        return sum(s["tokens"][s["level"]] for s in self.sections)
+
+    def build(self):
+        """Returns the prompt text, trimmed to the budget if needed, and records it in PROMPT_REPORT."""
+        total = self.total_tokens()
+        while self.budget and total > self.budget:
+            candidates = [(s["priority"], -i, s) for i, s in enumerate(self.sections)
+                          if s["priority"] is not None and s["level"] < len(s["renderings"]) - 1]
+            if not candidates:
+                break
+            section = min(candidates, key=lambda c: c[:2])[2]
+            section["level"] += 1
+            PROMPT_TRIMS.inc(endpoint=self.endpoint, section=section["name"])
+            total = self.total_tokens()
+
+        over_budget = bool(self.budget) and total > self.budget
+        PROMPT_REPORT.record(self, total, over_budget)
+        PROMPT_TOKENS.observe(total, endpoint=self.endpoint)
+        parts = ", ".join(f"{s['name']} {s['tokens'][s['level']]}" for s in self.sections)
+        trimmed = [s["name"] for s in self.sections if s["level"]]
+        print(f"[PROMPT] {self.endpoint}: ~{total} tokens ({parts})"
+              + (f", trimmed: {', '.join(trimmed)}" if trimmed else "")
+              + (f", OVER BUDGET {self.budget}" if over_budget else ""))
+        return "".join(s["renderings"][s["level"]] for s in self.sections if not s["fixed"])
+
+
+class PromptReport:
+    """Running totals of built prompts per endpoint, for the /llm/prompts report."""
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, builder, total, over_budget):
+        with self._lock:
+            entry = self._endpoints.setdefault(builder.endpoint, {
+                "calls": 0, "tokens": 0, "max_tokens": 0, "trimmed_calls": 0, "over_budget": 0, "sections": {}
+            })
+            entry["calls"] += 1
+            entry["tokens"] += total
+            entry["max_tokens"] = max(entry["max_tokens"], total)
+            entry["over_budget"] += int(over_budget)
+            entry["trimmed_calls"] += int(any(s["level"] for s in builder.sections))
+            for s in builder.sections:
+                section = entry["sections"].setdefault(s["name"], {"calls": 0, "tokens": 0, "trimmed": 0})
+                section["calls"] += 1
+                section["tokens"] += s["tokens"][s["level"]]
+                section["trimmed"] += int(s["level"] > 0)
+
+    def report(self):
+        """Average prompt size and composition per endpoint; `share` is each section's fraction of the tokens."""
+        with self._lock:
+            result = {}
+            for endpoint, entry in self._endpoints.items():
+                result[endpoint] = {
+                    "calls": entry["calls"],
+                    "budget": PROMPT_BUDGETS.get(endpoint, 0),
+                    "avg_tokens": round(entry["tokens"] / entry["calls"]),
+                    "max_tokens": entry["max_tokens"],
+                    "trimmed_calls": entry["trimmed_calls"],
+                    "over_budget": entry["over_budget"],
+                    "sections": {
+                        name: {
+                            "avg_tokens": round(section["tokens"] / section["calls"]),
+                            "share": round(section["tokens"] / entry["tokens"], 3) if entry["tokens"] else 0.0,
+                            "trimmed": section["trimmed"]
+                        }
+                        for name, section in entry["sections"].items()
+                    }
+                }
+            return result
+
+
+PROMPT_REPORT = PromptReport()
@@ -0,0 +1,188 @@
+import os
+import time
+import asyncio
+import hashlib
+import datetime
+from google.generativeai import caching
+
+from utils.llm_providers import PROVIDER
+
+PROMPT_CACHE_BACKEND = os.getenv("PROMPT_CACHE_BACKEND", "gemini")
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+PROMPT_CACHE_REFRESH_SECONDS = int(os.getenv("PROMPT_CACHE_REFRESH_SECONDS", str(PROMPT_CACHE_TTL_SECONDS // 2)))
+
+
+class PromptPrefix:
+    """
+    The static head of a prompt: a system instruction plus a large text block
+    (manifesto, rules, output format) that is identical across requests.
+    `digest` changes whenever either part changes, e.g. after a manifesto edit.
+    """
+
+    def __init__(self, name, system_instruction, text):
+        self.name = name
+        self.system_instruction = system_instruction
+        self.text = text
+        self.digest = hashlib.sha256(f"{system_instruction}\0{text}".encode("utf-8")).hexdigest()[:16]
+
+
+class LocalPrefixBackend:
+    """
+    Stand-in backend with no provider-side caching: the prefix is sent inline on
+    every request. Used for tests, offline runs and as the fallback whenever the
+    provider refuses to create a cache (e.g. prefix below its minimum token count).
+    """
+    name = "local"
+
+    def create(self, model_name, prefix, ttl_seconds):
+        return None
+
+    def refresh(self, handle, ttl_seconds):
+        pass
+
+    def delete(self, handle):
+        pass
+
+    def bind(self, model_name, prefix, handle, contents):
+        model = PROVIDER.model(model_name, system_instruction=prefix.system_instruction)
+        parts = contents if isinstance(contents, list) else [contents]
+        return model, [prefix.text, *parts]
+
+
+class GeminiCachedContentBackend(LocalPrefixBackend):
+    """Registers the prefix with Gemini's cached-content API and references it by handle."""
+    name = "gemini"
+
+    def create(self, model_name, prefix, ttl_seconds):
+        return caching.CachedContent.create(
+            model=model_name,
+            display_name=f"{prefix.name}-{prefix.digest}",
+            system_instruction=prefix.system_instruction,
+            contents=[prefix.text],
+            ttl=datetime.timedelta(seconds=ttl_seconds)
+        )
+
+    def refresh(self, handle, ttl_seconds):
+        handle.update(ttl=datetime.timedelta(seconds=ttl_seconds))
+
+    def delete(self, handle):
+        handle.delete()
+
+    def bind(self, model_name, prefix, handle, contents):
+        if handle is None:
+            return super().bind(model_name, prefix, handle, contents)
+        return PROVIDER.cached_model(handle), contents
+
+
+class PromptCacheManager:
+    """
+    Keeps one provider-side cache per (prefix name, model, prefix digest).
+    Caches are created lazily on first use, their TTL is extended in the background
+    while they are in use, and `invalidate()` (called on manifesto reload) drops them
+    all so the next request registers the new version.
+    """
+
+    def __init__(self, run_blocking, backend=None, ttl_seconds=PROMPT_CACHE_TTL_SECONDS, refresh_seconds=PROMPT_CACHE_REFRESH_SECONDS):
+        self.run_blocking = run_blocking
+        # Provider-side caching only exists on Gemini; other providers get the prefix inline
+        use_local = PROMPT_CACHE_BACKEND == "local" or PROVIDER.name != "gemini"
+        self.backend = backend or (LocalPrefixBackend() if use_local else GeminiCachedContentBackend())
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self._entries = {}
+        self._pending = {}
+        self._refresh_task = None
+
+    async def bind(self, model_name, prefix, contents):
+        """Returns (model, contents) for a request whose static head is `prefix`."""
+        handle = await self._resolve(model_name, prefix)
+        return self.backend.bind(model_name, prefix, handle, contents)
+
+    def discard(self, model_name, prefix):
+        """Drops one cache entry (e.g. after the provider rejected its handle)."""
+        self._entries.pop((prefix.name, model_name, prefix.digest), None)
+
+    def invalidate(self):
+        """Forgets every cache; the old provider caches are deleted in the background."""
+        stale = [entry["handle"] for entry in self._entries.values() if entry["handle"] is not None]
+        self._entries.clear()
+        self._pending.clear()
+        for handle in stale:
+            self._delete_later(handle)
+
+    def start(self):
+        if self._refresh_task is None and self.refresh_seconds > 0:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "entries": [
+                {"name": key[0], "model": key[1], "digest": key[2], "cached": entry["handle"] is not None, "hits": entry["hits"]}
+                for key, entry in self._entries.items()
+            ]
+        }
+
+    async def _resolve(self, model_name, prefix):
+        key = (prefix.name, model_name, prefix.digest)
+        entry = self._entries.get(key)
+        # Treat entries as expired a minute early so a request never races the provider TTL
+        if entry is not None and entry["expires_at"] - 60 > time.time():
+            entry["hits"] += 1
+            entry["last_used"] = time.time()
+            return entry["handle"]
+
+        # Concurrent first requests share a single create call
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._create(key, model_name, prefix))
+        return await asyncio.shield(self._pending[key])
+
+    async def _create(self, key, model_name, prefix):
+        try:
+            handle = await self.run_blocking(self.backend.create, model_name, prefix, self.ttl_seconds)
+        except Exception as e:
+            print(f"Prompt cache unavailable for '{prefix.name}', sending prefix inline: {e}")
+            handle = None
+
+        # Drop older versions of the same prefix
+        for old_key in [k for k in self._entries if k[:2] == key[:2] and k != key]:
+            old = self._entries.pop(old_key)
+            if old["handle"] is not None:
+                self._delete_later(old["handle"])
+
+        # Without a provider handle, retry creation after one refresh period
+        lifetime = self.ttl_seconds if handle is not None else max(self.refresh_seconds, 120)
+        self._entries[key] = {"handle": handle, "hits": 0, "last_used": time.time(), "expires_at": time.time() + lifetime}
+        self._pending.pop(key, None)
+        return handle
+
+    def _delete_later(self, handle):
+        async def delete():
+            try:
+                await self.run_blocking(self.backend.delete, handle)
+            except Exception as e:
+                print(f"Prompt cache delete failed: {e}")
+        asyncio.ensure_future(delete())
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            cutoff = time.time() - self.refresh_seconds
+            for key, entry in list(self._entries.items()):
+                if entry["handle"] is None or entry["last_used"] < cutoff:
+                    continue
+                try:
+                    await self.run_blocking(self.backend.refresh, entry["handle"], self.ttl_seconds)
+                    entry["expires_at"] = time.time() + self.ttl_seconds
+                except Exception as e:
+                    print(f"Prompt cache refresh failed for '{key[0]}': {e}")
+                    self._entries.pop(key, None)
@@ -0,0 +1,204 @@
+import os
+import re
+import time
+import random
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Provider quota, shared by every Gemini call in the process (0 disables a limit)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+
+# AIMD concurrency: starts at LLM_INITIAL_CONCURRENCY, +1 per window of successes,
+# halved on a 429, always within [LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY]
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60"))
+
+_RETRY_HINT_PATTERNS = [
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+    re.compile(r"retry[- ]after:?\s*([\d.]+)", re.IGNORECASE),
+]
+
+
+def retry_hint(error):
+    """Seconds the provider asked us to wait, parsed from the error text, or None."""
+    retry_delay = getattr(error, "retry_delay", None)
+    if isinstance(retry_delay, (int, float)):
+        return float(retry_delay)
+    for pattern in _RETRY_HINT_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """
+    Per-minute budget refilled continuously. `reserve` always succeeds and returns how
+    long the caller must wait for its share, so waiters are served in arrival order
+    without holding a lock across the sleep.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount):
+        self._refill()
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount):
+        """Corrects an earlier reservation once the real cost is known (negative refunds)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimitScheduler:
+    """
+    Process-wide gate in front of the LLM provider.
+    Every call takes a `slot(estimated_tokens)`: it waits out any provider-requested pause,
+    then for a free concurrency slot, then for request and token budget. When the slot is
+    released, the concurrency limit grows on success and halves on a quota error (at most
+    once per `decrease_cooldown`, so one burst of 429s counts as one congestion event).
+    `is_quota_error(error)` classifies exceptions raised inside the slot.
+    """
+
+    def __init__(self, is_quota_error, rpm=GEMINI_RPM, tpm=GEMINI_TPM,
+                 initial_concurrency=LLM_INITIAL_CONCURRENCY, min_concurrency=LLM_MIN_CONCURRENCY,
+                 max_concurrency=LLM_MAX_CONCURRENCY, backoff_base=LLM_BACKOFF_BASE_SECONDS,
+                 backoff_max=LLM_BACKOFF_MAX_SECONDS, decrease_cooldown=1.0):
+        self.is_quota_error = is_quota_error
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(min_concurrency, max_concurrency)
+        self.limit = float(min(max(initial_concurrency, min_concurrency), self.max_concurrency))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self._waiters = deque()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self.counters = {"calls": 0, "throttled": 0, "rate_limited": 0, "retried": 0, "dropped": 0}
+        self.throttled_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens=0):
+        """
+        Holds one admitted call. Yields a callback `record_usage(tokens)` that settles the
+        token budget against the real usage once the response reports it.
+        """
+        waited = await self._acquire(estimated_tokens)
+        self.counters["calls"] += 1
+        if waited > 0.001:
+            self.counters["throttled"] += 1
+            self.throttled_seconds += waited
+
+        def record_usage(tokens):
+            if self.tokens is not None and tokens:
+                self.tokens.adjust(tokens - estimated_tokens)
+
+        outcome = "ok"
+        try:
+            yield record_usage
+        except BaseException as e:
+            outcome = "quota" if isinstance(e, Exception) and self.is_quota_error(e) else "error"
+            raise
+        finally:
+            self._release(outcome)
+
+    def backoff(self, attempt, error):
+        """
+        Delay before retry number `attempt` (0-based) after a quota error. A provider retry
+        hint is honoured and also pauses every other caller until it has passed; otherwise
+        the delay is full-jitter exponential so retries from concurrent requests spread out.
+        """
+        self.counters["retried"] += 1
+        hint = retry_hint(error)
+        if hint is not None:
+            self._paused_until = max(self._paused_until, time.monotonic() + hint)
+            return hint + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def drop(self):
+        """Records a call abandoned after its last retry."""
+        self.counters["dropped"] += 1
+
+    def stats(self):
+        return {
+            **self.counters,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            "rpm": round(self.requests.capacity) if self.requests else None,
+            "tpm": round(self.tokens.capacity) if self.tokens else None
+        }
+
+    async def _acquire(self, estimated_tokens):
+        start = time.monotonic()
+        while (pause := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(pause)
+
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just as we were cancelled; pass it on
+                    self._release(None)
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+
+        try:
+            delay = 0.0
+            if self.requests is not None:
+                delay = self.requests.reserve(1)
+            if self.tokens is not None and estimated_tokens:
+                delay = max(delay, self.tokens.reserve(estimated_tokens))
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._release(None)
+            raise
+        return time.monotonic() - start
+
+    def _release(self, outcome):
+        if outcome == "ok":
+            # Additive increase: about +1 once a full window of calls has succeeded
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        elif outcome == "quota":
+            self.counters["rate_limited"] += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.decrease_cooldown:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._last_decrease = now
+
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
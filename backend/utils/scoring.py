@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import asyncio
+import threading
+
+from utils.common import write_file_atomic, file_lock
+
+# Scoring weights live next to manifesto.md and can be edited with it
+SCORING_WEIGHTS_PATH = os.getenv(
+    "SCORING_WEIGHTS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "manifesto_weights.json")
+)
+# Weight edits from every process serialise on this lock file
+SCORING_WEIGHTS_LOCK_PATH = SCORING_WEIGHTS_PATH + ".lock"
+
+# Points deducted per violation before the section weight is applied
+SEVERITY_PENALTIES = {"High": 15, "Medium": 8, "Low": 3}
+
+DEFAULT_WEIGHTS = {
+    "severity": SEVERITY_PENALTIES,
+    # Multiplier per manifesto section id; sections not listed weigh 1
+    "sections": {},
+    # Rule names whose violations are ignored and dropped from results
+    "disabled_rules": []
+}
+
+
+def _section_id(rule_section):
+    match = re.match(r"\s*(?:Bölüm|Section)?\s*(\d+)", rule_section or "")
+    return match.group(1) if match else None
+
+
+def _rule_key(name):
+    return (name or "").strip().lower()
+
+
+def load_scoring_weights(path=SCORING_WEIGHTS_PATH):
+    """Reads the weights file; missing keys (or a missing file) fall back to DEFAULT_WEIGHTS."""
+    weights = json.loads(json.dumps(DEFAULT_WEIGHTS))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        return weights
+    except Exception as e:
+        print(f"Error reading scoring weights, using defaults: {e}")
+        return weights
+    weights["severity"].update({k: float(v) for k, v in stored.get("severity", {}).items()})
+    weights["sections"].update({str(k): float(v) for k, v in stored.get("sections", {}).items()})
+    weights["disabled_rules"] = list(stored.get("disabled_rules", []))
+    return weights
+
+
+def _weights_stamp(path=SCORING_WEIGHTS_PATH):
+    """(inode, mtime, size) of the weights file, which is replaced on every save; None if there is none."""
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def save_scoring_weights(weights, path=SCORING_WEIGHTS_PATH):
+    """Writes the weights file atomically (see write_file_atomic)."""
+    try:
+        write_file_atomic(path, json.dumps(weights, ensure_ascii=False, indent=2) + "\n")
+        return True
+    except Exception as e:
+        print(f"Error saving scoring weights: {e}")
+        return False
+
+
+class ScoringEngine:
+    """
+    Computes audit scores from the violations list instead of trusting the model's number:
+    100 minus, per violation, the severity penalty times its section's weight (unknown
+    severities count as Medium), clamped to 0-100. Violations of disabled rules, or of
+    rules passed as removed, are dropped first; that needs the violation's "rule" field,
+    so violations without it are only weighted by section. Pure arithmetic over a few
+    dicts, so stored audits can be re-scored on every read. Weights saved by another
+    process are picked up by refresh_if_changed.
+    """
+
+    def __init__(self, weights=None):
+        self._lock = threading.Lock()
+        self._write_lock = asyncio.Lock()
+        self._disk_stamp = _weights_stamp()
+        self.set_weights(weights or load_scoring_weights())
+
+    def set_weights(self, weights):
+        with self._lock:
+            self.weights = weights
+            self._disabled = {_rule_key(name) for name in weights.get("disabled_rules", [])}
+
+    def refresh_if_changed(self):
+        """
+        Reloads the weights file if it changed on disk since this engine last read or
+        wrote it; otherwise only a stat call. Returns the names of the rules the reload
+        disabled (possibly none) if the weights changed, else None.
+        """
+        stamp = _weights_stamp()
+        if stamp == self._disk_stamp:
+            return None
+        weights = load_scoring_weights()
+        self._disk_stamp = stamp
+        if weights == self.weights:
+            return None
+        previously_disabled = self._disabled
+        self.set_weights(weights)
+        return [name for name in weights["disabled_rules"] if _rule_key(name) not in previously_disabled]
+
+    async def update(self, severity=None, sections=None, disabled_rules=None):
+        """
+        Changes the given parts of the weights file and applies the result. Edits are
+        serialised by an asyncio lock within the process and a file lock across
+        processes, and are applied to the latest saved weights. Returns (weights, names
+        of the rules that became disabled), or None if saving failed.
+        """
+        async with self._write_lock:
+            return await asyncio.to_thread(self._update, severity, sections, disabled_rules)
+
+    def _update(self, severity, sections, disabled_rules):
+        with file_lock(SCORING_WEIGHTS_LOCK_PATH):
+            weights = load_scoring_weights()
+            previously_disabled = {_rule_key(name) for name in weights["disabled_rules"]}
+            if severity is not None:
+                weights["severity"].update(severity)
+            if sections is not None:
+                weights["sections"].update({str(k): v for k, v in sections.items()})
+            if disabled_rules is not None:
+                weights["disabled_rules"] = list(disabled_rules)
+            if not save_scoring_weights(weights):
+                return None
+            self._disk_stamp = _weights_stamp()
+        self.set_weights(weights)
+        return weights, [name for name in weights["disabled_rules"] if _rule_key(name) not in previously_disabled]
+
+    def penalty(self, violation):
+        severity = self.weights["severity"]
+        points = severity.get(violation.get("severity"), severity.get("Medium", SEVERITY_PENALTIES["Medium"]))
+        return points * self.weights["sections"].get(_section_id(violation.get("rule_section")), 1.0)
+
+    def score(self, violations):
+        """Deterministic 0-100 score for a violations list."""
+        return max(0, min(100, round(100 - sum(self.penalty(v) for v in violations))))
+
+    def applies(self, violation, removed_rules=()):
+        """Whether a violation still applies: its rule is neither disabled nor removed."""
+        rule = _rule_key(violation.get("rule"))
+        return not rule or (rule not in self._disabled and rule not in removed_rules)
+
+    def rescore(self, audit_result, removed_rules=()):
+        """
+        Returns a copy of audit_result with violations of disabled or removed rules
+        (names, any case) dropped and the score recomputed. The model's own number is
+        kept once as model_score.
+        """
+        if not audit_result:
+            return audit_result
+        removed = {_rule_key(name) for name in removed_rules}
+        result = dict(audit_result)
+        result["violations"] = [v for v in audit_result.get("violations", []) if self.applies(v, removed)]
+        if "model_score" not in result and "score" in audit_result:
+            result["model_score"] = audit_result["score"]
+        result["score"] = self.score(result["violations"])
+        return result
+
+
+SCORING = ScoringEngine()
@@ -0,0 +1,68 @@
+import json
+import asyncio
+import hashlib
+import functools
+
+
+def input_digest(*parts):
+    """
+    Stable digest of call inputs: bytes are hashed as-is, everything else as canonical
+    JSON (sorted keys), so dicts built in a different order still coalesce.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            h.update(b"b")
+            h.update(part)
+        else:
+            h.update(b"j")
+            h.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for `key` is in flight, later
+    callers await the same task instead of starting another upstream request.
+    The shared task is shielded, so one caller disconnecting does not cancel it for the rest.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._counters = {}
+
+    async def do(self, name, key, factory):
+        counters = self._counters.setdefault(name, {"calls": 0, "coalesced": 0})
+        counters["calls"] += 1
+        task = self._in_flight.get((name, key))
+        if task is not None:
+            counters["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[(name, key)] = task
+            task.add_done_callback(lambda _: self._in_flight.pop((name, key), None))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        in_flight = {}
+        for name, _ in self._in_flight:
+            in_flight[name] = in_flight.get(name, 0) + 1
+        return {name: {**counters, "in_flight": in_flight.get(name, 0)} for name, counters in self._counters.items()}
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+def coalesce(key_func):
+    """
+    Decorator for async LLM calls: concurrent calls whose `key_func(*args, **kwargs)`
+    digests match share one execution. Metrics are kept under the function name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            return await SINGLE_FLIGHT.do(func.__name__, key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator